@@ -0,0 +1,77 @@
+"""Append throughput with several writers on one chain.
+
+    python benchmarks/bench_concurrent.py [receipts per writer] [--storage journal]
+
+Runs 1, 2 and 4 writer processes, each with 4 threads calling
+create_receipt_block() (one receipt per call, like the GUI), on a fresh
+chain in a scratch folder, then audits the whole chain. Threads queued
+behind a commit share the next one (group commit), and processes take
+turns on the chain lock, so throughput should grow with writers instead
+of staying at one fsync per receipt.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Process
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+THREADS = 4
+
+
+def writer(storage, number, receipts):
+    from receipt_core import ReceiptBlockchain
+
+    blockchain = ReceiptBlockchain(storage)
+    blockchain.chain  # load before timing starts in every writer alike
+
+    def issue(i):
+        blockchain.create_receipt_block({
+            "landlord": "João da Silva", "tenant": f"Locatário {number}-{i}", "tenant_cpf": f"{number:03d}{i:08d}",
+            "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua das Flores, 100",
+        })
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        list(pool.map(issue, range(receipts)))
+
+
+def audit(storage):
+    from receipt_core import ReceiptBlockchain
+
+    result = ReceiptBlockchain(storage).audit_chain(full=True)
+    return result["valid"], result["checked"]
+
+
+def measure(storage, writers, receipts):
+    os.chdir(tempfile.mkdtemp(prefix="bench_concurrent_"))
+    processes = [Process(target=writer, args=(storage, number, receipts)) for number in range(writers)]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    # Audited in a fresh process too: this one never opens a chain
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        valid, checked = pool.submit(audit, storage).result()
+    return writers * receipts / elapsed, valid, checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("receipts", type=int, nargs="?", default=200)
+    parser.add_argument("--storage", default="journal")
+    args = parser.parse_args()
+
+    for writers in (1, 2, 4):
+        rate, valid, checked = measure(args.storage, writers, args.receipts)
+        print(f"{writers} writer(s) x {THREADS} threads: {rate:.0f} receipts/s, "
+              f"{checked} blocks audited, chain {'valid' if valid else 'BROKEN'}")
+
+
+if __name__ == "__main__":
+    main()
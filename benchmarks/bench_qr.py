@@ -0,0 +1,63 @@
+"""Per-receipt cost of the QR stage: temp PNG round-trip vs vector QR.
+
+    python benchmarks/bench_qr.py [receipts]
+
+"before" is the old pipeline (QR -> temp_qr_<id>.png -> drawImage ->
+remove), "after" is draw_qr_code() drawing the modules on the canvas.
+Both render the full receipt page into memory, so the numbers are the
+per-receipt time of render_receipt_pdf with each QR stage.
+"""
+from io import BytesIO
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_qr_"))
+
+import receipt_core
+from receipt_core import DATA_FOLDER, ReceiptBlockchain, generate_qr_code, render_receipt_pdf
+
+
+def draw_qr_with_temp_png(pdf, data, x, y, size):
+    """QR stage as it was before: encode a PNG, write it, read it back, delete it"""
+    receipt_id = data.split("|")[1][3:]
+    temp_qr_path = os.path.join(DATA_FOLDER, f"temp_qr_{receipt_id}.png")
+    generate_qr_code(data).save(temp_qr_path)
+    pdf.drawImage(temp_qr_path, x, y, width=size, height=size, preserveAspectRatio=True, mask='auto')
+    if os.path.exists(temp_qr_path):
+        os.remove(temp_qr_path)
+
+
+def time_render(blocks):
+    started = time.perf_counter()
+    for block in blocks:
+        render_receipt_pdf(BytesIO(), block)
+    return (time.perf_counter() - started) / len(blocks)
+
+
+def main(receipts=200):
+    blockchain = ReceiptBlockchain()
+    blocks = []
+    for i in range(receipts):
+        blockchain.create_receipt_block({
+            "landlord": "João da Silva", "tenant": f"Locatário {i}", "tenant_cpf": "123.456.789-00",
+            "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua das Flores, 100",
+        })
+        blocks.append(blockchain.chain[-1])
+
+    vector_qr = receipt_core.draw_qr_code
+    receipt_core.draw_qr_code = draw_qr_with_temp_png
+    before = time_render(blocks)
+    receipt_core.draw_qr_code = vector_qr
+    after = time_render(blocks)
+
+    print(f"receipts: {receipts}")
+    print(f"before (temp PNG): {before * 1000:.2f} ms/receipt")
+    print(f"after (vector QR): {after * 1000:.2f} ms/receipt")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,134 @@
+"""Load test of the verification HTTP server (receipt_server).
+
+    python benchmarks/bench_server.py [requests] [--connections 200] [--receipts 2000]
+    python benchmarks/bench_server.py --url http://192.168.0.10:8765 --ids ids.txt
+
+Without --url it issues synthetic receipts in a scratch folder and starts
+"receipt_cli.py serve" on a free local port in a separate process. Then
+the given number of keep-alive connections (all open at once, as many
+phones scanning at the same time) send GET /verify/<id> requests, most of
+them for known receipts and 5% for unknown IDs, and the throughput,
+latency percentiles and status counts are printed. Every answer for a
+known receipt must say "valid": true.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+UNKNOWN_SHARE = 0.05
+
+
+def issue_receipts(count):
+    from receipt_core import ReceiptBlockchain
+
+    blockchain = ReceiptBlockchain()
+    records = [{
+        "landlord": "João da Silva", "tenant": f"Locatário {i}", "tenant_cpf": f"{i:011d}",
+        "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua das Flores, 100",
+    } for i in range(count)]
+    return [block["receipt_id"] for block in blockchain.create_receipt_blocks(records)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(port):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "receipt_cli.py"), "serve", "--port", str(port)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    server.stdout.readline()  # ready line, printed once connections are accepted
+    return server
+
+
+async def client(host, port, requests, known, unknown, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            is_known = random.random() >= UNKNOWN_SHARE
+            receipt_id = random.choice(known) if is_known else random.choice(unknown)
+            started = time.perf_counter()
+            writer.write(f"GET /verify/{receipt_id} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            body = json.loads(await reader.readexactly(length))
+            results["latencies"].append(time.perf_counter() - started)
+            results["status"][status] = results["status"].get(status, 0) + 1
+            if is_known and not body.get("valid"):
+                results["wrong"] += 1
+    finally:
+        writer.close()
+
+
+async def load(host, port, total, connections, known):
+    unknown = [f"REC-{i:08X}-20000101" for i in range(100)]
+    results = {"latencies": [], "status": {}, "wrong": 0}
+    per_connection = [total // connections + (i < total % connections) for i in range(connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, n, known, unknown, results) for n in per_connection if n))
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("requests", type=int, nargs="?", default=20000)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--receipts", type=int, default=2000, help="synthetic receipts for the local server")
+    parser.add_argument("--url", help="running server to test instead of a local one")
+    parser.add_argument("--ids", help="file with one known receipt ID per line (with --url)")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        if not args.ids:
+            parser.error("--url needs --ids")
+        address = urlsplit(args.url)
+        host, port = address.hostname, address.port or 80
+        with open(args.ids, encoding="utf-8") as f:
+            known = [line.strip() for line in f if line.strip()]
+    else:
+        os.chdir(tempfile.mkdtemp(prefix="bench_server_"))
+        known = issue_receipts(args.receipts)
+        host, port = "127.0.0.1", free_port()
+        server = start_local_server(port)
+
+    try:
+        results, elapsed = asyncio.run(load(host, port, args.requests, args.connections, known))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(results["latencies"])
+    done = len(latencies)
+    print(f"{done} requests over {args.connections} connections in {elapsed:.2f}s: {done / elapsed:.0f} requests/s")
+    print("latency: " + ", ".join(f"p{int(q * 100)} {latencies[min(int(q * done), done - 1)] * 1000:.1f} ms"
+                                  for q in (0.5, 0.9, 0.99)))
+    print("status: " + ", ".join(f"{status}: {count}" for status, count in sorted(results["status"].items())))
+    print(f"known receipts not reported valid: {results['wrong']}")
+    return 1 if results["wrong"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
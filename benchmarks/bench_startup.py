@@ -0,0 +1,116 @@
+"""Startup cost: cold import of the core and time-to-first-window of the GUI.
+
+    python benchmarks/bench_startup.py [blocks] [--repeat N]
+
+Each measurement runs in a fresh interpreter inside a scratch folder with
+a synthesized chain of the given size (default 10000 blocks):
+
+- import receipt_core / receipt_cli, and which heavy libraries that pulled in
+- import + first chain access (ReceiptBlockchain().chain)
+- time-to-first-window of rent_receipt_generator.py (needs a display)
+
+Results are printed as JSON, medians of --repeat runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["reportlab", "PIL", "qrcode", "tkinter"]
+
+IMPORT_SNIPPET = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+CHAIN_SNIPPET = """
+import time, json
+started = time.perf_counter()
+import receipt_core
+blockchain = receipt_core.ReceiptBlockchain()
+length = len(blockchain.chain)
+print(json.dumps({"seconds": time.perf_counter() - started, "blocks": length}))
+"""
+
+WINDOW_SNIPPET = """
+import time, json, tkinter
+# The program ends with window.mainloop(): import it without entering the loop
+tkinter.Misc.mainloop = lambda self, n=0: None
+started = time.perf_counter()
+import rent_receipt_generator
+rent_receipt_generator.window.update()
+elapsed = time.perf_counter() - started
+rent_receipt_generator.window.destroy()
+print(json.dumps({"seconds": elapsed}))
+"""
+
+
+def run_python(code, cwd):
+    env = dict(os.environ, PYTHONPATH=REPO)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_to_first_window(cwd):
+    """Import of the program up to its first drawn window, without mainloop"""
+    try:
+        return run_python(WINDOW_SNIPPET, cwd)["seconds"]
+    except subprocess.CalledProcessError:
+        return None  # no display available
+
+
+def synthesize_chain(cwd, blocks):
+    """Writes a journal chain and one tenant in the scratch folder"""
+    code = f"""
+import os
+os.fsync = lambda fd: None  # durability is not what is measured here
+import receipt_core
+receipt_core.add_tenant({{"name": "Locatário", "cpf": "123.456.789-00", "address": "Rua A, 1"}})
+blockchain = receipt_core.ReceiptBlockchain()
+for i in range({blocks}):
+    blockchain.create_receipt_block({{"landlord": "L", "tenant": f"T{{i}}", "tenant_cpf": "123",
+                                     "value": "1.000,00", "reference": "10/2026", "day": "5",
+                                     "address": "Rua A, 1"}})
+print("{{}}")
+"""
+    run_python(code, cwd)
+
+
+def median_of(repeat, measure):
+    samples = [measure() for _ in range(repeat)]
+    if any(sample is None for sample in samples):
+        return None
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("blocks", nargs="?", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cwd = tempfile.mkdtemp(prefix="bench_startup_")
+    synthesize_chain(cwd, args.blocks)
+
+    results = {"blocks": args.blocks, "repeat": args.repeat}
+    for module in ["receipt_core", "receipt_cli"]:
+        code = IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES)
+        results[f"import_{module}_s"] = median_of(args.repeat, lambda: run_python(code, cwd)["seconds"])
+        results[f"import_{module}_heavy_modules"] = run_python(code, cwd)["heavy"]
+    results["import_and_load_chain_s"] = median_of(args.repeat, lambda: run_python(CHAIN_SNIPPET, cwd)["seconds"])
+    results["time_to_first_window_s"] = median_of(args.repeat, lambda: time_to_first_window(cwd))
+
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Per-page cost and size of the receipt pages: inline static drawing vs page template.
+
+    python benchmarks/bench_template.py [receipts] [--repeat 5]
+
+"before" draws the static layout (title, lines, labels) on every page,
+as draw_receipt_page did before the template; "after" is
+draw_page_template() referencing one form XObject per document. Both
+render into memory, as single receipts (render_receipt_pdf) and as one
+bundle (render_bundle_pdf), and the bundle size is reported for each.
+Runs alternate between the two so clock and cache drift hit both alike;
+medians are printed. "static part only" times the static layout alone on
+empty bundle pages, without the QR Code and signature that dominate a
+receipt page.
+"""
+from io import BytesIO
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="bench_template_"))
+
+import receipt_core
+from receipt_core import (
+    ReceiptBlockchain, draw_static_layout, load_receipt_layout, render_bundle_pdf, render_receipt_pdf
+)
+
+
+def draw_static_inline(pdf, layout):
+    """Static part as it was before: drawn again on every page"""
+    draw_static_layout(pdf, layout["static"])
+
+
+def time_single(blocks):
+    started = time.perf_counter()
+    for block in blocks:
+        render_receipt_pdf(BytesIO(), block)
+    return (time.perf_counter() - started) / len(blocks)
+
+
+def time_bundle(blocks):
+    output = BytesIO()
+    started = time.perf_counter()
+    render_bundle_pdf(output, blocks)
+    return (time.perf_counter() - started) / len(blocks), len(output.getvalue())
+
+
+def time_static_only(pages):
+    from reportlab.pdfgen import canvas as pdf_canvas
+
+    layout = load_receipt_layout()
+    output = BytesIO()
+    pdf = pdf_canvas.Canvas(output)
+    started = time.perf_counter()
+    for _ in range(pages):
+        receipt_core.draw_page_template(pdf, layout)
+        pdf.showPage()
+    pdf.save()
+    return (time.perf_counter() - started) / pages, len(output.getvalue())
+
+
+def measure(blocks):
+    return time_single(blocks), *time_bundle(blocks), *time_static_only(len(blocks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("receipts", type=int, nargs="?", default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    blockchain = ReceiptBlockchain()
+    blocks = list(blockchain.create_receipt_blocks([{
+        "landlord": "João da Silva", "tenant": f"Locatário {i}", "tenant_cpf": "123.456.789-00",
+        "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua das Flores, 100",
+    } for i in range(args.receipts)]))
+    time_single(blocks[:10])  # warm up fonts and the QR encoder
+
+    template = receipt_core.draw_page_template
+    variants = {"before (inline)": draw_static_inline, "after (template)": template}
+    samples = {name: [] for name in variants}
+    for run in range(args.repeat):
+        for name in (list(variants) if run % 2 == 0 else list(reversed(variants))):
+            receipt_core.draw_page_template = variants[name]
+            samples[name].append(measure(blocks))
+    receipt_core.draw_page_template = template
+
+    print(f"receipts: {args.receipts}, runs: {args.repeat}")
+    medians = {}
+    for name, runs in samples.items():
+        single, bundle, size, static, static_size = medians[name] = [statistics.median(v) for v in zip(*runs)]
+        print(f"{name}: {single * 1000:.2f} ms/receipt single, {bundle * 1000:.2f} ms/page bundle, "
+              f"bundle {size / 1024:.1f} KB ({size / args.receipts:.0f} bytes/page); static part only "
+              f"{static * 1000:.3f} ms/page, {static_size / args.receipts:.0f} bytes/page")
+    before, after = medians["before (inline)"], medians["after (template)"]
+    print(f"bundle speedup: {before[1] / after[1]:.2f}x, size: {after[2] / before[2]:.1%} of before; "
+          f"static part only: {before[3] / after[3]:.2f}x, size: {after[4] / before[4]:.1%} of before")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Benchmark suite for the chain, verification and PDF pipeline at scale.
+
+    python benchmarks/run_benchmarks.py [--sizes 1000 10000 100000]
+                                        [--storages journal segments binary sqlite]
+                                        [--output results.json]
+
+For every chain size and storage backend a chain is synthesized in a
+scratch folder and measured in a fresh interpreter:
+
+- load_s: open the storage and read the chain (first ReceiptBlockchain use)
+- lookup: verify_receipt() latency for random receipt IDs (mean/p50/p99)
+- verify_many_s: verify_many() over the same IDs
+- append: create_receipt_block() latency, fsync included (mean/p50/p99)
+- audit_blocks_per_s: full audit_chain() throughput
+- peak_memory_mb: tracemalloc peak of the Python heap while loading and
+  looking up, plus the process max RSS
+- pdf_receipts_per_s: end-to-end batch issuance (blocks + PDFs)
+
+Results are written as JSON (default benchmarks/results/<timestamp>.json)
+together with the git commit and Python version, so runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(REPO, "benchmarks", "results")
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def synthesize_chain(blocks):
+    """Writes a valid journal chain of the given size in the current folder
+
+    Blocks are built like create_receipt_block() does, with issue dates
+    spread over several months, but written in one go instead of one
+    fsync per block.
+    """
+    import receipt_core
+    from receipt_storage import encode_block
+
+    receipt_core.ensure_folders()
+    calculate_hash = receipt_core.ReceiptBlockchain.calculate_hash
+    started = datetime(2025, 1, 1, 8, 0, 0)
+    receipt_ids = []
+
+    with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "w", encoding="utf-8") as f:
+        timestamp = str(started)
+        previous = {
+            "index": 0, "timestamp": timestamp, "data": "Genesis Block", "previous_hash": "0",
+            "hash": calculate_hash(None, 0, "Genesis Block", "0", timestamp), "receipt_id": "GENESIS-0000",
+        }
+        f.write(encode_block(previous))
+        for index in range(1, blocks + 1):
+            issued = started + timedelta(minutes=5 * index)
+            timestamp = str(issued)
+            receipt_id = f"REC-{index:08X}-{issued.strftime('%Y%m%d')}"
+            data = {
+                "receipt_id": receipt_id,
+                "landlord": "João da Silva",
+                "tenant": f"Locatário {index % 5000}",
+                "tenant_cpf": f"{index % 5000:011d}",
+                "value": f"{1000 + index % 900},00",
+                "reference": issued.strftime("%m/%Y"),
+                "day": "5",
+                "address": f"Rua das Flores, {index % 5000}",
+                "timestamp": timestamp,
+            }
+            block = {
+                "index": index,
+                "timestamp": timestamp,
+                "data": data,
+                "previous_hash": previous["hash"],
+                "hash": calculate_hash(None, index, json.dumps(data), previous["hash"], timestamp),
+                "receipt_id": receipt_id,
+            }
+            f.write(encode_block(block))
+            receipt_ids.append(receipt_id)
+            previous = block
+
+    with open("receipt_ids.json", "w", encoding="utf-8") as f:
+        json.dump(receipt_ids, f)
+
+
+def save_test_signature():
+    """A three-stroke signature with a point per pixel, as captured on the canvas"""
+    import math
+    import receipt_core
+    from receipt_signature import save_strokes
+
+    receipt_core.ensure_folders()
+    strokes = [
+        [(x, 75 + 35 * math.sin(x / 9) * math.cos(x / 31)) for x in range(20, 260)],
+        [(x, 95 - 0.3 * (x - 250)) for x in range(250, 380)],
+        [(200 + 20 * math.cos(t / 10), 40 + 10 * math.sin(t / 10)) for t in range(63)],
+    ]
+    save_strokes(receipt_core.SIGNATURE_STROKES_FILE, strokes, 400, 150)
+
+
+def measure_case(storage, lookups, appends, pdf_receipts):
+    """Runs in a fresh interpreter inside the scratch folder of one chain"""
+    import resource
+    import tracemalloc
+
+    import receipt_core
+    from receipt_batch import issue_receipts
+
+    with open("receipt_ids.json", "r", encoding="utf-8") as f:
+        receipt_ids = json.load(f)
+    sample = random.Random(42).sample(receipt_ids, min(lookups, len(receipt_ids)))
+    result = {}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    blockchain = receipt_core.ReceiptBlockchain(storage)
+    len(blockchain.chain)
+    result["load_s"] = time.perf_counter() - started
+
+    timings = []
+    for receipt_id in sample:
+        started = time.perf_counter()
+        is_valid, _ = blockchain.verify_receipt(receipt_id)
+        timings.append(time.perf_counter() - started)
+        assert is_valid, receipt_id
+    result["lookup"] = latency_summary(timings)
+
+    started = time.perf_counter()
+    blockchain.verify_many(sample)
+    result["verify_many_s"] = time.perf_counter() - started
+    result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+
+    timings = []
+    for i in range(appends):
+        started = time.perf_counter()
+        blockchain.create_receipt_block({
+            "landlord": "João da Silva", "tenant": f"Novo {i}", "tenant_cpf": "12345678900",
+            "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua Nova, 1",
+        })
+        timings.append(time.perf_counter() - started)
+    result["append"] = latency_summary(timings)
+
+    audit = blockchain.audit_chain(full=True)
+    result["audit_blocks_per_s"] = audit["rate"]
+
+    save_test_signature()
+    records = [{
+        "landlord": "João da Silva", "tenant": f"Lote {i}", "tenant_cpf": "12345678900",
+        "value": "1.250,00", "reference": "10/2026", "day": "5", "address": "Rua Nova, 1",
+    } for i in range(pdf_receipts)]
+    issued = issue_receipts(records, blockchain=blockchain)
+    result["pdf_receipts_per_s"] = issued["rate"]
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["max_rss_mb"] = max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return result
+
+
+def run_in_fresh_interpreter(folder, *arguments):
+    env = dict(os.environ, PYTHONPATH=REPO)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *arguments],
+        cwd=folder, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--storages", nargs="+", default=["journal", "segments", "binary", "sqlite"])
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--appends", type=int, default=100)
+    parser.add_argument("--pdf-receipts", type=int, default=200)
+    parser.add_argument("--output", help="JSON results path")
+    # internal: one measurement inside a scratch folder
+    parser.add_argument("--synthesize", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.synthesize is not None:
+        synthesize_chain(args.synthesize)
+        print("{}")
+        return
+    if args.measure:
+        print(json.dumps(measure_case(args.measure, args.lookups, args.appends, args.pdf_receipts)))
+        return
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": [],
+    }
+    for size in args.sizes:
+        for storage in args.storages:
+            folder = tempfile.mkdtemp(prefix=f"bench_{storage}_{size}_")
+            run_in_fresh_interpreter(folder, "--synthesize", str(size))
+            case = run_in_fresh_interpreter(
+                folder, "--measure", storage, "--lookups", str(args.lookups),
+                "--appends", str(args.appends), "--pdf-receipts", str(args.pdf_receipts)
+            )
+            case = {"blocks": size, "storage": storage, **case}
+            report["cases"].append(case)
+            print(f"{storage:>8} {size:>7} blocks: load {case['load_s']:.3f}s, "
+                  f"lookup p50 {case['lookup']['p50_ms']:.3f}ms, append p50 {case['append']['p50_ms']:.2f}ms, "
+                  f"peak {case['peak_memory_mb']:.1f}MB, {case['pdf_receipts_per_s']:.1f} PDFs/s")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results: {output}")
+
+
+if __name__ == "__main__":
+    main()
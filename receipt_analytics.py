@@ -0,0 +1,271 @@
+"""Income totals over the chain, for IRPF / DIMOB annual declarations.
+
+The receipts are kept as columns (array-backed: chain index, reference
+month, value in cents, tenant and property numbers) instead of parsing
+the "1.250,00" strings of every block on each report, and the totals per
+year, tenant, property and month are updated as each block is added.
+ReceiptBlockchain.analytics() feeds new blocks in as they are created.
+
+Columns are cached in blockchain/analitico.json with the index and hash
+of the last block they cover; on the next start only the blocks after it
+are read (everything is rebuilt if that block no longer matches).
+"""
+from array import array
+import base64
+import csv
+import json
+import re
+import sys
+
+from receipt_storage import only_digits, write_json_file
+
+MONTHS = ("Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez")
+
+# (column name, array type code)
+COLUMNS = (
+    ("block_index", "I"),
+    ("reference", "I"),  # reference month as AAAAMM, 0 when unreadable
+    ("cents", "q"),  # rent value in cents, -1 when unreadable
+    ("tenant", "I"),  # position in tenant_cpfs / tenant_names
+    ("property", "I"),  # position in properties
+)
+
+
+def parse_brl(value):
+    """Amount in cents from "1.250,00", "R$ 1250,5" or "1250.00", None if unreadable"""
+    text = re.sub(r"[R$\s]", "", str(value or ""))
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"\d{1,3}(\.\d{3})+", text):
+        text = text.replace(".", "")  # 1.250 (thousands separator only)
+    if not re.fullmatch(r"\d+(\.\d{1,2})?", text):
+        return None
+    whole, _, fraction = text.partition(".")
+    return int(whole) * 100 + int(fraction.ljust(2, "0"))
+
+
+def format_brl(cents):
+    """1.250,00 from 125000"""
+    whole, fraction = divmod(cents, 100)
+    return f"{whole:,}".replace(",", ".") + f",{fraction:02d}"
+
+
+def parse_reference(reference):
+    """AAAAMM from "MM/AAAA", 0 if unreadable"""
+    match = re.fullmatch(r"\s*(\d{1,2})/(\d{4})\s*", str(reference or ""))
+    if not match or not 1 <= int(match.group(1)) <= 12:
+        return 0
+    return int(match.group(2)) * 100 + int(match.group(1))
+
+
+class ChainAnalytics:
+    """Column store of the receipts plus totals kept up to date on each block"""
+
+    def __init__(self):
+        for name, code in COLUMNS:
+            setattr(self, name, array(code))
+        self.tenant_cpfs = []
+        self.tenant_names = []  # last name seen for each CPF
+        self.properties = []
+        self._tenant_ids = {}
+        self._property_ids = {}
+        self.next_index = 0  # first chain index not read yet
+        self.last_hash = None
+        # (year, tenant, property) -> 12 monthly totals in cents
+        self.totals = {}
+        self.unreadable = 0  # receipts whose value or month could not be read
+
+    def __len__(self):
+        return len(self.block_index)
+
+    def add_block(self, block):
+        """Adds one chain block (the genesis block only moves the position)"""
+        receipt = block["data"]
+        if isinstance(receipt, dict):
+            cpf = only_digits(receipt.get("tenant_cpf"))
+            tenant = self._tenant_ids.get(cpf)
+            if tenant is None:
+                tenant = self._tenant_ids[cpf] = len(self.tenant_cpfs)
+                self.tenant_cpfs.append(cpf)
+                self.tenant_names.append("")
+            self.tenant_names[tenant] = receipt.get("tenant") or ""
+
+            address = (receipt.get("address") or "").strip()
+            prop = self._property_ids.get(address)
+            if prop is None:
+                prop = self._property_ids[address] = len(self.properties)
+                self.properties.append(address)
+
+            cents = parse_brl(receipt.get("value"))
+            self.add_row(block["index"], parse_reference(receipt.get("reference")),
+                         -1 if cents is None else cents, tenant, prop)
+        self.next_index = block["index"] + 1
+        self.last_hash = block["hash"]
+
+    def add_row(self, block_index, reference, cents, tenant, prop):
+        self.block_index.append(block_index)
+        self.reference.append(reference)
+        self.cents.append(cents)
+        self.tenant.append(tenant)
+        self.property.append(prop)
+        if cents < 0 or not reference:
+            self.unreadable += 1
+            return
+        year, month = divmod(reference, 100)
+        months = self.totals.get((year, tenant, prop))
+        if months is None:
+            months = self.totals[(year, tenant, prop)] = [0] * 12
+        months[month - 1] += cents
+
+    def catch_up(self, chain):
+        """Adds the blocks created since the columns were last updated
+
+        Starts over if the last block read is no longer in the chain with
+        the same hash (chain rewritten or restored from a backup).
+        """
+        if self.next_index and (self.next_index > len(chain)
+                                or chain[self.next_index - 1]["hash"] != self.last_hash):
+            self.__init__()
+        added = 0
+        for position in range(self.next_index, len(chain)):
+            self.add_block(chain[position])
+            added += 1
+        return added
+
+    # ---------------- CACHE FILE ----------------
+    def save(self, path):
+        columns = {}
+        for name, _ in COLUMNS:
+            column = array(getattr(self, name).typecode, getattr(self, name))
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns[name] = base64.b64encode(column.tobytes()).decode()
+        write_json_file(path, {
+            "next_index": self.next_index,
+            "last_hash": self.last_hash,
+            "tenant_cpfs": self.tenant_cpfs,
+            "tenant_names": self.tenant_names,
+            "properties": self.properties,
+            "columns": columns,
+        })
+
+    @classmethod
+    def load(cls, path):
+        """Columns from the cache file (empty when missing or unreadable)"""
+        analytics = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            columns = {}
+            for name, code in COLUMNS:
+                column = array(code)
+                column.frombytes(base64.b64decode(saved["columns"][name]))
+                if sys.byteorder != "little":
+                    column.byteswap()
+                columns[name] = column
+        except (OSError, ValueError, KeyError):
+            return analytics
+
+        analytics.tenant_cpfs = saved["tenant_cpfs"]
+        analytics.tenant_names = saved["tenant_names"]
+        analytics.properties = saved["properties"]
+        analytics._tenant_ids = {cpf: i for i, cpf in enumerate(analytics.tenant_cpfs)}
+        analytics._property_ids = {address: i for i, address in enumerate(analytics.properties)}
+        for row in zip(*(columns[name] for name, _ in COLUMNS)):
+            analytics.add_row(*row)
+        analytics.next_index = saved["next_index"]
+        analytics.last_hash = saved["last_hash"]
+        return analytics
+
+    # ---------------- REPORTS ----------------
+    def years(self):
+        return sorted({year for year, _, _ in self.totals})
+
+    def annual_rows(self, year):
+        """One row per tenant and property: cpf, tenant, property, months, total"""
+        rows = [
+            {
+                "cpf": self.tenant_cpfs[tenant],
+                "tenant": self.tenant_names[tenant],
+                "property": self.properties[prop],
+                "months": months,
+                "total": sum(months),
+            }
+            for (row_year, tenant, prop), months in self.totals.items() if row_year == year
+        ]
+        rows.sort(key=lambda row: (row["tenant"].casefold(), row["property"]))
+        return rows
+
+    def month_totals(self, year):
+        totals = [0] * 12
+        for (row_year, _, _), months in self.totals.items():
+            if row_year == year:
+                totals = [a + b for a, b in zip(totals, months)]
+        return totals
+
+    def year_total(self, year):
+        return sum(self.month_totals(year))
+
+
+def export_annual_csv(analytics, year, path):
+    """Annual report as CSV (";" separated, decimal comma, like pt-BR spreadsheets)"""
+    rows = analytics.annual_rows(year)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["CPF/CNPJ", "Locatário", "Imóvel", *MONTHS, "Total"])
+        for row in rows:
+            writer.writerow([row["cpf"], row["tenant"], row["property"],
+                             *(format_brl(cents) for cents in row["months"]), format_brl(row["total"])])
+        month_totals = analytics.month_totals(year)
+        writer.writerow(["", "TOTAL", "", *(format_brl(cents) for cents in month_totals),
+                         format_brl(sum(month_totals))])
+    return path
+
+
+def render_annual_pdf(analytics, year, path):
+    """Annual report as a PDF table: one line per tenant and property, then month totals"""
+    from reportlab.pdfgen import canvas as pdf_canvas
+    from receipt_core import A4
+
+    w, h = A4
+    pdf = pdf_canvas.Canvas(path, pagesize=A4, pageCompression=1)
+
+    def header():
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(50, h - 60, f"RELATÓRIO ANUAL DE ALUGUÉIS RECEBIDOS - {year}")
+        pdf.setFont("Helvetica-Bold", 9)
+        pdf.drawString(50, h - 90, "Locatário")
+        pdf.drawString(210, h - 90, "CPF/CNPJ")
+        pdf.drawString(300, h - 90, "Imóvel")
+        pdf.drawRightString(w - 50, h - 90, "Total (R$)")
+        pdf.line(50, h - 95, w - 50, h - 95)
+        pdf.setFont("Helvetica", 9)
+        return h - 110
+
+    y = header()
+    for row in analytics.annual_rows(year):
+        if y < 60:
+            pdf.showPage()
+            y = header()
+        pdf.drawString(50, y, row["tenant"][:30])
+        pdf.drawString(210, y, row["cpf"])
+        pdf.drawString(300, y, row["property"][:40])
+        pdf.drawRightString(w - 50, y, format_brl(row["total"]))
+        y -= 14
+
+    # Month totals on a page of their own
+    pdf.showPage()
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, h - 60, f"Totais por mês - {year}")
+    pdf.setFont("Helvetica", 10)
+    y = h - 90
+    month_totals = analytics.month_totals(year)
+    for name, cents in zip(MONTHS, month_totals):
+        pdf.drawString(50, y, name)
+        pdf.drawRightString(250, y, format_brl(cents))
+        y -= 16
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(50, y - 4, "Total do ano")
+    pdf.drawRightString(250, y - 4, format_brl(sum(month_totals)))
+    pdf.save()
+    return path
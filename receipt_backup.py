@@ -0,0 +1,391 @@
+"""Incremental backups of the chain and the receipt PDFs.
+
+    python receipt_cli.py backup pasta_backup
+    python receipt_cli.py restore pasta_backup
+
+Each backup writes one compressed tar archive to the backup folder
+(backup_00001.tar.gz, backup_00002.tar.gz, ...) holding only what was
+added since the previous one, as recorded in the folder's checkpoint.json:
+
+    backup.json            sequence, block range, the hash each end links to and
+                           the signed record of the first-version blocks
+    blocos.jsonl           the new blocks, one canonical record per line
+    pdfs/manifesto.jsonl   the manifest lines of the PDFs generated since
+    pdfs/<path>            those PDFs, at their path under pdfs/
+    locatarios.json        the whole tenant list (small), plus the signature
+                           and layout files when present
+
+Blocks are found by chain index and PDFs by the part of the PDF manifest
+appended since the last backup (all PDFs again if the manifest was
+rewritten, by "pdfs migrate"). Archives are written and read as streams:
+blocks go through a temporary file that spills to disk, and PDFs are
+copied a chunk at a time.
+
+Restore replays the archives in sequence. Every block must carry the
+next index, link to the previous hash and have a valid hash; blocks the
+chain already holds must be identical. Blocks of the first program
+version, whose hashes cannot be recalculated (see ReceiptBlockchain.legacy),
+are checked by their links only when the archive carries their record
+signed with the audit key of this installation, and the restore is
+refused otherwise. Each PDF is checked against the
+SHA-256 of its manifest line before it is put in place.
+"""
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+import hashlib
+import io
+import json
+import os
+import re
+import tarfile
+
+from receipt_core import (
+    BASE_FOLDER, LAYOUT_FILE, PDF_FOLDER, SIGNATURE_FILE, SIGNATURE_STROKES_FILE,
+    ReceiptBlockchain, legacy_record_is_signed, open_storage, pdf_manifest, read_audit_key
+)
+from receipt_storage import encode_block, write_json_file
+
+CHECKPOINT_NAME = "checkpoint.json"
+ARCHIVE_NAME = re.compile(r"backup_(\d+)\.tar\.gz")
+META_MEMBER = "backup.json"
+BLOCKS_MEMBER = "blocos.jsonl"
+MANIFEST_MEMBER = "pdfs/manifesto.jsonl"
+TENANTS_MEMBER = "locatarios.json"
+# Small files copied whole in every archive, relative to sistema_recibos
+CONFIG_FILES = tuple(os.path.relpath(path, BASE_FOLDER).replace(os.sep, "/")
+                     for path in (SIGNATURE_FILE, SIGNATURE_STROKES_FILE, LAYOUT_FILE))
+# Blocks spooled in memory before the temporary file moves to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+# Blocks appended per write (and fsync) while restoring
+RESTORE_BATCH = 5000
+CHUNK = 1024 * 1024
+
+
+def archive_path(folder, sequence):
+    return os.path.join(folder, f"backup_{sequence:05d}.tar.gz")
+
+
+def list_archives(folder):
+    """(sequence, path) of the archives in a backup folder, in order"""
+    archives = []
+    for name in os.listdir(folder):
+        match = ARCHIVE_NAME.fullmatch(name)
+        if match:
+            archives.append((int(match.group(1)), os.path.join(folder, name)))
+    return sorted(archives)
+
+
+def load_backup_checkpoint(folder):
+    try:
+        with open(os.path.join(folder, CHECKPOINT_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"sequence": 0, "next_index": 0, "last_hash": None,
+                "manifest_inode": None, "manifest_size": 0}
+
+
+def add_stream(tar, name, f, size):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, f)
+
+
+def add_bytes(tar, name, data):
+    add_stream(tar, name, io.BytesIO(data), len(data))
+
+
+def manifest_lines(path, start, end):
+    """Complete manifest lines between two byte offsets"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            position += len(line)
+            if position > end or not line.endswith(b"\n"):
+                break
+            yield line
+
+
+# ---------------- BACKUP ----------------
+def backup_increment(folder, blockchain=None):
+    """Writes the blocks and PDFs added since the last backup to the next archive
+
+    Returns a summary dict (archive path or None when there is nothing
+    new, sequence, first and last block index, blocks and PDFs written,
+    PDFs listed in the manifest but missing on disk).
+    """
+    os.makedirs(folder, exist_ok=True)
+    if blockchain is None:
+        blockchain = ReceiptBlockchain()
+    store = blockchain.store
+    checkpoint = load_backup_checkpoint(folder)
+
+    with store.chain_lock:
+        store.refresh()
+        end = len(store.chain)
+    chain = store.chain
+    start = checkpoint["next_index"]
+    if start > end or (start and chain[start - 1]["hash"] != checkpoint["last_hash"]):
+        raise ValueError("The chain no longer matches the last backup in this folder "
+                         "(rewritten or restored?): start a new backup folder.")
+
+    manifest = pdf_manifest()
+    try:
+        stat = os.stat(manifest.path)
+        manifest_inode, manifest_size = stat.st_ino, stat.st_size
+    except FileNotFoundError:
+        manifest_inode, manifest_size = None, 0
+    pdf_start = checkpoint["manifest_size"]
+    if manifest_inode != checkpoint["manifest_inode"] or manifest_size < pdf_start:
+        pdf_start = 0  # manifest rewritten: every PDF goes again
+
+    summary = {"archive": None, "sequence": checkpoint["sequence"], "first_index": start,
+               "last_index": end - 1, "blocks": end - start, "pdfs": 0, "missing_pdfs": 0}
+    if start == end and pdf_start == manifest_size:
+        return summary
+
+    sequence = checkpoint["sequence"] + 1
+    path = archive_path(folder, sequence)
+    temp_path = path + ".tmp"
+    with tarfile.open(temp_path, "w:gz") as tar, \
+            SpooledTemporaryFile(SPOOL_SIZE) as blocks, SpooledTemporaryFile(SPOOL_SIZE) as lines:
+        for position in range(start, end):
+            blocks.write(encode_block(chain[position]).encode("utf-8"))
+        # PDFs deleted since they were generated are left out, with their line
+        for line in manifest_lines(manifest.path, pdf_start, manifest_size) if manifest_inode else ():
+            entry = json.loads(line)
+            if os.path.exists(manifest.full_path(entry)):
+                lines.write(line)
+                summary["pdfs"] += 1
+            else:
+                summary["missing_pdfs"] += 1
+
+        add_bytes(tar, META_MEMBER, json.dumps({
+            "sequence": sequence,
+            "created": str(datetime.now()),
+            "first_index": start,
+            "last_index": end - 1,
+            "previous_hash": chain[start - 1]["hash"] if start else None,
+            "last_hash": chain[end - 1]["hash"] if end else None,
+            "legacy": blockchain.legacy()["record"],
+            "pdfs": summary["pdfs"],
+        }, ensure_ascii=False).encode("utf-8"))
+
+        blocks_size = blocks.tell()
+        blocks.seek(0)
+        add_stream(tar, BLOCKS_MEMBER, blocks, blocks_size)
+
+        lines_size = lines.tell()
+        lines.seek(0)
+        add_stream(tar, MANIFEST_MEMBER, lines, lines_size)
+        lines.seek(0)
+        for line in lines:
+            entry = json.loads(line)
+            tar.add(manifest.full_path(entry), arcname="pdfs/" + entry["path"], recursive=False)
+
+        add_bytes(tar, TENANTS_MEMBER,
+                  json.dumps(store.load_tenants(), ensure_ascii=False, indent=4).encode("utf-8"))
+        for name in CONFIG_FILES:
+            config_path = os.path.join(BASE_FOLDER, name)
+            if os.path.exists(config_path):
+                tar.add(config_path, arcname=name, recursive=False)
+    os.replace(temp_path, path)
+
+    write_json_file(os.path.join(folder, CHECKPOINT_NAME), {
+        "sequence": sequence,
+        "next_index": end,
+        "last_hash": chain[end - 1]["hash"] if end else None,
+        "manifest_inode": manifest_inode,
+        "manifest_size": manifest_size,
+    })
+    summary.update(archive=path, sequence=sequence)
+    return summary
+
+
+# ---------------- RESTORE ----------------
+def member_path(folder, name):
+    """Where an archive member goes under folder (no absolute paths or "..")"""
+    path = os.path.normpath(os.path.join(folder, *name.split("/")))
+    if name.startswith("/") or not path.startswith(os.path.normpath(folder) + os.sep):
+        raise ValueError(f"Unsafe path in backup: {name}")
+    return path
+
+
+def extract_checked(f, path, sha256):
+    """Copies a member to path if its content has the given SHA-256"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest = hashlib.sha256()
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as out:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    if digest.hexdigest() != sha256:
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, path)
+    return True
+
+
+class ChainRestore:
+    """Appends backed-up blocks to a storage, checking every index, link and hash"""
+
+    def __init__(self, store):
+        self.store = store
+        self.verifier = ReceiptBlockchain(store)  # only recalculates hashes
+        # Signed record of the first-version blocks of the backed-up chain
+        # (see use_legacy_record), and their count
+        self.legacy_record = None
+        self.legacy_blocks = 0
+        self.pending = []
+        self.restored = 0
+        self.skipped = 0  # blocks the chain already had
+
+    def add(self, block):
+        chain = self.store.chain
+        index = block["index"]
+        if index < len(chain) and not self.pending:
+            if chain[index]["hash"] == block["hash"]:
+                self.skipped += 1
+                return
+            if index == 0 and len(chain) == 1:
+                # Only the genesis block of a new installation: replaced by the backup's
+                self.check(block, None)
+                with self.store.chain_lock:
+                    self.store.save_chain([block])
+                self.restored += 1
+                return
+            raise ValueError(f"Block #{index} of the backup differs from the chain")
+
+        expected = len(chain) + len(self.pending)
+        if index != expected:
+            raise ValueError(f"Backup jumps to block #{index}, expected #{expected}")
+        self.check(block, self.pending[-1] if self.pending else (chain[-1] if len(chain) else None))
+        self.pending.append(block)
+        if len(self.pending) >= RESTORE_BATCH:
+            self.flush()
+
+    def holds(self, meta):
+        """Whether the chain already ends at or past the last block of an archive, with its hash"""
+        chain = self.store.chain
+        last = meta["last_index"]
+        return not self.pending and 0 <= last < len(chain) and chain[last]["hash"] == meta["last_hash"]
+
+    def use_legacy_record(self, record):
+        """Takes the first-version record of an archive, if signed with this installation's audit key"""
+        if not record or not record.get("blocks"):
+            self.legacy_record, self.legacy_blocks = None, 0
+            return
+        key = read_audit_key(self.verifier.audit_key_file, create=False)
+        if key is None or not legacy_record_is_signed(record, key):
+            raise ValueError("The backup's record of the blocks of the first program version cannot be "
+                             "verified: copy blockchain/audit.key of the installation that made the "
+                             "backup into this one before restoring.")
+        self.legacy_record, self.legacy_blocks = record, record["blocks"]
+
+    def check(self, block, previous):
+        index = block["index"]
+        if block["previous_hash"] != (previous["hash"] if previous is not None else "0"):
+            raise ValueError(f"Block #{index} does not link to the previous block")
+        if index < self.legacy_blocks:
+            # First version: links only, both ends pinned by the signed record
+            ends = {0: self.legacy_record["genesis_hash"], self.legacy_blocks - 1: self.legacy_record["last_hash"]}
+            if index in ends and block["hash"] != ends[index]:
+                raise ValueError(f"Block #{index} differs from the record of first-version blocks")
+        elif not self.verifier.block_hash_is_valid(block):
+            raise ValueError(f"Block #{index} has an invalid hash")
+
+    def save_legacy_record(self):
+        """Records the first-version blocks restored, for audits and verifications"""
+        if self.legacy_record is not None and len(self.store.chain) >= self.legacy_blocks:
+            write_json_file(self.verifier.legacy_file, self.legacy_record)
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.store.chain_lock:
+            self.store.refresh()
+            if len(self.store.chain) != self.pending[0]["index"]:
+                raise ValueError("The chain changed while restoring")
+            self.store.write_blocks(self.pending)
+        self.restored += len(self.pending)
+        self.pending = []
+
+
+def restore_archive(path, restore, manifest, summary):
+    """Replays one archive, reading it as a stream"""
+    by_path = {}  # path under pdfs/ -> (receipt_id, manifest entry)
+    meta = None
+    tenants = None
+    with tarfile.open(path, "r|gz") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            f = tar.extractfile(member)
+            name = member.name
+            if name == META_MEMBER:
+                meta = json.load(f)
+                restore.use_legacy_record(meta.get("legacy"))
+            elif name == BLOCKS_MEMBER:
+                if meta is not None and restore.holds(meta):
+                    # Restored before: links checked when that block went in
+                    restore.skipped += meta["last_index"] - meta["first_index"] + 1
+                    continue
+                for line in f:
+                    restore.add(json.loads(line))
+                restore.flush()
+            elif name == MANIFEST_MEMBER:
+                for line in f:
+                    entry = json.loads(line)
+                    by_path[entry["path"]] = (entry.pop("receipt_id"), entry)
+            elif name.startswith("pdfs/"):
+                receipt_id, entry = by_path.get(name[len("pdfs/"):], (None, None))
+                if entry is None or not extract_checked(f, member_path(PDF_FOLDER, entry["path"]),
+                                                        entry["sha256"]):
+                    summary["bad_pdfs"] += 1
+                    continue
+                recorded = manifest.get(receipt_id)
+                if recorded != entry:
+                    if recorded is not None and recorded["path"] != entry["path"]:
+                        try:
+                            os.remove(manifest.full_path(recorded))  # moved by "pdfs migrate"
+                        except FileNotFoundError:
+                            pass
+                    manifest.append([(receipt_id, entry)])
+                summary["pdfs"] += 1
+            elif name == TENANTS_MEMBER:
+                tenants = json.load(f)
+            elif name in CONFIG_FILES:
+                config_path = member_path(BASE_FOLDER, name)
+                temp_path = config_path + ".tmp"
+                os.makedirs(os.path.dirname(config_path), exist_ok=True)
+                with open(temp_path, "wb") as out:
+                    out.write(f.read())
+                os.replace(temp_path, config_path)
+    if tenants is not None:
+        restore.store.save_tenants(tenants)
+
+
+def restore_backups(folder):
+    """Replays every archive of a backup folder onto this installation
+
+    Archives already restored are recognised block by block and skipped,
+    so a restore can be repeated or resumed. Returns a summary dict with
+    the archives read, blocks restored and already present, PDFs restored
+    and PDFs whose content did not match their manifest line.
+    """
+    archives = list_archives(folder)
+    for expected, (sequence, path) in enumerate(archives, start=1):
+        if sequence != expected:
+            raise ValueError(f"Backup {expected:05d} is missing from {folder}")
+
+    restore = ChainRestore(open_storage())
+    manifest = pdf_manifest()
+    summary = {"archives": len(archives), "blocks": 0, "skipped_blocks": 0, "pdfs": 0, "bad_pdfs": 0}
+    for _, path in archives:
+        restore_archive(path, restore, manifest, summary)
+    restore.save_legacy_record()
+    summary["blocks"] = restore.restored
+    summary["skipped_blocks"] = restore.skipped
+    return summary
@@ -0,0 +1,175 @@
+"""Headless batch issuance of rent receipts.
+
+Blocks are appended in groups of COMMIT_GROUP, each group in one locked
+commit with a single fsync, in the order of the input; another process
+issuing at the same time just interleaves its own groups. PDF rendering
+only needs the finished block and is fanned out to a process pool while
+the remaining blocks are still being appended.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import json
+import re
+import time
+
+from receipt_core import (
+    ReceiptBlockchain, find_receipt_pdf, generate_receipt_pdf, has_signature, read_tenants
+)
+from receipt_storage import only_digits
+
+# Fields every receipt needs, same as the "Gerar Recibo" screen
+RECEIPT_FIELDS = ("landlord", "tenant", "tenant_cpf", "value", "reference", "day", "address")
+
+# Receipts appended per commit: one chain lock round and one fsync each
+COMMIT_GROUP = 64
+
+
+def read_receipt_file(path):
+    """Reads a list of receipts from a CSV or JSON file"""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        # Spreadsheets exported in pt-BR use ";" as separator
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+        return list(csv.DictReader(f, dialect=dialect))
+
+
+def prepare_receipts(records, tenants=None):
+    """Normalizes receipt records and checks that nothing is missing
+
+    CPF and address can be omitted when the tenant is registered; they are
+    then taken from the tenant record, like the GUI does.
+    """
+    if tenants is None:
+        tenants = read_tenants()
+    tenants_by_name = {t["name"]: t for t in tenants}
+
+    prepared = []
+    for line, record in enumerate(records, start=1):
+        receipt_data = {field: str(record.get(field) or "").strip() for field in RECEIPT_FIELDS}
+        tenant = tenants_by_name.get(receipt_data["tenant"])
+        if tenant:
+            receipt_data["tenant_cpf"] = receipt_data["tenant_cpf"] or tenant["cpf"]
+            receipt_data["address"] = receipt_data["address"] or tenant["address"]
+
+        missing = [field for field in RECEIPT_FIELDS if not receipt_data[field]]
+        if missing:
+            raise ValueError(f"Receipt {line}: missing {', '.join(missing)}")
+        prepared.append(receipt_data)
+    return prepared
+
+
+def issue_receipts(records, blockchain=None, workers=None, skip_issued=False):
+    """Issues a batch of receipts and renders their PDFs in parallel
+
+    Returns a summary dict with the issued receipt IDs, the PDFs that
+    failed to render and the throughput in receipts per second. With
+    skip_issued, receipts of a tenant and month that already have one
+    (checked under the chain lock) are left out and their existing
+    receipt IDs listed as "skipped".
+    """
+    if not has_signature():
+        raise FileNotFoundError("Save a signature in the GUI before issuing receipts.")
+
+    records = prepare_receipts(records)
+    if blockchain is None:
+        blockchain = ReceiptBlockchain()
+
+    started = time.perf_counter()
+    receipt_ids = []
+    skipped = []
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for start in range(0, len(records), COMMIT_GROUP):
+            group = records[start:start + COMMIT_GROUP]
+            for receipt_data, block in zip(group, blockchain.create_receipt_blocks(group, skip_issued)):
+                if block is None:
+                    skipped.append(blockchain.find_issued(receipt_data["tenant_cpf"], receipt_data["reference"]))
+                    continue
+                receipt_id = block["receipt_id"]
+                receipt_ids.append(receipt_id)
+                future = pool.submit(generate_receipt_pdf, block)
+                futures[future] = receipt_id
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed.append((futures[future], str(e)))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "receipt_ids": receipt_ids,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed": elapsed,
+        "rate": len(receipt_ids) / elapsed if elapsed else 0.0,
+    }
+
+
+def issue_monthly_receipts(reference, landlord, blockchain=None, tenants=None, workers=None):
+    """Issues the receipts of a reference month (MM/AAAA) for every tenant
+
+    Uses each tenant's default value and payment day. Tenants that already
+    have a receipt for the month in the chain are skipped, so the run can
+    be repeated after a crash without duplicates, and two operators
+    running it at the same time do not issue a month twice (checked again
+    under the chain lock); a skipped receipt whose PDF is missing (crash
+    between block and PDF) has it rendered again.
+    Returns the issue_receipts() summary plus "skipped" (receipt IDs) and
+    "without_defaults" (names of tenants with no value or payment day).
+    """
+    reference = reference.strip()
+    if not re.fullmatch(r"(0[1-9]|1[0-2])/\d{4}", reference):
+        raise ValueError(f"Reference month must be MM/AAAA: {reference}")
+    if not landlord.strip():
+        raise ValueError("Landlord name is required")
+    if blockchain is None:
+        blockchain = ReceiptBlockchain()
+    if tenants is None:
+        tenants = read_tenants()
+    blockchain.refresh()  # receipts other operators issued since this process read the chain
+
+    records = []
+    skipped = []
+    without_defaults = []
+    seen = set()
+    for tenant in tenants:
+        cpf = only_digits(tenant["cpf"])
+        if cpf in seen:
+            continue  # same CPF registered twice: one receipt per month
+        seen.add(cpf)
+
+        receipt_id = blockchain.find_issued(cpf, reference)
+        if receipt_id:
+            skipped.append(receipt_id)
+        elif not (tenant.get("value") and tenant.get("payment_day")):
+            without_defaults.append(tenant["name"])
+        else:
+            records.append({
+                "landlord": landlord.strip(),
+                "tenant": tenant["name"],
+                "tenant_cpf": tenant["cpf"],
+                "value": tenant["value"],
+                "reference": reference,
+                "day": tenant["payment_day"],
+                "address": tenant["address"],
+            })
+
+    for receipt_id in skipped:
+        if find_receipt_pdf(receipt_id) is None:
+            generate_receipt_pdf(blockchain.find_block(receipt_id))
+
+    if records:
+        result = issue_receipts(records, blockchain=blockchain, workers=workers, skip_issued=True)
+    else:
+        result = {"receipt_ids": [], "skipped": [], "failed": [], "elapsed": 0.0, "rate": 0.0}
+    result["skipped"] = skipped + result["skipped"]
+    result["without_defaults"] = without_defaults
+    return result
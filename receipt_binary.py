@@ -0,0 +1,398 @@
+"""Compact binary chain storage ("binary" backend).
+
+Three files, all read through read-only memory maps:
+
+    blockchain.bin   length-prefixed block records, appended and fsynced
+    blockchain.off   fixed-width offset of every record (u64), so block i
+                     is at offset[i] without reading the ones before it
+    blockchain.ids   receipt ID lookup: sorted fixed-width entries of a
+                     64-bit hash of the ID and the chain index (binary search)
+
+A record stores the hashes as 32 raw bytes, the strings with a length
+prefix and the block data as the exact JSON text that was hashed:
+
+    u32 record length | u32 index | u8 flags | receipt_id | timestamp
+    | hash | previous_hash | data
+
+Blocks come back as Block objects (__slots__, dict-like access) whose
+data is only parsed when it is read, and verifying a hash uses the stored
+JSON text directly. Nothing but the IDs appended since the last merge of
+blockchain.ids is held in memory, whatever the chain size.
+
+blockchain.off and blockchain.ids can be rebuilt from blockchain.bin, so
+only the record file is fsynced; a torn last record is cut off on open.
+Another process appending to the same files is noticed by the change of
+blockchain.bin, and the tails of the indexes are read again.
+"""
+from collections.abc import Mapping
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+
+from receipt_lock import ChainLock, LockedChain
+from receipt_storage import (
+    ID_ENTRY, JsonTenantsFile, file_identity, receipt_id_key, search_id_entries, select_receipt_blocks
+)
+
+HEADER = struct.Struct("<IIB")  # length of the rest of the record, index, flags
+SHORT = struct.Struct("<H")
+OFFSET = struct.Struct("<Q")
+
+HASH_RAW = 1  # hash stored as 32 raw bytes (else as text)
+PREVIOUS_RAW = 2  # previous_hash stored as 32 raw bytes (the genesis one is "0")
+DATA_JSON = 4  # data is a JSON object (else the plain genesis string)
+
+SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+
+# Receipt IDs appended since blockchain.ids was written are kept in a dict;
+# past this many the sorted file is rewritten with them
+MERGE_AFTER = 4096
+
+
+class Block(Mapping):
+    """One chain block, read like the dict blocks of the JSON backends"""
+
+    __slots__ = ("index", "timestamp", "previous_hash", "hash", "receipt_id", "data_json", "_data")
+
+    FIELDS = ("index", "timestamp", "data", "previous_hash", "hash", "receipt_id")
+    FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, index, timestamp, previous_hash, block_hash, receipt_id, data_json=None, data=None):
+        self.index = index
+        self.timestamp = timestamp
+        self.previous_hash = previous_hash
+        self.hash = block_hash
+        self.receipt_id = receipt_id
+        self.data_json = data_json  # JSON text of the data, exactly as hashed
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.data_json)
+        return self._data
+
+    def __getitem__(self, key):
+        if key not in self.FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return f"Block({self.index}, {self.receipt_id!r})"
+
+
+def pack_text(text):
+    raw = text.encode()
+    return SHORT.pack(len(raw)) + raw
+
+
+def pack_hash(text, flag):
+    if SHA256_HEX.fullmatch(text):
+        return bytes.fromhex(text), flag
+    return pack_text(text), 0
+
+
+def encode_record(block):
+    """Binary record of a block (a dict or a Block)"""
+    block_hash, hash_flag = pack_hash(block["hash"], HASH_RAW)
+    previous_hash, previous_flag = pack_hash(block["previous_hash"], PREVIOUS_RAW)
+    data_json = getattr(block, "data_json", None)
+    if data_json is None and not isinstance(block["data"], str):
+        data_json = json.dumps(block["data"])
+    data = (data_json if data_json is not None else block["data"]).encode()
+
+    body = (pack_text(block["receipt_id"]) + pack_text(block["timestamp"])
+            + block_hash + previous_hash + data)
+    flags = hash_flag | previous_flag | (DATA_JSON if data_json is not None else 0)
+    return HEADER.pack(len(body) + HEADER.size - 4, block["index"], flags) + body
+
+
+def record_end(buffer, offset):
+    return offset + 4 + HEADER.unpack_from(buffer, offset)[0]
+
+
+def decode_record(buffer, offset):
+    """Block stored at an offset of the record file"""
+    length, index, flags = HEADER.unpack_from(buffer, offset)
+    end = offset + 4 + length
+    position = offset + HEADER.size
+
+    texts = []  # receipt_id, timestamp, hash, previous_hash
+    for flag in (None, None, HASH_RAW, PREVIOUS_RAW):
+        if flag is not None and flags & flag:
+            texts.append(buffer[position:position + 32].hex())
+            position += 32
+        else:
+            (size,) = SHORT.unpack_from(buffer, position)
+            position += SHORT.size
+            texts.append(buffer[position:position + size].decode())
+            position += size
+    receipt_id, timestamp, block_hash, previous_hash = texts
+    data = buffer[position:end].decode()
+    if flags & DATA_JSON:
+        return Block(index, timestamp, previous_hash, block_hash, receipt_id, data_json=data)
+    return Block(index, timestamp, previous_hash, block_hash, receipt_id, data=data)
+
+
+def map_file(path):
+    """Read-only memory map of a file, or b"" when it is empty"""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class BinaryChain:
+    """Sequence view of the record file; blocks are decoded on access"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __len__(self):
+        return self.storage.count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(itertools.islice(iter(self), *position.indices(len(self))))
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("chain index out of range")
+        return decode_record(self.storage.records, self.storage.offset(position))
+
+    def __iter__(self):
+        records = self.storage.records
+        offset = 0
+        for _ in range(len(self)):
+            yield decode_record(records, offset)
+            offset = record_end(records, offset)
+
+
+class BinaryStorage(JsonTenantsFile, LockedChain):
+    """Chain in the compact binary format, tenants in locatarios.json
+
+    A missing record file is created from import_from (the journal) the
+    first time the chain is used.
+    """
+
+    name = "binary"
+
+    def __init__(self, chain_file, offsets_file, ids_file, tenants_file, import_from=None):
+        self.chain_file = chain_file
+        self.offsets_file = offsets_file
+        self.ids_file = ids_file
+        self.tenants_file = tenants_file
+        self.import_from = import_from
+        self._count = 0
+        self._records = b""  # mmap of the record file
+        self._offsets = b""  # mmap of the offsets file
+        self.ids = b""  # mmap of the sorted receipt ID entries
+        self.recent_ids = {}  # receipt_id -> index, for blocks not yet in self.ids
+        self.chain = BinaryChain(self)
+        self.chain_lock = ChainLock(chain_file + ".lock")
+        self._opened = False
+        self._seen = None  # identity of the record file after the last read or write
+
+    @property
+    def count(self):
+        self.open()
+        return self._count
+
+    @property
+    def records(self):
+        self.open()
+        return self._records
+
+    def open(self):
+        """Maps the files, repairing a torn tail and stale indexes, the first time only"""
+        if self._opened:
+            return
+        with self.chain_lock:
+            if self._opened:
+                return
+            if not os.path.exists(self.chain_file):
+                chain = self.import_from.chain if self.import_from is not None else []
+                self.import_from = None
+                self.write_files(chain)
+            else:
+                self.recover()
+            self._opened = True
+
+    def recover(self):
+        """Makes the offsets match the complete records of the record file
+
+        Only the tail is checked: offsets pointing past the end of the
+        record file are dropped, records written after the last offset
+        (crash between the two files) get theirs, and a torn last record
+        is cut off.
+        """
+        size = os.path.getsize(self.chain_file)
+        offsets_size = os.path.getsize(self.offsets_file) if os.path.exists(self.offsets_file) else 0
+        count = offsets_size // OFFSET.size
+        records = map_file(self.chain_file)
+
+        end = 0
+        with open(self.offsets_file, "a+b") as f:
+            while count:
+                f.seek((count - 1) * OFFSET.size)
+                (last,) = OFFSET.unpack(f.read(OFFSET.size))
+                if last + HEADER.size <= size and record_end(records, last) <= size:
+                    end = record_end(records, last)
+                    break
+                count -= 1
+            f.truncate(count * OFFSET.size)
+            while end + HEADER.size <= size and record_end(records, end) <= size:
+                f.write(OFFSET.pack(end))
+                end = record_end(records, end)
+
+        if isinstance(records, mmap.mmap):
+            records.close()
+        if end != size:
+            with open(self.chain_file, "r+b") as f:
+                f.truncate(end)
+        self.remap()
+        self.load_ids()
+        self._seen = file_identity(self.chain_file)
+
+    def refresh(self):
+        """Maps the files again if another process wrote them (chain lock held)"""
+        if not self._opened:
+            self.open()
+        elif file_identity(self.chain_file) != self._seen:
+            self.recover()
+
+    def remap(self):
+        """Maps the record and offset files again after they grew
+
+        The previous maps are not closed here: a reader may still be
+        iterating over them, they are released when no longer referenced.
+        """
+        self._records = map_file(self.chain_file)
+        self._offsets = map_file(self.offsets_file)
+        self._count = len(self._offsets) // OFFSET.size
+
+    def offset(self, position):
+        return OFFSET.unpack_from(self._offsets, position * OFFSET.size)[0]
+
+    def write_files(self, chain):
+        """Writes a whole chain as record, offsets and ID files"""
+        self.close()
+        offsets = []
+        entries = []
+        temp_file = self.chain_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            end = 0
+            for block in chain:
+                record = encode_record(block)
+                offsets.append(end)
+                entries.append((receipt_id_key(block["receipt_id"]), block["index"]))
+                f.write(record)
+                end += len(record)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.offsets_file, "wb") as f:
+            f.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        os.replace(temp_file, self.chain_file)
+        self.remap()
+        self.write_ids(entries)
+        self._seen = file_identity(self.chain_file)
+
+    def write_ids(self, entries):
+        entries.sort()
+        temp_file = self.ids_file + ".tmp"
+        with open(temp_file, "wb") as f:
+            f.write(b"".join(ID_ENTRY.pack(key, position) for key, position in entries))
+        if isinstance(self.ids, mmap.mmap):
+            self.ids.close()
+        os.replace(temp_file, self.ids_file)
+        self.ids = map_file(self.ids_file)
+        self.recent_ids = {}
+
+    def load_ids(self):
+        """Maps the ID file and reads the IDs of the blocks it does not cover"""
+        covered = os.path.getsize(self.ids_file) // ID_ENTRY.size if os.path.exists(self.ids_file) else 0
+        if covered > self._count:
+            # Records were cut off: read the IDs from the maps, self.chain would open() again
+            blocks = (decode_record(self._records, self.offset(position)) for position in range(self._count))
+            self.write_ids([(receipt_id_key(block.receipt_id), block.index) for block in blocks])
+            return
+        self.ids = map_file(self.ids_file) if covered else b""
+        self.recent_ids = {}
+        for position in range(covered, self._count):
+            block = decode_record(self._records, self.offset(position))
+            self.recent_ids[block.receipt_id] = block.index
+        if len(self.recent_ids) > MERGE_AFTER:
+            self.merge_ids()
+
+    def write_blocks(self, blocks):
+        """Appends the records (one fsync), then their offsets and ID entries
+
+        Called with the chain lock held.
+        """
+        self.open()
+        records = [encode_record(block) for block in blocks]
+        with open(self.chain_file, "ab") as f:
+            end = f.tell()
+            f.write(b"".join(records))
+            f.flush()
+            os.fsync(f.fileno())
+        offsets = []
+        for record in records:
+            offsets.append(OFFSET.pack(end))
+            end += len(record)
+        with open(self.offsets_file, "ab") as f:
+            f.write(b"".join(offsets))
+        self.remap()
+        for block in blocks:
+            self.recent_ids[block["receipt_id"]] = block["index"]
+        if len(self.recent_ids) > MERGE_AFTER:
+            self.merge_ids()
+        self._seen = file_identity(self.chain_file)
+
+    def merge_ids(self):
+        """Rewrites the sorted ID file with the recently appended IDs"""
+        entries = [ID_ENTRY.unpack_from(self.ids, i) for i in range(0, len(self.ids), ID_ENTRY.size)]
+        entries.extend((receipt_id_key(receipt_id), position) for receipt_id, position in self.recent_ids.items())
+        self.write_ids(entries)
+
+    def save_chain(self, chain):
+        chain = list(chain)  # decoded before the files it may come from are replaced
+        with self.chain_lock:
+            self.write_files(chain)
+
+    def find_position(self, receipt_id):
+        """Recent IDs from memory, the others by binary search in the ID file"""
+        self.open()
+        position = self.recent_ids.get(receipt_id)
+        if position is not None:
+            return position
+
+        # Different IDs can share the 64-bit key: confirm with the block itself
+        for position in search_id_entries(self.ids, receipt_id):
+            if self.chain[position].receipt_id == receipt_id:
+                return position
+        return None
+
+    def reindex(self):
+        """Rebuilds the ID file from the record file"""
+        self.open()
+        self.write_ids([(receipt_id_key(block.receipt_id), block.index) for block in self.chain])
+
+    def select_blocks(self, tenant_cpf=None, reference=None):
+        return select_receipt_blocks(self.chain, tenant_cpf, reference)
+
+    def close(self):
+        for mapped in (self._records, self._offsets, self.ids):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self._records = self._offsets = self.ids = b""
+        self._count = 0
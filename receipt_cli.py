@@ -0,0 +1,312 @@
+"""Command line entry point of the receipt system (no GUI needed).
+
+    python receipt_cli.py issue recibos.csv --workers 4
+    python receipt_cli.py monthly --month 10/2026 --landlord "João da Silva"
+    python receipt_cli.py bundle --cpf 123.456.789-00 --month 10/2026
+    python receipt_cli.py audit [--full]
+    python receipt_cli.py merkle-roots
+    python receipt_cli.py proof REC-XXXXXXXX-AAAAMMDD
+    python receipt_cli.py export pasta_destino
+    python receipt_cli.py verify-folder pasta_com_pdfs
+    python receipt_cli.py report --year 2026 [--pdf]
+    python receipt_cli.py pdfs migrate | locate REC-... | check [REC-...]
+    python receipt_cli.py serve --host 0.0.0.0 --port 8765
+    python receipt_cli.py backup pasta_backup
+    python receipt_cli.py restore pasta_backup
+"""
+import argparse
+import json
+import os
+import sys
+
+from receipt_analytics import export_annual_csv, format_brl, render_annual_pdf
+from receipt_backup import backup_increment, restore_backups
+from receipt_batch import issue_monthly_receipts, issue_receipts, read_receipt_file
+from receipt_core import (
+    ReceiptBlockchain, annual_report_path, bundle_pdf_path, migrate_pdfs, open_storage, pdf_manifest,
+    render_bundle_pdf
+)
+from receipt_server import CACHE_SIZE, DEFAULT_PORT, run_server
+from receipt_storage import export_json
+from receipt_verify import verify_folder
+
+
+def cmd_issue(args):
+    records = read_receipt_file(args.file)
+    result = issue_receipts(records, workers=args.workers)
+
+    for receipt_id, error in result["failed"]:
+        print(f"❌ {receipt_id}: {error}", file=sys.stderr)
+    print(f"✅ {len(result['receipt_ids'])} recibos emitidos em {result['elapsed']:.2f}s "
+          f"({result['rate']:.1f} recibos/s)")
+    return 1 if result["failed"] else 0
+
+
+def cmd_monthly(args):
+    result = issue_monthly_receipts(args.month, args.landlord, workers=args.workers)
+
+    for name in result["without_defaults"]:
+        print(f"⚠️ {name}: sem valor ou dia de pagamento padrão", file=sys.stderr)
+    for receipt_id, error in result["failed"]:
+        print(f"❌ {receipt_id}: {error}", file=sys.stderr)
+    print(f"✅ {len(result['receipt_ids'])} recibos de {args.month} emitidos, "
+          f"{len(result['skipped'])} já existiam")
+    return 1 if result["failed"] or result["without_defaults"] else 0
+
+
+def cmd_bundle(args):
+    if not (args.cpf or args.month):
+        raise ValueError("Give --cpf and/or --month to select the receipts.")
+
+    blockchain = ReceiptBlockchain()
+    output = args.output or bundle_pdf_path(args.cpf, args.month)
+    blocks = blockchain.select_receipts(tenant_cpf=args.cpf, reference=args.month)
+    proof_for = None
+    if args.with_proof:
+        proof_for = lambda block: blockchain.get_inclusion_proof(block["receipt_id"])
+    pages = render_bundle_pdf(output, blocks, proof_for)
+
+    if not pages:
+        print("Nenhum recibo encontrado para esse filtro.")
+        return 1
+    print(f"✅ {pages} recibos em {output}")
+    return 0
+
+
+def cmd_audit(args):
+    result = ReceiptBlockchain().audit_chain(full=args.full)
+
+    summary = (f"{result['checked']} blocos verificados a partir do #{result['start']} "
+               f"em {result['elapsed']:.2f}s ({result['rate']:.0f} blocos/s)")
+    if result["legacy"]:
+        summary += (f"; {result['legacy']} blocos da primeira versão do programa "
+                    f"conferidos só pelo encadeamento")
+    if result["legacy_record"] != "ok":
+        problem = "não encontrado" if result["legacy_record"] == "missing" else "alterado ou com assinatura inválida"
+        print(f"⚠️ Registro dos blocos da primeira versão (blockchain/legado.json) {problem}: "
+              f"todos os blocos foram conferidos pelo hash")
+    if not result["valid"]:
+        print(f"❌ Blockchain quebrada no bloco #{result['first_broken']} - {summary}")
+        return 1
+    print(f"✅ Blockchain íntegra - {summary}")
+    return 0
+
+
+def cmd_merkle_roots(args):
+    blockchain = ReceiptBlockchain()
+    path = blockchain.export_merkle_roots(args.output) if args.output else blockchain.export_merkle_roots()
+    print(f"✅ Raízes Merkle de {len(blockchain.get_merkle_roots())} meses em {path}")
+    return 0
+
+
+def cmd_proof(args):
+    proof = ReceiptBlockchain().get_inclusion_proof(args.receipt_id)
+    if proof is None:
+        print(f"❌ Recibo {args.receipt_id} não encontrado")
+        return 1
+    print(json.dumps(proof, indent=4))
+    return 0
+
+
+def cmd_export(args):
+    os.makedirs(args.folder, exist_ok=True)
+    chain_file = os.path.join(args.folder, "blockchain.json")
+    tenants_file = os.path.join(args.folder, "locatarios.json")
+    export_json(open_storage(), chain_file, tenants_file)
+    print(f"✅ Exportado para {chain_file} e {tenants_file}")
+    return 0
+
+
+def cmd_verify_folder(args):
+    if not os.path.isdir(args.folder):
+        raise ValueError(f"Not a folder: {args.folder}")
+    result = verify_folder(args.folder, args.output, workers=args.workers)
+
+    counts = result["counts"]
+    print(f"{result['receipts']} recibos em {result['files']} PDFs verificados em {result['elapsed']:.2f}s "
+          f"({result['rate']:.1f} recibos/s)")
+    print(f"✅ {counts['valid']} válidos | ❌ {counts['tampered']} adulterados | ❓ {counts['unknown']} desconhecidos")
+    print(f"Relatório: {result['report']}")
+    return 0 if counts["valid"] == result["receipts"] else 1
+
+
+def cmd_report(args):
+    blockchain = ReceiptBlockchain()
+    analytics = blockchain.analytics()
+    if args.year not in analytics.years():
+        print(f"Nenhum recibo com referência em {args.year}.")
+        return 1
+
+    csv_path = export_annual_csv(analytics, args.year, args.output or annual_report_path(args.year, "csv"))
+    print(f"✅ Relatório de {args.year} em {csv_path}")
+    if args.pdf:
+        pdf_path = render_annual_pdf(analytics, args.year, annual_report_path(args.year, "pdf"))
+        print(f"✅ PDF em {pdf_path}")
+    print(f"Total recebido em {args.year}: R$ {format_brl(analytics.year_total(args.year))} "
+          f"({len(analytics.annual_rows(args.year))} locatários/imóveis)")
+    if analytics.unreadable:
+        print(f"⚠️ {analytics.unreadable} recibos com valor ou referência ilegível ficaram de fora",
+              file=sys.stderr)
+    return 0
+
+
+def cmd_pdfs(args):
+    manifest = pdf_manifest()
+    if args.action == "migrate":
+        counts = migrate_pdfs()
+        print(f"✅ {counts['moved']} PDFs movidos, {counts['indexed']} já no lugar, "
+              f"{len(manifest)} no manifesto")
+        if counts["unknown"]:
+            print(f"⚠️ {counts['unknown']} PDFs de recibos fora da blockchain ficaram onde estavam",
+                  file=sys.stderr)
+        return 0
+
+    if args.action == "locate":
+        if not args.receipt_id:
+            raise ValueError("Give the receipt ID to locate.")
+        path = manifest.locate(args.receipt_id)
+        if path is None:
+            print(f"❌ PDF do recibo {args.receipt_id} não encontrado")
+            return 1
+        print(path)
+        return 0
+
+    # check: size and SHA-256 of the recorded PDFs, no folder listing
+    manifest.refresh()
+    receipt_ids = [args.receipt_id] if args.receipt_id else list(manifest.entries)
+    problems = 0
+    for receipt_id in receipt_ids:
+        status = manifest.check(receipt_id)
+        if status != "ok":
+            problems += 1
+            label = "ausente" if status == "missing" else "alterado"
+            print(f"❌ {receipt_id}: PDF {label}", file=sys.stderr)
+    print(f"{len(receipt_ids) - problems} de {len(receipt_ids)} PDFs conferem com o manifesto")
+    return 1 if problems else 0
+
+
+def cmd_backup(args):
+    result = backup_increment(args.folder)
+    if result["archive"] is None:
+        print(f"Nada novo desde o backup {result['sequence']:05d}.")
+        return 0
+    print(f"✅ Backup {result['sequence']:05d}: {result['blocks']} blocos "
+          f"(#{result['first_index']} a #{result['last_index']}) e {result['pdfs']} PDFs em {result['archive']}")
+    if result["missing_pdfs"]:
+        print(f"⚠️ {result['missing_pdfs']} PDFs do manifesto não existem mais e ficaram de fora",
+              file=sys.stderr)
+    return 0
+
+
+def cmd_restore(args):
+    if not os.path.isdir(args.folder):
+        raise ValueError(f"Not a folder: {args.folder}")
+    result = restore_backups(args.folder)
+    print(f"✅ {result['archives']} backups restaurados: {result['blocks']} blocos novos "
+          f"({result['skipped_blocks']} já existiam), {result['pdfs']} PDFs")
+    if result["bad_pdfs"]:
+        print(f"❌ {result['bad_pdfs']} PDFs não conferem com o hash do manifesto e não foram restaurados",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_serve(args):
+    def ready(port):
+        print(f"✅ Verificação de recibos em http://{args.host}:{port}/verify/<ID do recibo> (Ctrl+C para parar)",
+              flush=True)
+
+    run_server(args.host, args.port, args.cache, ready)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="receipt_cli",
+        description="Sistema de Recibos - command line"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    issue = commands.add_parser("issue", help="issue receipts from a CSV or JSON file")
+    issue.add_argument("file", help="CSV/JSON with landlord, tenant, tenant_cpf, value, reference, day, address")
+    issue.add_argument("--workers", type=int, default=None, help="PDF rendering processes (default: CPU count)")
+    issue.set_defaults(func=cmd_issue)
+
+    monthly = commands.add_parser("monthly", help="issue the month's receipts for every registered tenant")
+    monthly.add_argument("--month", required=True, help="reference month, MM/AAAA")
+    monthly.add_argument("--landlord", required=True, help="landlord name printed on the receipts")
+    monthly.add_argument("--workers", type=int, default=None, help="PDF rendering processes (default: CPU count)")
+    monthly.set_defaults(func=cmd_monthly)
+
+    bundle = commands.add_parser("bundle", help="put the receipts of a tenant and/or month in one PDF")
+    bundle.add_argument("--cpf", help="tenant CPF/CNPJ (punctuation is ignored)")
+    bundle.add_argument("--month", help="reference month, MM/AAAA")
+    bundle.add_argument("-o", "--output", help="PDF path (default: pdfs/recibos_<cpf>_<month>.pdf)")
+    bundle.add_argument("--with-proof", action="store_true",
+                        help="put each receipt's Merkle proof in its QR Code (use for closed months)")
+    bundle.set_defaults(func=cmd_bundle)
+
+    audit = commands.add_parser("audit", help="verify hashes and links of the whole chain")
+    audit.add_argument("--full", action="store_true", help="ignore the last checkpoint and start at the genesis block")
+    audit.set_defaults(func=cmd_audit)
+
+    roots = commands.add_parser("merkle-roots", help="export the per-month Merkle roots to publish")
+    roots.add_argument("-o", "--output", help="JSON path (default: blockchain/raizes_merkle.json)")
+    roots.set_defaults(func=cmd_merkle_roots)
+
+    proof = commands.add_parser("proof", help="print the Merkle inclusion proof of a receipt")
+    proof.add_argument("receipt_id")
+    proof.set_defaults(func=cmd_proof)
+
+    export = commands.add_parser("export", help="export chain and tenants as blockchain.json / locatarios.json")
+    export.add_argument("folder")
+    export.set_defaults(func=cmd_export)
+
+    verify = commands.add_parser("verify-folder", help="check every receipt PDF in a folder against the chain")
+    verify.add_argument("folder")
+    verify.add_argument("-o", "--output", help="CSV report path (default: dados/verificacao_<date>.csv)")
+    verify.add_argument("--workers", type=int, default=None, help="PDF reading processes (default: CPU count)")
+    verify.set_defaults(func=cmd_verify_folder)
+
+    report = commands.add_parser("report", help="annual income per tenant, property and month (IRPF/DIMOB)")
+    report.add_argument("--year", type=int, required=True, help="reference year, AAAA")
+    report.add_argument("-o", "--output", help="CSV path (default: dados/relatorio_anual_<year>.csv)")
+    report.add_argument("--pdf", action="store_true", help="also write dados/relatorio_anual_<year>.pdf")
+    report.set_defaults(func=cmd_report)
+
+    pdfs = commands.add_parser("pdfs", help="receipt PDF manifest: migrate folders, locate or check PDFs")
+    pdfs.add_argument("action", choices=("migrate", "locate", "check"),
+                      help="migrate: move PDFs to the current layout and index them; "
+                           "locate: print a receipt's PDF path; check: compare PDFs with their recorded hash")
+    pdfs.add_argument("receipt_id", nargs="?")
+    pdfs.set_defaults(func=cmd_pdfs)
+
+    serve = commands.add_parser("serve", help="answer GET /verify/<receipt_id> over HTTP (QR Code scans)")
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the whole LAN)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--cache", type=int, default=CACHE_SIZE, help="verification results kept in memory")
+    serve.set_defaults(func=cmd_serve)
+
+    backup = commands.add_parser("backup", help="add the blocks and PDFs created since the last backup "
+                                                "to a new archive in a folder")
+    backup.add_argument("folder", help="backup folder (archives backup_00001.tar.gz, ... and checkpoint.json)")
+    backup.set_defaults(func=cmd_backup)
+
+    restore = commands.add_parser("restore", help="replay the archives of a backup folder, checking the chain")
+    restore.add_argument("folder")
+    restore.set_defaults(func=cmd_restore)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1089 @@
+"""Core of the receipt system: folders, receipt chain, tenants and PDF rendering.
+
+Nothing in here touches Tk, so the chain and the PDF pipeline can be used
+from scripts and worker processes as well as from the GUI. Importing it is
+cheap: reportlab, Pillow and qrcode are imported by the functions that
+draw, folders are created when something is written and the chain is read
+the first time a ReceiptBlockchain needs it.
+"""
+from datetime import datetime
+import atexit
+import bisect
+import json
+import os
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+import uuid
+import weakref
+
+from receipt_analytics import ChainAnalytics
+from receipt_lock import GroupCommit
+from receipt_manifest import PdfManifest, migrate_pdf_folder, shard_folder
+from receipt_merkle import MerkleMonth, block_month, encode_proof
+from receipt_metrics import observe, timed
+from receipt_signature import draw_strokes, load_strokes
+from receipt_storage import (
+    JournalStorage, JsonStorage, SegmentedStorage, SqliteStorage, only_digits, write_json_file
+)
+
+# ---------------- ORGANIZED FOLDERS ----------------
+BASE_FOLDER = "sistema_recibos"
+DATA_FOLDER = os.path.join(BASE_FOLDER, "dados")
+PDF_FOLDER = os.path.join(BASE_FOLDER, "pdfs")
+BLOCKCHAIN_FOLDER = os.path.join(BASE_FOLDER, "blockchain")
+TENANTS_FOLDER = os.path.join(BASE_FOLDER, "locatarios")
+SIGNATURE_FOLDER = os.path.join(BASE_FOLDER, "assinaturas")
+METRICS_FOLDER = os.path.join(BASE_FOLDER, "metricas")  # only with RECIBOS_METRICS/RECIBOS_TRACE
+
+# Files inside folders
+BLOCKCHAIN_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.json")
+BLOCKCHAIN_JOURNAL_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.jsonl")
+RECEIPT_INDEX_FILE = os.path.join(BLOCKCHAIN_FOLDER, "receipt_index.tsv")
+MERKLE_ROOTS_FILE = os.path.join(BLOCKCHAIN_FOLDER, "raizes_merkle.json")
+ANALYTICS_FILE = os.path.join(BLOCKCHAIN_FOLDER, "analitico.json")
+AUDIT_CHECKPOINT_FILE = os.path.join(BLOCKCHAIN_FOLDER, "audit_checkpoint.json")
+AUDIT_KEY_FILE = os.path.join(BLOCKCHAIN_FOLDER, "audit.key")
+LEGACY_FILE = os.path.join(BLOCKCHAIN_FOLDER, "legado.json")
+TENANTS_FILE = os.path.join(TENANTS_FOLDER, "locatarios.json")
+SIGNATURE_FILE = os.path.join(SIGNATURE_FOLDER, "assinatura.png")
+SIGNATURE_STROKES_FILE = os.path.join(SIGNATURE_FOLDER, "assinatura.json")
+DATABASE_FILE = os.path.join(BASE_FOLDER, "recibos.db")
+LAYOUT_FILE = os.path.join(BASE_FOLDER, "layout_recibo.json")
+SEGMENTS_FOLDER = os.path.join(BLOCKCHAIN_FOLDER, "segmentos")
+BINARY_CHAIN_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.bin")
+BINARY_OFFSETS_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.off")
+BINARY_IDS_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.ids")
+STORAGE_FILE = os.path.join(BASE_FOLDER, "armazenamento.txt")
+
+# Chain and tenants storage (see receipt_storage): "journal" appends one record
+# per block, "json" rewrites blockchain.json, "segments" keeps one journal per
+# month under blockchain/segmentos, "binary" uses the compact blockchain.bin
+# (see receipt_binary), "sqlite" uses recibos.db.
+# Chosen with the RECIBOS_STORAGE variable the first time sistema_recibos is
+# used (default "journal") and then recorded in armazenamento.txt, so every
+# later process uses the same one with or without the variable.
+STORAGE_KINDS = ("journal", "json", "segments", "binary", "sqlite")
+CHAIN_STORAGE = os.environ.get("RECIBOS_STORAGE") or None
+
+# Shard folders of the receipt PDFs under pdfs/ (see receipt_manifest), built
+# from {year} and {month} of the reference month and the tenant's {cpf}
+# digits; "" keeps every PDF directly in pdfs/ as older versions did.
+# Can be changed with the RECIBOS_PDF_LAYOUT variable (then run
+# "receipt_cli.py pdfs migrate" to move the existing PDFs).
+PDF_LAYOUT = os.environ.get("RECIBOS_PDF_LAYOUT", "{year}/{month}/{cpf}")
+
+# A4 in points, same as reportlab.lib.pagesizes.A4 (kept here to avoid the import)
+A4 = (595.2755905511812, 841.8897637795277)
+
+def ensure_folders():
+    """Create folders if they don't exist"""
+    for folder in [BASE_FOLDER, DATA_FOLDER, PDF_FOLDER, BLOCKCHAIN_FOLDER, 
+                   TENANTS_FOLDER, SIGNATURE_FOLDER]:
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+# ---------------- STORAGE ----------------
+_storages = {}
+_storages_lock = threading.RLock()
+
+def open_storage(kind=CHAIN_STORAGE):
+    """Returns the storage backend of sistema_recibos, shared by the whole process
+
+    kind (None for the recorded one) must be the storage recorded in
+    armazenamento.txt, see storage_kind().
+    """
+    with _storages_lock:
+        return open_backend(storage_kind(kind))
+
+def open_backend(kind):
+    with _storages_lock:
+        if kind not in _storages:
+            ensure_folders()
+            _storages[kind] = create_storage(kind)
+        return _storages[kind]
+
+def storage_kind(requested=None):
+    """The storage the chain lives in, recorded on first use
+
+    Another process writing the chain through another storage would fork
+    it (the journal left behind by an import goes stale), so asking for a
+    storage other than the recorded one raises ValueError. Folders from
+    before the record are accepted as journal only if no other storage
+    has files in them; otherwise the storage must be named once.
+    """
+    if requested is not None and requested not in STORAGE_KINDS:
+        raise ValueError(f"Unknown storage: {requested}")
+    recorded = None
+    if os.path.exists(STORAGE_FILE):
+        with open(STORAGE_FILE, "r", encoding="utf-8") as f:
+            recorded = f.read().strip()
+    if recorded:
+        if requested is not None and requested != recorded:
+            raise ValueError(f"{BASE_FOLDER} keeps its chain in the {recorded} storage, "
+                             f"not {requested}: unset RECIBOS_STORAGE or set it to {recorded}.")
+        return recorded
+
+    kind = requested or "journal"
+    found = [name for name, path in (("segments", SEGMENTS_FOLDER), ("binary", BINARY_CHAIN_FILE),
+                                     ("sqlite", DATABASE_FILE)) if os.path.exists(path)]
+    if kind == "json" and os.path.exists(BLOCKCHAIN_JOURNAL_FILE):
+        found.append("journal")
+    if found and kind not in found:
+        raise ValueError(f"{BASE_FOLDER} already has a chain in the {' / '.join(found)} storage: "
+                         f"run once with RECIBOS_STORAGE set to it to record which one is in use.")
+    ensure_folders()
+    if not os.path.exists(LEGACY_FILE):
+        # Migration from the first version: its chain is still in blockchain.json
+        chain = []
+        if os.path.exists(BLOCKCHAIN_FILE):
+            with open(BLOCKCHAIN_FILE, "r", encoding="utf-8") as f:
+                chain = json.load(f)
+        record_legacy_blocks(chain)
+    with open(STORAGE_FILE, "w", encoding="utf-8") as f:
+        f.write(kind + "\n")
+    return kind
+
+def create_storage(kind):
+    if kind == "journal":
+        return JournalStorage(BLOCKCHAIN_FILE, BLOCKCHAIN_JOURNAL_FILE, RECEIPT_INDEX_FILE, TENANTS_FILE)
+    if kind == "json":
+        return JsonStorage(BLOCKCHAIN_FILE, BLOCKCHAIN_JOURNAL_FILE, RECEIPT_INDEX_FILE, TENANTS_FILE)
+    if kind == "segments":
+        # Without a manifest yet, the journal is split into segments on first use
+        return SegmentedStorage(SEGMENTS_FOLDER, TENANTS_FILE, import_from=open_backend("journal"))
+    if kind == "binary":
+        from receipt_binary import BinaryStorage
+
+        # Without blockchain.bin yet, the journal is converted on first use
+        return BinaryStorage(BINARY_CHAIN_FILE, BINARY_OFFSETS_FILE, BINARY_IDS_FILE, TENANTS_FILE,
+                             import_from=open_backend("journal"))
+    if kind == "sqlite":
+        # A new database starts with the chain and tenants of the JSON files
+        import_from = None if os.path.exists(DATABASE_FILE) else open_backend("journal")
+        return SqliteStorage(DATABASE_FILE, import_from)
+    raise ValueError(f"Unknown storage: {kind}")
+
+# ---------------- SIMULATED BLOCKCHAIN ----------------
+# Instances whose analytics are loaded, saved once by a single exit handler
+_open_analytics = weakref.WeakSet()
+
+def save_open_analytics():
+    for blockchain in list(_open_analytics):
+        blockchain.save_analytics()
+
+atexit.register(save_open_analytics)
+
+class ReceiptBlockchain:
+    def __init__(self, storage=CHAIN_STORAGE):
+        self.storage = storage
+        self._store = None
+        self._store_lock = threading.Lock()
+        self.checkpoint_file = AUDIT_CHECKPOINT_FILE
+        self.audit_key_file = AUDIT_KEY_FILE
+        self.legacy_file = LEGACY_FILE
+        self._legacy = None  # read on first use, see legacy()
+        self.analytics_file = ANALYTICS_FILE
+        self._merkle_months = None  # built on first use, see merkle_months()
+        self._issued = None  # built on first use, see issued_receipts()
+        self._analytics = None  # loaded on first use, see analytics()
+        self._analytics_saved = None  # next_index of the analytics cache file
+        self._indexed = 0  # chain blocks already fed to the indexes above
+        # Appends queued by concurrent threads share one commit
+        self._commits = GroupCommit(self.commit_builds)
+
+    @property
+    def store(self):
+        """Storage backend, opened (and the chain loaded) on first use"""
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    with timed("chain.load"):
+                        store = (open_storage(self.storage) if self.storage is None or isinstance(self.storage, str)
+                                 else self.storage)
+                        self.load_chain(store)
+                    self._indexed = len(store.chain)
+                    self._store = store
+        return self._store
+
+    @property
+    def chain(self):
+        return self.store.chain
+        
+    def load_chain(self, store):
+        """Loads blockchain from storage, creating the genesis block if empty"""
+        if not len(store.chain):
+            store.commit([self.build_genesis_block])
+        return store.chain
+
+    def build_genesis_block(self, previous_block):
+        """Genesis block (first block), unless another process has just made it"""
+        if previous_block is not None:
+            return None
+        timestamp = str(datetime.now())
+        return {
+            "index": 0,
+            "timestamp": timestamp,
+            "data": "Genesis Block",
+            "previous_hash": "0",
+            "hash": self.calculate_hash(0, "Genesis Block", "0", timestamp),
+            "receipt_id": "GENESIS-0000"
+        }
+
+    def find_block(self, receipt_id):
+        """Returns the block for a receipt ID using the storage index, or None"""
+        store = self.store
+        with timed("chain.lookup"):
+            position = store.find_position(receipt_id)
+        if position is None:
+            # Maybe issued a moment ago by another process sharing the folder;
+            # looked up again only if the refresh brought new blocks
+            length = len(store.chain)
+            self.refresh()
+            if len(store.chain) != length:
+                position = store.find_position(receipt_id)
+        if position is None:
+            return None
+        block = store.chain[position]
+        if block.get("receipt_id") != receipt_id:
+            # Index out of sync with the chain: rebuild and retry once
+            store.reindex()
+            position = store.find_position(receipt_id)
+            if position is None:
+                return None
+            block = store.chain[position]
+        return block
+
+    def select_receipts(self, tenant_cpf=None, reference=None):
+        """Yields the receipt blocks of a tenant CPF and/or reference month"""
+        return self.store.select_blocks(tenant_cpf, reference)
+
+    def issued_receipts(self):
+        """(tenant CPF digits, reference month) -> receipt ID, for every receipt
+
+        Built with one pass over the chain on first use, then kept up to
+        date by index_new_blocks().
+        """
+        if self._issued is None:
+            issued = {}
+            for block in self.select_receipts():
+                issued.setdefault(self.issued_key(block["data"]), block["receipt_id"])
+            self._issued = issued
+        return self._issued
+
+    @staticmethod
+    def issued_key(receipt):
+        return only_digits(receipt.get("tenant_cpf")), (receipt.get("reference") or "").strip()
+
+    def find_issued(self, tenant_cpf, reference):
+        """Receipt ID already issued to a tenant for a reference month, or None"""
+        return self.issued_receipts().get((only_digits(tenant_cpf), reference.strip()))
+
+    def calculate_hash(self, index, data, previous_hash, timestamp):
+        """Calculates SHA-256 hash of the block"""
+        block_string = f"{index}{data}{previous_hash}{timestamp}"
+        return hashlib.sha256(block_string.encode()).hexdigest()
+    
+    def create_receipt_block(self, receipt_data):
+        """Creates a new block for the receipt"""
+        (new_block,) = self.create_receipt_blocks([receipt_data])
+        return new_block["receipt_id"], new_block["hash"]
+
+    def create_receipt_blocks(self, records, skip_issued=False):
+        """Creates one block per receipt in a single commit (one lock, one fsync)
+
+        With skip_issued, a receipt whose tenant already has one for the
+        same reference month (possibly issued a moment ago by another
+        process) gets no block. Returns the new blocks, None where skipped.
+        """
+        builds = [self.receipt_block_builder(receipt_data, skip_issued) for receipt_data in records]
+        with timed("chain.append"):
+            results = self._commits.submit(builds)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def receipt_block_builder(self, receipt_data, skip_issued=False):
+        """build(previous_block) making the receipt's block, for store.commit()
+
+        Runs under the chain lock, so previous_block is the real last block
+        even when other processes append to the same chain.
+        """
+        def build(previous_block):
+            if skip_issued and self.find_issued(receipt_data.get("tenant_cpf"), receipt_data.get("reference") or ""):
+                return None
+            index = previous_block["index"] + 1
+
+            # Generates unique receipt ID
+            receipt_id = f"REC-{uuid.uuid4().hex[:8].upper()}-{datetime.now().strftime('%Y%m%d')}"
+
+            # Same timestamp is stored and hashed, so the block can be re-verified
+            timestamp = str(datetime.now())
+
+            # Block data (WITHOUT landlord's CPF)
+            block_data = {
+                "receipt_id": receipt_id,
+                "landlord": receipt_data.get("landlord"),
+                "tenant": receipt_data.get("tenant"),
+                "tenant_cpf": receipt_data.get("tenant_cpf"),
+                "value": receipt_data.get("value"),
+                "reference": receipt_data.get("reference"),
+                "day": receipt_data.get("day"),
+                "address": receipt_data.get("address"),
+                "timestamp": timestamp
+            }
+
+            with timed("chain.hash"):
+                block_hash = self.calculate_hash(index, json.dumps(block_data), previous_block["hash"], timestamp)
+
+            return {
+                "index": index,
+                "timestamp": timestamp,
+                "data": block_data,
+                "previous_hash": previous_block["hash"],
+                "hash": block_hash,
+                "receipt_id": receipt_id
+            }
+        return build
+
+    def commit_builds(self, builds):
+        """Commits a group of builds and feeds every new block to the indexes"""
+        store = self.store
+        with store.chain_lock:
+            # Blocks of other processes are indexed before the builds run,
+            # so skip_issued sees their receipts
+            results = store.commit(builds, on_refresh=self.index_new_blocks)
+            self.index_new_blocks()
+        return results
+
+    def refresh(self):
+        """Reads the receipts other processes issued since the last commit"""
+        store = self.store
+        with store.chain_lock:
+            store.refresh()
+            self.index_new_blocks()
+
+    def index_new_blocks(self):
+        """Feeds the blocks added since the last call to the indexes already built"""
+        chain = self.chain
+        for position in range(self._indexed, len(chain)):
+            block = chain[position]
+            if not isinstance(block["data"], dict):
+                continue  # genesis block
+            if self._issued is not None:
+                self._issued.setdefault(self.issued_key(block["data"]), block["receipt_id"])
+            if self._analytics is not None:
+                self._analytics.add_block(block)
+            if self._merkle_months is not None:
+                with timed("merkle.update"):
+                    self._merkle_months.setdefault(block_month(block), MerkleMonth()).append(
+                        block["hash"], block["index"]
+                    )
+        self._indexed = len(chain)
+    
+    def save_chain(self):
+        """Saves chain to storage (full rewrite)"""
+        with timed("chain.save"):
+            self.store.save_chain(self.chain)
+    
+    def verify_receipt(self, receipt_id):
+        """Verifies receipt authenticity
+
+        Receipts of the first version of the program (see legacy_blocks())
+        are checked by their links to the blocks around them.
+        """
+        block = self.find_block(receipt_id)
+        if block is None:
+            return False, None
+        with timed("chain.verify"):
+            if block["index"] < self.legacy_blocks():
+                return self.block_links_are_valid(block), block
+            return self.block_hash_is_valid(block), block
+
+    def block_links_are_valid(self, block):
+        """Whether the block sits at its index, linked to the blocks before and after it"""
+        chain = self.chain
+        position = block["index"]
+        if not 0 <= position < len(chain) or chain[position]["hash"] != block["hash"]:
+            return False
+        previous_hash = chain[position - 1]["hash"] if position else "0"
+        if block["previous_hash"] != previous_hash:
+            return False
+        return position + 1 == len(chain) or chain[position + 1]["previous_hash"] == block["hash"]
+
+    def legacy(self):
+        """Signed record of the leading blocks written by the first version of the program
+
+        That version hashed each block with a second datetime.now() instead
+        of the stored timestamp, so their hashes cannot be recalculated:
+        audits and verifications check them by their links only. Their
+        count is found once, when the folder is first used by this version
+        (see record_legacy_blocks), and kept in blockchain/legado.json
+        signed with the audit key, together with the genesis hash and the
+        hash of the last of them. It is never recalculated: if the file is
+        missing, badly signed or does not match the chain, no block is
+        treated as legacy and "status" says why.
+        Returns {"blocks": count, "status": "ok" | "missing" | "invalid",
+        "record": the signed record when valid, else None}.
+        """
+        if self._legacy is None:
+            self._legacy = self.load_legacy_record()
+        return self._legacy
+
+    def legacy_blocks(self):
+        """Number of leading blocks checked by their links only (see legacy())"""
+        return self.legacy()["blocks"]
+
+    def load_legacy_record(self):
+        chain = self.chain  # opening the storage records the count on migration
+        if not os.path.exists(self.legacy_file):
+            return {"blocks": 0, "status": "missing", "record": None}
+        invalid = {"blocks": 0, "status": "invalid", "record": None}
+        try:
+            with open(self.legacy_file, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return invalid
+        key = read_audit_key(self.audit_key_file, create=False)
+        if key is None or not legacy_record_is_signed(record, key):
+            return invalid
+        count = record["blocks"]
+        if count and (count > len(chain) or chain[0]["hash"] != record["genesis_hash"]
+                      or chain[count - 1]["hash"] != record["last_hash"]):
+            return invalid
+        return {"blocks": count, "status": "ok", "record": record}
+
+    def block_hash_is_valid(self, block):
+        """Recalculates the block hash and compares it with the stored one"""
+        # Binary blocks keep the exact JSON text that was hashed
+        data = getattr(block, "data_json", None) or block["data"]
+        # Genesis data is hashed as the plain string, receipts as JSON
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        calculated_hash = self.calculate_hash(
+            block["index"],
+            data,
+            block["previous_hash"],
+            block["timestamp"]
+        )
+        return calculated_hash == block["hash"]
+
+    def verify_many(self, receipt_ids):
+        """Verifies several receipts, returns {receipt_id: (is_valid, block)}"""
+        return {receipt_id: self.verify_receipt(receipt_id) for receipt_id in receipt_ids}
+    
+    def audit_chain(self, full=False):
+        """Verifies every block hash and previous_hash link of the chain
+
+        Resumes right after the last signed checkpoint, as long as the block
+        it points to still has the recorded hash; full=True re-verifies from
+        the genesis block. A new checkpoint is signed when the audit passes.
+        Returns a dict with "valid", "first_broken" (block index or None),
+        "start", "checked", "legacy" (how many of the checked blocks are of
+        the first version, checked by their links only), "legacy_record"
+        (status of blockchain/legado.json, see legacy()), "elapsed" and
+        "rate" (blocks/s).
+        """
+        start = 0
+        checkpoint = None if full else self.load_checkpoint()
+        if checkpoint:
+            position = checkpoint["index"]
+            if position < len(self.chain) and self.chain[position]["hash"] == checkpoint["hash"]:
+                start = position + 1
+
+        legacy_record = self.legacy()
+        legacy = legacy_record["blocks"]
+        started = time.perf_counter()
+        first_broken = None
+        previous_hash = self.chain[start - 1]["hash"] if start else "0"
+        for position in range(start, len(self.chain)):
+            block = self.chain[position]
+            # Blocks of the first version: links only (see legacy_blocks)
+            if (block["index"] != position
+                    or block["previous_hash"] != previous_hash
+                    or position >= legacy and not self.block_hash_is_valid(block)):
+                first_broken = position
+                break
+            previous_hash = block["hash"]
+        elapsed = time.perf_counter() - started
+        observe("chain.audit", elapsed)
+
+        end = first_broken if first_broken is not None else len(self.chain)
+        checked = end - start
+        if first_broken is None and checked:
+            self.save_checkpoint(len(self.chain) - 1, previous_hash)
+
+        return {
+            "valid": first_broken is None,
+            "first_broken": first_broken,
+            "start": start,
+            "checked": checked,
+            "legacy": max(0, min(legacy, end) - start),
+            "legacy_record": legacy_record["status"],
+            "elapsed": elapsed,
+            "rate": checked / elapsed if elapsed else 0.0,
+        }
+
+    def audit_key(self):
+        """Local secret used to sign audit checkpoints (created on first use)"""
+        return read_audit_key(self.audit_key_file)
+
+    def sign_checkpoint(self, index, block_hash):
+        message = f"{index}:{block_hash}".encode()
+        return hmac.new(self.audit_key(), message, hashlib.sha256).hexdigest()
+
+    def load_checkpoint(self):
+        """Returns the last audit checkpoint, or None if missing or badly signed"""
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            expected = self.sign_checkpoint(checkpoint["index"], checkpoint["hash"])
+        except (ValueError, KeyError):
+            return None
+        if not hmac.compare_digest(expected, checkpoint.get("signature", "")):
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, index, block_hash):
+        """Records a signed checkpoint: last verified index and its hash"""
+        checkpoint = {
+            "index": index,
+            "hash": block_hash,
+            "verified_at": str(datetime.now()),
+            "signature": self.sign_checkpoint(index, block_hash)
+        }
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=4)
+        os.replace(temp_file, self.checkpoint_file)
+    
+    def merkle_months(self):
+        """Per-month Merkle trees over the receipt block hashes
+
+        Built from the chain the first time they are needed and then kept
+        up to date by index_new_blocks(). The genesis block is left out.
+        """
+        if self._merkle_months is None:
+            self._merkle_months = {}
+            for block in self.chain[1:]:
+                self._merkle_months.setdefault(block_month(block), MerkleMonth()).append(
+                    block["hash"], block["index"]
+                )
+        return self._merkle_months
+
+    def analytics(self):
+        """Income columns and yearly totals of the receipts (see receipt_analytics)
+
+        Read from the cache file and brought up to date with the chain on
+        first use, then kept up to date by index_new_blocks() and saved
+        again when the process exits (save_open_analytics; an instance
+        collected before that leaves its last blocks for the next catch-up).
+        """
+        if self._analytics is None:
+            analytics = ChainAnalytics.load(self.analytics_file)
+            if analytics.catch_up(self.chain):
+                analytics.save(self.analytics_file)
+            self._analytics = analytics
+            self._analytics_saved = analytics.next_index
+            _open_analytics.add(self)
+        return self._analytics
+
+    def save_analytics(self):
+        """Writes the analytics cache, so the next start only reads new blocks"""
+        analytics = self._analytics
+        if analytics is not None and analytics.next_index != self._analytics_saved:
+            analytics.save(self.analytics_file)
+            self._analytics_saved = analytics.next_index
+
+    def get_merkle_roots(self):
+        """Current root of every month: {"AAAA-MM": {"size": n, "root": hex}}"""
+        return {
+            month: {"size": len(tree), "root": tree.root()}
+            for month, tree in sorted(self.merkle_months().items())
+        }
+
+    def export_merkle_roots(self, path=MERKLE_ROOTS_FILE):
+        """Writes the month roots to publish to auditors and kiosks"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_merkle_roots(), f, indent=4)
+        return path
+
+    def get_inclusion_proof(self, receipt_id):
+        """Merkle inclusion proof of a receipt in its month tree, or None
+
+        The proof holds the block hash, its leaf position, the month tree size
+        and the sibling hashes; receipt_merkle.verify_proof() checks it against
+        the published root of that month and size.
+        """
+        block = self.find_block(receipt_id)
+        if block is None or not isinstance(block["data"], dict):
+            return None
+        month = block_month(block)
+        tree = self.merkle_months()[month]
+        leaf_index = bisect.bisect_left(tree.block_indexes, block["index"])
+        return {
+            "receipt_id": receipt_id,
+            "month": month,
+            "block_hash": block["hash"],
+            "leaf_index": leaf_index,
+            "tree_size": len(tree),
+            "path": [h.hex() for h in tree.inclusion_path(leaf_index)],
+            "root": tree.root(),
+        }
+
+    def get_receipt_info(self, receipt_id):
+        """Gets receipt information by ID"""
+        block = self.find_block(receipt_id)
+        return block["data"] if block is not None else None
+
+def read_audit_key(path=AUDIT_KEY_FILE, create=True):
+    """Local secret signing the audit checkpoints and the legacy record, None if missing and not created"""
+    if not os.path.exists(path):
+        if not create:
+            return None
+        # Linked into place only if still missing: processes starting
+        # together all end up with the key of the first one
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp_file, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_file)
+    with open(path, "r", encoding="utf-8") as f:
+        return bytes.fromhex(f.read().strip())
+
+def find_legacy_blocks(chain):
+    """Count of leading blocks written by the first version (see ReceiptBlockchain.legacy)
+
+    Only the unbroken run from the genesis block counts, and it ends at the
+    first block whose timestamp is the one of its receipt, as the current
+    code writes them.
+    """
+    count = 0
+    for block in chain:
+        if not has_first_version_shape(block):
+            break
+        count += 1
+    return count
+
+def has_first_version_shape(block):
+    """Whether a block may come from the first version: genesis, or a block timestamp other than the receipt's"""
+    data = block["data"]
+    return block["index"] == 0 or (isinstance(data, dict) and data.get("timestamp") != block["timestamp"])
+
+def sign_legacy_record(key, blocks, genesis_hash, last_hash):
+    message = f"legacy:{blocks}:{genesis_hash}:{last_hash}".encode()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+def legacy_record_is_signed(record, key):
+    try:
+        expected = sign_legacy_record(key, record["blocks"], record["genesis_hash"], record["last_hash"])
+    except (KeyError, TypeError):
+        return False
+    return hmac.compare_digest(expected, str(record.get("signature", "")))
+
+def record_legacy_blocks(chain, legacy_file=LEGACY_FILE, key_file=AUDIT_KEY_FILE):
+    """Writes the signed count of first-version blocks at the start of chain
+
+    Called once, when this version first opens the folder (the chain of
+    the first version is then still in blockchain.json), or by a restore
+    after checking the record of the backup. Returns the record.
+    """
+    count = find_legacy_blocks(chain)
+    genesis_hash = chain[0]["hash"] if count else None
+    last_hash = chain[count - 1]["hash"] if count else None
+    record = {
+        "blocks": count,
+        "genesis_hash": genesis_hash,
+        "last_hash": last_hash,
+        "signature": sign_legacy_record(read_audit_key(key_file), count, genesis_hash, last_hash),
+    }
+    write_json_file(legacy_file, record)
+    return record
+
+# ---------------- TENANTS ----------------
+def read_tenants():
+    """Loads the registered tenants list"""
+    return open_storage().load_tenants()
+
+def write_tenants(tenants):
+    """Saves the registered tenants list"""
+    open_storage().save_tenants(tenants)
+
+def add_tenant(tenant):
+    """Registers one tenant (a single-row insert with SQLite)"""
+    open_storage().add_tenant(tenant)
+
+# ---------------- QR CODE GENERATOR ----------------
+def build_qr_code(data):
+    """Builds the QR Code for the receipt data"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=6,
+        border=2,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+def generate_qr_code(data):
+    """Generates QR Code with receipt data and returns as Image object"""
+    img = build_qr_code(data).make_image(fill_color="black", back_color="white")
+    return img
+
+def draw_qr_code(pdf, data, x, y, size):
+    """Draws the QR Code as vector squares straight on the PDF canvas
+
+    No image is encoded and nothing is written to disk: each horizontal
+    run of dark modules becomes one filled rectangle of a single path.
+    """
+    matrix = build_qr_code(data).get_matrix()
+    module = size / len(matrix)
+
+    pdf.saveState()
+    pdf.setFillColorRGB(1, 1, 1)
+    pdf.rect(x, y, size, size, stroke=0, fill=1)
+    pdf.setFillColorRGB(0, 0, 0)
+
+    path = pdf.beginPath()
+    for row_number, row in enumerate(matrix):
+        row_y = y + size - (row_number + 1) * module
+        column = 0
+        while column < len(row):
+            if not row[column]:
+                column += 1
+                continue
+            start = column
+            while column < len(row) and row[column]:
+                column += 1
+            path.rect(x + start * module, row_y, (column - start) * module, module)
+    pdf.drawPath(path, stroke=0, fill=1)
+    pdf.restoreState()
+
+# ---------------- SIGNATURE ----------------
+# Name of the form XObject holding the signature inside a PDF document
+SIGNATURE_FORM = "assinatura"
+
+def has_signature():
+    """True when a signature was saved, as strokes or as an older PNG"""
+    return load_strokes(SIGNATURE_STROKES_FILE) is not None or load_signature_image() is not None
+
+_signature_cache = {}
+
+def load_signature_image(signature_file=SIGNATURE_FILE):
+    """Returns the decoded signature as an ImageReader, or None if there is none
+
+    The image is decoded once per file version: the cache is keyed on the
+    path and its mtime, so saving a new signature invalidates it.
+    """
+    try:
+        mtime = os.stat(signature_file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = (os.path.abspath(signature_file), mtime)
+    image = _signature_cache.get(key)
+    if image is None:
+        from reportlab.lib.utils import ImageReader
+
+        image = ImageReader(signature_file)
+        image.getRGBData()  # decode now, ImageReader keeps the pixels
+        _signature_cache.clear()
+        _signature_cache[key] = image
+    return image
+
+def draw_signature(pdf, x, y, width, height):
+    """Draws the saved signature, embedding it only once per PDF document
+
+    The first receipt page of a document puts the signature in a form
+    XObject, every page (including that one) then just references the
+    form. Saved strokes are drawn as a vector path; a signature saved as
+    PNG by older versions is embedded as the image.
+    Returns False when there is no saved signature.
+    """
+    strokes = load_strokes(SIGNATURE_STROKES_FILE)
+    image = load_signature_image() if strokes is None else None
+    if strokes is None and image is None:
+        return False
+
+    if not pdf.hasForm(SIGNATURE_FORM):
+        pdf.beginForm(SIGNATURE_FORM)
+        if strokes is not None:
+            draw_strokes(pdf, strokes, x, y, width, height)
+        else:
+            pdf.drawImage(
+                image,
+                x,
+                y,
+                width=width,
+                height=height,
+                preserveAspectRatio=True,
+                mask='auto'
+            )
+        pdf.endForm()
+    pdf.doForm(SIGNATURE_FORM)
+    return True
+
+# ---------------- PAGE LAYOUT ----------------
+# Where things go on a receipt page, in points: "top" is measured down from
+# the top edge, "bottom" up from the bottom edge and "right" in from the
+# right edge. The "static" items are the same on every receipt and are
+# drawn once per document into a form XObject; "fields" place what changes
+# from one receipt to the next. layout_recibo.json in the main folder can
+# replace the static items and any field (same structure, only the keys to
+# change).
+RECEIPT_LAYOUT = {
+    "static": [
+        {"text": "RECIBO DE ALUGUEL", "x": 200, "top": 80, "font": "Helvetica-Bold", "size": 16},
+        {"line": "separator", "x": 50, "right": 50, "top": 115},
+        {"text": "________________________________________________________________",
+         "x": 50, "top": 305, "font": "Helvetica", "size": 12},
+        {"text": "Assinatura:", "x": 50, "top": 445, "font": "Helvetica", "size": 12},
+        {"line": "signature", "x": 50, "right": 50, "top": 450},
+    ],
+    "fields": {
+        "receipt_id": {"x": 50, "top": 105, "font": "Helvetica-Bold", "size": 10},
+        "body": {"x": 50, "top": 145, "font": "Helvetica", "size": 12},
+        "signature": {"x": 150, "top": 455, "width": 180, "height": 60},
+        # A Merkle proof makes a denser QR Code, so it is drawn bigger to stay scannable
+        "qr": {"right": 50, "bottom": 30, "size": 50, "proof_size": 90},
+        "footer": {"x": 50, "bottom": 40, "font": "Helvetica", "size": 7},
+    },
+}
+
+# Name of the form XObject holding the static part of the page
+PAGE_TEMPLATE_FORM = "modelo_recibo"
+
+_layout_cache = {}
+
+def load_receipt_layout(layout_file=LAYOUT_FILE):
+    """RECEIPT_LAYOUT with the changes of layout_file, if there is one
+
+    Read again only when the file changes (cached on path and mtime, like
+    the signature image).
+    """
+    try:
+        mtime = os.stat(layout_file).st_mtime_ns
+    except FileNotFoundError:
+        return RECEIPT_LAYOUT
+
+    key = (os.path.abspath(layout_file), mtime)
+    layout = _layout_cache.get(key)
+    if layout is None:
+        with open(layout_file, "r", encoding="utf-8") as f:
+            custom = json.load(f)
+        fields = custom.get("fields", {})
+        layout = {
+            "static": custom.get("static", RECEIPT_LAYOUT["static"]),
+            "fields": {name: {**field, **fields.get(name, {})}
+                       for name, field in RECEIPT_LAYOUT["fields"].items()},
+        }
+        _layout_cache.clear()
+        _layout_cache[key] = layout
+    return layout
+
+def layout_y(item, page_height):
+    return page_height - item["top"] if "top" in item else item["bottom"]
+
+def draw_static_layout(pdf, items):
+    """Draws the static layout items (texts and horizontal lines)"""
+    w, h = A4
+    for item in items:
+        y = layout_y(item, h)
+        if "text" in item:
+            pdf.setFont(item["font"], item["size"])
+            pdf.drawString(item["x"], y, item["text"])
+        else:
+            pdf.line(item["x"], y, w - item["right"], y)
+
+def draw_page_template(pdf, layout):
+    """Draws the static part of the page, compiling it only once per PDF document
+
+    Same scheme as the signature: the first page puts the static items in
+    a form XObject and every page references it, so a bundle stores them
+    once and each page only draws its own fields.
+    """
+    if not pdf.hasForm(PAGE_TEMPLATE_FORM):
+        pdf.beginForm(PAGE_TEMPLATE_FORM)
+        draw_static_layout(pdf, layout["static"])
+        pdf.endForm()
+    pdf.doForm(PAGE_TEMPLATE_FORM)
+
+# ---------------- PDF WITH BLOCKCHAIN ----------------
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def pdf_manifest():
+    """Manifest of the receipt PDFs, shared by the whole process"""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            ensure_folders()
+            _manifest = PdfManifest(PDF_FOLDER)
+        return _manifest
+
+def receipt_pdf_path(block):
+    """Path of the PDF file for a receipt block, in its PDF_LAYOUT shard folder"""
+    folder = os.path.join(PDF_FOLDER, shard_folder(PDF_LAYOUT, block))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"recibo_{block['receipt_id']}.pdf")
+
+def find_receipt_pdf(receipt_id):
+    """Path of a receipt's generated PDF from the manifest, or None"""
+    return pdf_manifest().locate(receipt_id)
+
+def generate_receipt_pdf(block, proof=None):
+    """Renders a receipt's PDF in its shard folder and records it in the manifest
+
+    Returns the PDF path. Can run in a worker process: the manifest line
+    is appended under its file lock.
+    """
+    pdf_path = render_receipt_pdf(receipt_pdf_path(block), block, proof)
+    pdf_manifest().add(block["receipt_id"], pdf_path)
+    return pdf_path
+
+def migrate_pdfs(blockchain=None):
+    """Moves existing receipt PDFs to the current PDF_LAYOUT and indexes them in the manifest"""
+    blockchain = blockchain or ReceiptBlockchain()
+    return migrate_pdf_folder(pdf_manifest(), blockchain.find_block, PDF_LAYOUT)
+
+def annual_report_path(year, extension):
+    """Path of the annual income report of a year (csv or pdf)"""
+    ensure_folders()
+    return os.path.join(DATA_FOLDER, f"relatorio_anual_{year}.{extension}")
+
+def render_receipt_pdf(pdf_path, block, proof=None):
+    """Renders the receipt PDF for a chain block
+
+    Only uses the block itself (and its Merkle proof, if one is given to
+    put in the QR Code), so it can run in a worker process.
+    """
+    from reportlab.pdfgen import canvas as pdf_canvas
+
+    pdf = pdf_canvas.Canvas(pdf_path, pagesize=A4)
+    with timed("pdf.page"):
+        draw_receipt_page(pdf, block, proof)
+    with timed("pdf.save"):
+        pdf.save()
+
+    return pdf_path
+
+def bundle_pdf_path(tenant_cpf=None, reference=None):
+    """Path of the bundle PDF for a tenant and/or reference month"""
+    parts = []
+    if tenant_cpf:
+        parts.append(only_digits(tenant_cpf))
+    if reference:
+        parts.append(reference.strip().replace("/", "-"))
+    ensure_folders()
+    return os.path.join(PDF_FOLDER, f"recibos_{'_'.join(parts) or 'todos'}.pdf")
+
+def render_bundle_pdf(pdf_path, blocks, proof_for=None):
+    """Renders many receipts as successive pages of one PDF
+
+    Blocks are consumed one at a time (pass a generator such as
+    ReceiptBlockchain.select_receipts), each page is finished with showPage before the
+    next block is read, and fonts and the signature are embedded once for
+    the whole document. proof_for(block), when given, returns the Merkle
+    proof to put in each QR Code. Returns the number of pages; no file is
+    written when there is nothing to render.
+    """
+    from reportlab.pdfgen import canvas as pdf_canvas
+
+    pdf = pdf_canvas.Canvas(pdf_path, pagesize=A4, pageCompression=1)
+    pages = 0
+    for block in blocks:
+        with timed("pdf.page"):
+            draw_receipt_page(pdf, block, proof_for(block) if proof_for else None)
+        pages += 1
+    if pages:
+        with timed("pdf.save"):
+            pdf.save()
+    return pages
+
+def receipt_qr_payload(block, proof=None):
+    """Text of the verification QR Code, optionally with a compact Merkle proof"""
+    payload = f"RECIBO|ID:{block['receipt_id']}|HASH:{block['hash'][:15]}"
+    if proof:
+        payload += f"|MK:{encode_proof(proof)}"
+    return payload
+
+def receipt_body_lines(block):
+    """Body text of a receipt page as (distance below the body top, text)
+
+    Also used by the bulk PDF verifier to compare the printed text with
+    the block.
+    """
+    receipt = block["data"]
+    issued_at = datetime.fromisoformat(block["timestamp"])
+    return [
+        # Receipt text
+        (0, f"Recebi de {receipt['tenant']}, CPF/CNPJ {receipt['tenant_cpf']},"),
+        (25, f"a quantia de R$ {receipt['value']}, referente ao aluguel"),
+        (50, f"do imóvel localizado em {receipt['address']}."),
+        # Space
+        (90, f"Referente ao dia {receipt['day']}/{receipt['reference']}"),
+        (115, f"Data de emissão: {issued_at.strftime('%d/%m/%Y %H:%M:%S')}"),
+        # Landlord (WITHOUT CPF), below the line of the page template
+        (185, f"Locador: {receipt['landlord']}"),
+    ]
+
+def draw_receipt_page(pdf, block, proof=None):
+    """Draws one receipt as a page of an open PDF canvas"""
+    receipt_id = block["receipt_id"]
+    block_hash = block["hash"]
+
+    w, h = A4
+    layout = load_receipt_layout()
+    fields = layout["fields"]
+
+    # Title, lines and labels (see RECEIPT_LAYOUT)
+    draw_page_template(pdf, layout)
+    
+    # Unique Receipt ID
+    field = fields["receipt_id"]
+    pdf.setFont(field["font"], field["size"])
+    pdf.drawString(field["x"], layout_y(field, h), f"ID ÚNICO: {receipt_id}")
+    
+    # Receipt body
+    field = fields["body"]
+    pdf.setFont(field["font"], field["size"])
+    start_y = layout_y(field, h)
+    for offset, text in receipt_body_lines(block):
+        pdf.drawString(field["x"], start_y - offset, text)
+    
+    # Signature next to "Assinatura:" (read once, embedded once per document)
+    field = fields["signature"]
+    with timed("pdf.signature"):
+        draw_signature(pdf, field["x"], layout_y(field, h), field["width"], field["height"])
+    
+    # Small verification QR Code in footer, drawn as vectors (never touches disk)
+    field = fields["qr"]
+    qr_size = field["proof_size"] if proof else field["size"]
+    with timed("pdf.qr"):
+        draw_qr_code(
+            pdf,
+            receipt_qr_payload(block, proof),
+            w - field["right"] - qr_size,  # Bottom right corner
+            layout_y(field, h),
+            qr_size
+        )
+    
+    # Small security text in footer (read back by receipt_verify, keep its format)
+    field = fields["footer"]
+    pdf.setFont(field["font"], field["size"])
+    pdf.drawString(field["x"], layout_y(field, h),
+                   f"ID: {receipt_id} | Hash: {block_hash[:12]}... | Verificação: Sistema de Recibos")
+    
+    pdf.showPage()
@@ -0,0 +1,183 @@
+"""Chain writes shared by several processes and threads.
+
+Two operators can run the program on the same sistema_recibos folder (a
+network share, for instance). Every append then goes through the chain
+lock, an exclusive OS lock on a file next to the chain:
+
+    1. take the lock (waits while another process is appending)
+    2. read the blocks the other processes appended meanwhile (refresh)
+    3. build the new blocks on top of the real last block
+    4. write them all and fsync once (write_blocks), release the lock
+
+so no process ever links a block to a stale previous_hash. Full rewrites
+still go through a temp file and an atomic rename, under the same lock.
+
+GroupCommit merges the appends that threads of one process queue while
+a commit is running into the next commit: one lock round and one fsync
+for the whole group instead of one per receipt.
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # Retries for about 10 seconds, then raises: keep waiting
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChainLock:
+    """Exclusive lock shared by every process using the same lock file
+
+    Re-entrant: threads of one process are serialized by an RLock and only
+    the outermost holder takes the OS lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if not self._depth:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                f = open(self.path, "a+b")
+                try:
+                    lock_file(f)
+                except BaseException:
+                    f.close()
+                    raise
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._file = f
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if not self._depth:
+            try:
+                unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+        return False
+
+
+class LockedChain:
+    """commit() of the storage backends, on top of their refresh() and write_blocks()
+
+    A backend sets self.chain_lock and implements:
+
+        refresh()              reads the blocks appended by other processes
+        write_blocks(blocks)   appends blocks with a single fsync
+    """
+
+    def commit(self, builds, on_refresh=None):
+        """Appends the blocks made by builds, in order, under the chain lock
+
+        Each build(previous_block) returns the new block (previous_block is
+        None for an empty chain) or None to append nothing. on_refresh runs
+        once the blocks of the other processes have been read, before the
+        first build. Returns one result per build: the block, None or the
+        exception it raised.
+        """
+        with self.chain_lock:
+            self.refresh()
+            if on_refresh is not None:
+                on_refresh()
+            chain = self.chain
+            previous = chain[-1] if len(chain) else None
+            blocks = []
+            results = []
+            for build in builds:
+                try:
+                    block = build(previous)
+                except Exception as e:
+                    results.append(e)
+                    continue
+                results.append(block)
+                if block is not None:
+                    blocks.append(block)
+                    previous = block
+            if blocks:
+                self.write_blocks(blocks)
+        return results
+
+    def append_block(self, block):
+        """Appends one block as it is (it must link to the current last block)"""
+        with self.chain_lock:
+            self.refresh()
+            self.write_blocks([block])
+
+
+class GroupCommit:
+    """Merges the appends queued by concurrent threads into one commit
+
+    While a commit runs, new requests queue up; when it ends, the threads
+    it served return and one of the waiting threads commits everything
+    queued meanwhile as the next group.
+    """
+
+    def __init__(self, commit):
+        self.commit = commit
+        self._queue = []
+        self._committing = False
+        self._condition = threading.Condition()
+
+    def submit(self, builds):
+        """Results of commit() for these builds, committed with whatever else is queued"""
+        request = {"builds": builds, "results": None}
+        with self._condition:
+            self._queue.append(request)
+            while self._committing and request["results"] is None:
+                self._condition.wait()
+            if request["results"] is not None:
+                return request["results"]
+            self._committing = True
+            group, self._queue = self._queue, []
+
+        all_builds = [build for queued in group for build in queued["builds"]]
+        error = None
+        try:
+            results = self.commit(all_builds)
+        except BaseException as e:  # every request of the group gets the error
+            results = [e] * len(all_builds)
+            error = e
+        with self._condition:
+            position = 0
+            for queued in group:
+                queued["results"] = results[position:position + len(queued["builds"])]
+                position += len(queued["builds"])
+            self._committing = False
+            self._condition.notify_all()
+        if error is not None and not isinstance(error, Exception):
+            raise error
+        return request["results"]
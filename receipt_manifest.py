@@ -0,0 +1,204 @@
+"""Where each receipt PDF is, without listing the PDF folder.
+
+Receipt PDFs are kept in shard folders under pdfs/, by default one per
+reference month and tenant (PDF_LAYOUT "{year}/{month}/{cpf}"):
+
+    pdfs/2026/10/12345678900/recibo_REC-1A2B3C4D-20261005.pdf
+
+and every PDF generated is recorded in pdfs/manifesto.jsonl, one line per
+file, with its path relative to pdfs/, size and SHA-256:
+
+    {"receipt_id": "REC-...", "path": "2026/10/12345678900/recibo_REC-....pdf", "size": 5837, "sha256": "..."}
+
+A later line for the same receipt replaces the earlier one (PDF rendered
+again). Lines are appended under a file lock, so the worker processes of
+a batch and other operators can record their PDFs at the same time; each
+process reads only the lines added since it last looked.
+"""
+import hashlib
+import json
+import os
+import re
+
+from receipt_analytics import parse_reference
+from receipt_lock import ChainLock
+from receipt_storage import only_digits
+
+MANIFEST_NAME = "manifesto.jsonl"
+RECEIPT_PDF = re.compile(r"recibo_(.+)\.pdf")
+LAYOUT_FIELDS = ("year", "month", "cpf")
+
+
+def shard_folder(layout, block):
+    """Folder of a receipt PDF relative to the PDF folder ("" for the flat layout)
+
+    year and month come from the reference month, or from the issue date
+    in the receipt ID when the reference is unreadable.
+    """
+    receipt = block["data"]
+    reference = parse_reference(receipt.get("reference"))
+    if reference:
+        year, month = divmod(reference, 100)
+    else:
+        issued = block["receipt_id"][-8:]
+        year, month = int(issued[:4]), int(issued[4:6])
+    try:
+        folder = layout.format(year=f"{year:04d}", month=f"{month:02d}",
+                               cpf=only_digits(receipt.get("tenant_cpf")) or "sem_cpf")
+    except (KeyError, IndexError):
+        raise ValueError(f"PDF layout may only use {', '.join('{%s}' % f for f in LAYOUT_FIELDS)}: {layout}")
+    return os.path.normpath(folder) if folder.strip("/") else ""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfManifest:
+    """receipt_id -> {"path", "size", "sha256"} of the PDFs under a folder"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.lock = ChainLock(self.path + ".lock")
+        self.entries = {}
+        self._size = 0  # bytes of the manifest read
+        self._inode = None  # changes when the manifest is rewritten
+
+    def refresh(self):
+        """Reads the lines appended since the last call (all of them after a rewrite)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._size:
+            self.entries = {}
+            self._size = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._size:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # line still being written
+                self._size += len(line)
+                try:
+                    entry = json.loads(line)
+                    self.entries[entry.pop("receipt_id")] = entry
+                except (ValueError, KeyError):
+                    continue
+
+    def __len__(self):
+        self.refresh()
+        return len(self.entries)
+
+    def get(self, receipt_id):
+        self.refresh()
+        return self.entries.get(receipt_id)
+
+    def full_path(self, entry):
+        return os.path.join(self.folder, *entry["path"].split("/"))
+
+    def locate(self, receipt_id):
+        """Path of a receipt's PDF, or None if it was never generated or is gone"""
+        entry = self.get(receipt_id)
+        if entry is None:
+            return None
+        path = self.full_path(entry)
+        return path if os.path.exists(path) else None
+
+    def add(self, receipt_id, path):
+        """Records the PDF just written at path (under the manifest folder)"""
+        relative = os.path.relpath(path, self.folder).replace(os.sep, "/")
+        entry = {"path": relative, "size": os.path.getsize(path), "sha256": file_sha256(path)}
+        self.append([(receipt_id, entry)])
+        return entry
+
+    def append(self, items):
+        line = "".join(json.dumps({"receipt_id": receipt_id, **entry}, ensure_ascii=False) + "\n"
+                       for receipt_id, entry in items)
+        with self.lock:
+            self.refresh()
+            with open(self.path, "ab") as f:
+                f.write(line.encode("utf-8"))
+            self.refresh()
+
+    def compact(self):
+        """Rewrites the manifest with one line per receipt"""
+        with self.lock:
+            self.refresh()
+            temp_file = self.path + ".tmp"
+            with open(temp_file, "w", encoding="utf-8", newline="\n") as f:
+                for receipt_id, entry in self.entries.items():
+                    f.write(json.dumps({"receipt_id": receipt_id, **entry}, ensure_ascii=False) + "\n")
+            os.replace(temp_file, self.path)
+            self.refresh()
+
+    def check(self, receipt_id):
+        """"ok", "missing" (not recorded or file gone) or "changed" (size or hash differs)"""
+        entry = self.get(receipt_id)
+        if entry is None:
+            return "missing"
+        path = self.full_path(entry)
+        try:
+            if os.path.getsize(path) != entry["size"]:
+                return "changed"
+        except FileNotFoundError:
+            return "missing"
+        return "ok" if file_sha256(path) == entry["sha256"] else "changed"
+
+
+def migrate_pdf_folder(manifest, find_block, layout):
+    """Moves receipt PDFs into their shard folders and records them in the manifest
+
+    Looks at every recibo_<id>.pdf under the folder once (the flat folder
+    of older versions, or shards left by another layout); PDFs whose
+    receipt is not in the chain stay where they are. PDFs already in the
+    manifest keep their recorded size and hash, so running it again does
+    not hide a PDF changed since it was generated. Returns the counts of
+    moved, indexed (already in place) and unknown PDFs.
+    """
+    counts = {"moved": 0, "indexed": 0, "unknown": 0}
+    # Listed before anything moves, so moved PDFs are not seen twice
+    found = [(root, name, match.group(1))
+             for root, _, files in os.walk(manifest.folder)
+             for name in sorted(files)
+             for match in [RECEIPT_PDF.fullmatch(name)] if match]
+    items = []
+    for root, name, receipt_id in found:
+        block = find_block(receipt_id)
+        if block is None:
+            counts["unknown"] += 1
+            continue
+
+        path = os.path.join(root, name)
+        target = os.path.join(manifest.folder, shard_folder(layout, block), name)
+        if os.path.abspath(target) != os.path.abspath(path):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+            counts["moved"] += 1
+            if os.path.abspath(root) != os.path.abspath(manifest.folder):
+                try:
+                    os.removedirs(root)  # shard folders left empty
+                except OSError:
+                    pass
+        else:
+            counts["indexed"] += 1
+        relative = os.path.relpath(target, manifest.folder).replace(os.sep, "/")
+        entry = manifest.get(receipt_id)
+        if entry is None:
+            entry = {"size": os.path.getsize(target), "sha256": file_sha256(target)}
+        elif entry["path"] == relative:
+            continue
+        items.append((receipt_id, {**entry, "path": relative}))
+
+    if items:
+        manifest.append(items)
+    manifest.compact()
+    return counts
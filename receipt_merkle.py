@@ -0,0 +1,196 @@
+"""Per-month Merkle trees over the receipt block hashes.
+
+Each month (taken from the block timestamp, AAAA-MM) has its own tree, so
+an auditor only needs the published month roots to check one receipt:
+the inclusion proof is the list of sibling hashes from the receipt leaf
+up to the root, O(log N) hashes.
+
+The tree is the RFC 6962 one (leaves and nodes hashed with different
+prefixes, an odd last node is promoted to the level above), which can be
+grown one leaf at a time keeping only the perfect subtrees on the right
+edge. Only the standard library is used, so this module can be copied to
+a verification kiosk on its own:
+
+    python receipt_merkle.py raizes_merkle.json "RECIBO|ID:...|HASH:...|MK:..."
+"""
+import base64
+import hashlib
+import json
+import sys
+
+
+def leaf_hash(block_hash):
+    """Merkle leaf for a block hash (hex)"""
+    return hashlib.sha256(b"\x00" + bytes.fromhex(block_hash)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def block_month(block):
+    """Month a block belongs to, AAAA-MM from its timestamp"""
+    return block["timestamp"][:7]
+
+
+class MerkleMonth:
+    """Merkle tree of one month, grown one block hash at a time"""
+
+    def __init__(self):
+        self.leaves = []
+        self.block_indexes = []  # chain index of each leaf, ascending
+        self.frontier = []  # (height, digest) of the perfect subtrees on the right edge
+        self._levels = None  # all tree levels for the current size, built for proofs
+
+    def __len__(self):
+        return len(self.leaves)
+
+    def append(self, block_hash, block_index=None):
+        digest = leaf_hash(block_hash)
+        self.leaves.append(digest)
+        self.block_indexes.append(block_index)
+        self._levels = None
+        height = 0
+        while self.frontier and self.frontier[-1][0] == height:
+            _, left = self.frontier.pop()
+            digest = node_hash(left, digest)
+            height += 1
+        self.frontier.append((height, digest))
+
+    def root(self):
+        """Current root as hex, or None for an empty month"""
+        if not self.frontier:
+            return None
+        digest = self.frontier[-1][1]
+        for _, left in reversed(self.frontier[:-1]):
+            digest = node_hash(left, digest)
+        return digest.hex()
+
+    def levels(self):
+        """Every level of the tree, leaves first; kept until the next append"""
+        if self._levels is None:
+            level = self.leaves
+            self._levels = [level]
+            while len(level) > 1:
+                level = [
+                    node_hash(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                    for i in range(0, len(level), 2)
+                ]
+                self._levels.append(level)
+        return self._levels
+
+    def inclusion_path(self, leaf_index):
+        """Sibling hashes (bytes) from a leaf up to the current root"""
+        path = []
+        for level in self.levels()[:-1]:
+            sibling = leaf_index ^ 1
+            if sibling < len(level):
+                path.append(level[sibling])
+            leaf_index //= 2
+        return path
+
+
+def proof_root(block_hash, leaf_index, tree_size, path):
+    """Root (hex) obtained by climbing from a leaf with its sibling hashes"""
+    digest = leaf_hash(block_hash)
+    siblings = iter(path)
+    while tree_size > 1:
+        if leaf_index % 2:
+            digest = node_hash(next(siblings), digest)
+        elif leaf_index + 1 < tree_size:
+            digest = node_hash(digest, next(siblings))
+        leaf_index //= 2
+        tree_size = (tree_size + 1) // 2
+    if next(siblings, None) is not None:
+        raise ValueError("Proof has more hashes than the tree height")
+    return digest.hex()
+
+
+def verify_proof(proof, root):
+    """Checks an inclusion proof against a published month root (hex)
+
+    The proof is the dict returned by ReceiptBlockchain.get_inclusion_proof()
+    or decode_proof(); it needs block_hash, leaf_index, tree_size and path.
+    """
+    try:
+        path = [bytes.fromhex(h) if isinstance(h, str) else h for h in proof["path"]]
+        calculated = proof_root(proof["block_hash"], proof["leaf_index"], proof["tree_size"], path)
+    except (KeyError, ValueError, StopIteration):
+        return False
+    return calculated == root
+
+
+def encode_proof(proof):
+    """Compact text form of a proof for the QR payload
+
+    AAAA-MM.size.leaf.base64url(block hash + sibling hashes)
+    """
+    raw = bytes.fromhex(proof["block_hash"]) + b"".join(bytes.fromhex(h) for h in proof["path"])
+    packed = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    return f"{proof['month']}.{proof['tree_size']}.{proof['leaf_index']}.{packed}"
+
+
+def decode_proof(text):
+    """Inverse of encode_proof(); ValueError if the text is not a proof"""
+    parts = text.split(".")
+    if len(parts) != 4:
+        raise ValueError("Malformed proof")
+    month, tree_size, leaf_index, packed = parts
+    # Strict base64url; binascii.Error is a ValueError
+    raw = base64.b64decode(packed + "=" * (-len(packed) % 4), altchars=b"-_", validate=True)
+    if not raw or len(raw) % 32:
+        raise ValueError("Truncated proof")
+    hashes = [raw[i:i + 32].hex() for i in range(0, len(raw), 32)]
+    return {
+        "month": month,
+        "tree_size": int(tree_size),
+        "leaf_index": int(leaf_index),
+        "block_hash": hashes[0],
+        "path": hashes[1:],
+    }
+
+
+def parse_qr_payload(payload):
+    """Splits "RECIBO|ID:...|HASH:...[|MK:...]" into a dict of its fields"""
+    fields = payload.strip().split("|")
+    if fields[0] != "RECIBO":
+        raise ValueError("Not a receipt QR Code")
+    return dict(field.split(":", 1) for field in fields[1:])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: receipt_merkle.py <published roots .json> <QR payload>", file=sys.stderr)
+        return 2
+
+    with open(argv[0], "r", encoding="utf-8") as f:
+        roots = json.load(f)
+    try:
+        fields = parse_qr_payload(argv[1])
+    except ValueError:
+        print("❌ Conteúdo não é o QR Code de um recibo")
+        return 1
+    if "MK" not in fields:
+        print("❌ QR Code sem prova Merkle")
+        return 1
+
+    try:
+        proof = decode_proof(fields["MK"])
+    except ValueError:
+        print(f"❌ Prova Merkle inválida no QR Code de {fields.get('ID')}")
+        return 1
+    published = roots.get(proof["month"])
+    if (published is None or published["size"] != proof["tree_size"]
+            or not proof["block_hash"].startswith(fields.get("HASH", ""))):
+        print(f"❌ Nenhuma raiz publicada confere com a prova de {fields.get('ID')}")
+        return 1
+    if not verify_proof(proof, published["root"]):
+        print(f"❌ RECIBO {fields.get('ID')} NÃO confere com a raiz de {proof['month']}")
+        return 1
+    print(f"✅ RECIBO {fields.get('ID')} incluído na raiz de {proof['month']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Hot-path timing of the receipt pipeline.
+
+Off by default, and then timed() hands back a shared no-op context so the
+instrumented code pays one function call. Set an environment variable to
+turn it on, no code change needed:
+
+    RECIBOS_METRICS=1  time every stage and keep rolling histograms, written
+                       in Prometheus text format to sistema_recibos/metricas/recibos.prom
+    RECIBOS_TRACE=1    also append one JSON line per receipt with the time of
+                       each of its stages to sistema_recibos/metricas/trace.jsonl
+
+Stages are named "<area>.<step>", e.g. chain.append, pdf.qr, pdf.save;
+pdf.page is a whole page and so includes pdf.qr and pdf.signature.
+Only the process that issues the receipts is measured: PDFs rendered by
+the batch worker processes are not collected.
+"""
+from collections import deque
+from contextlib import contextmanager
+import atexit
+import json
+import os
+import threading
+import time
+
+# Inside receipt_core.METRICS_FOLDER, which is created only once something is written
+METRICS_NAME = "recibos.prom"
+TRACE_NAME = "trace.jsonl"
+
+TRACE_ENABLED = os.environ.get("RECIBOS_TRACE", "") not in ("", "0")
+METRICS_ENABLED = TRACE_ENABLED or os.environ.get("RECIBOS_METRICS", "") not in ("", "0")
+
+# Histogram upper bounds in seconds, from a dict lookup to a slow fsync
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Samples kept per stage for the recent quantiles
+WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class StageHistogram:
+    """Cumulative bucket counts of one stage plus a window of recent samples"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        samples = sorted(self.recent)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+_histograms = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def observe(stage, seconds):
+    """Records one timing of a stage (and adds it to the current trace)"""
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = StageHistogram()
+        histogram.observe(seconds)
+
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace["stages"][stage] = trace["stages"].get(stage, 0.0) + seconds * 1000
+
+
+class _Timer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage):
+    """Context manager timing a stage: with timed("pdf.save"): ..."""
+    if not METRICS_ENABLED:
+        return _NO_TIMER
+    return _Timer(stage)
+
+
+@contextmanager
+def receipt_trace():
+    """Collects the stage timings of one receipt issued in this thread
+
+    Yields a dict; set its "receipt_id" once it is known. When tracing is
+    on, the trace is appended to trace.jsonl on exit and the metrics file
+    is refreshed.
+    """
+    if not METRICS_ENABLED:
+        yield {}
+        return
+
+    trace = {"receipt_id": None, "started_at": time.time(), "stages": {}}
+    _local.trace = trace
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        trace["total_ms"] = (time.perf_counter() - started) * 1000
+        observe("receipt.total", trace["total_ms"] / 1000)
+        if TRACE_ENABLED:
+            write_trace(trace)
+        export_prometheus()
+
+
+def metrics_path(name):
+    """Path of a file in the metrics folder, creating the folder"""
+    from receipt_core import METRICS_FOLDER  # receipt_core imports this module
+
+    os.makedirs(METRICS_FOLDER, exist_ok=True)
+    return os.path.join(METRICS_FOLDER, name)
+
+
+def write_trace(trace, path=None):
+    path = path or metrics_path(TRACE_NAME)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(trace, separators=(",", ":")) + "\n")
+
+
+def format_prometheus():
+    """All stage histograms in the Prometheus text exposition format"""
+    with _lock:
+        stages = sorted((stage, h.counts[:], h.count, h.total, [h.quantile(q) for q in QUANTILES])
+                        for stage, h in _histograms.items())
+
+    lines = [
+        "# HELP recibos_stage_seconds Time spent in each stage of the receipt pipeline.",
+        "# TYPE recibos_stage_seconds histogram",
+    ]
+    for stage, counts, count, total, _ in stages:
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'recibos_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'recibos_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'recibos_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+        lines.append(f'recibos_stage_seconds_count{{stage="{stage}"}} {count}')
+
+    lines += [
+        f"# HELP recibos_stage_recent_seconds Quantiles over the last {WINDOW} timings of each stage.",
+        "# TYPE recibos_stage_recent_seconds gauge",
+    ]
+    for stage, _, _, _, quantiles in stages:
+        for q, value in zip(QUANTILES, quantiles):
+            lines.append(f'recibos_stage_recent_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(path=None):
+    """Writes the metrics file atomically (a scraper never reads half of it)"""
+    if not _histograms:
+        return None
+    path = path or metrics_path(METRICS_NAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(format_prometheus())
+    os.replace(temp_path, path)
+    return path
+
+
+if METRICS_ENABLED:
+    atexit.register(export_prometheus)
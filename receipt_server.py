@@ -0,0 +1,236 @@
+"""Verification of receipts over HTTP, for QR Code scans on the office LAN.
+
+    python receipt_cli.py serve --host 0.0.0.0 --port 8765
+
+    GET /verify/REC-XXXXXXXX-AAAAMMDD
+    GET /verify/RECIBO|ID:REC-...|HASH:...     (the QR Code text, URL-encoded)
+
+answers with the result of ReceiptBlockchain.verify_receipt() as JSON:
+
+    {"receipt_id": "REC-...", "found": true, "valid": true, "block_index": 12,
+     "hash": "...", "timestamp": "...", "receipt": {...the receipt fields...}}
+
+with status 200, or 404 and "found": false for an unknown ID. When the
+QR Code text is given, its short hash must also match the block.
+
+A single asyncio loop serves every connection (HTTP/1.1 keep-alive, no
+framework needed). Receipts are found through the storage's in-memory
+index; the encoded responses of the receipts found are kept in an LRU
+cache, since a block never changes once it is in the chain. Lookups that
+miss the cache run in a thread, as they may read blocks other processes
+appended.
+"""
+from collections import OrderedDict
+from urllib.parse import unquote
+import asyncio
+import json
+import re
+import threading
+
+from receipt_metrics import timed
+
+DEFAULT_PORT = 8765
+# Verification results kept in memory (a few hundred bytes each)
+CACHE_SIZE = 10000
+# Seconds an idle keep-alive connection is kept open
+IDLE_TIMEOUT = 30
+# Limits of a request: the request line and each header, their count and the body
+# (a verification is a GET, the body is read only to skip it)
+MAX_LINE_SIZE = 8 * 1024
+MAX_HEADER_LINES = 100
+MAX_BODY_SIZE = 16 * 1024
+
+QR_PAYLOAD = re.compile(r"RECIBO\|ID:([^|]+)\|HASH:([0-9a-f]+)(?:\|.*)?")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large"}
+
+
+class RequestError(Exception):
+    """Request answered with an error status, after which the connection is closed"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class VerificationCache:
+    """LRU cache of encoded verification responses, by receipt ID"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, receipt_id):
+        with self._lock:
+            response = self._items.get(receipt_id)
+            if response is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(receipt_id)
+            self.hits += 1
+            return response
+
+    def put(self, receipt_id, response):
+        with self._lock:
+            self._items[receipt_id] = response
+            self._items.move_to_end(receipt_id)
+            if len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def verification_result(receipt_id, is_valid, block):
+    """Status and JSON body for the result of verify_receipt()"""
+    if block is None:
+        return 404, {"receipt_id": receipt_id, "found": False, "valid": False}
+    return 200, {
+        "receipt_id": receipt_id,
+        "found": True,
+        "valid": bool(is_valid),
+        "block_index": block["index"],
+        "hash": block["hash"],
+        "timestamp": block["timestamp"],
+        "receipt": block["data"],
+    }
+
+
+def encode_response(status, body, keep_alive=True):
+    content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("ascii") + content
+
+
+class VerificationServer:
+    """GET /verify/<receipt_id> over one ReceiptBlockchain"""
+
+    def __init__(self, blockchain=None, cache_size=CACHE_SIZE):
+        if blockchain is None:
+            from receipt_core import ReceiptBlockchain
+            blockchain = ReceiptBlockchain()
+        self.blockchain = blockchain
+        self.cache = VerificationCache(cache_size)
+
+    async def verify(self, receipt_id):
+        """(status, body) of a receipt ID, from the cache when possible"""
+        cached = self.cache.get(receipt_id)
+        if cached is not None:
+            return cached
+        loop = asyncio.get_running_loop()
+        is_valid, block = await loop.run_in_executor(None, self.blockchain.verify_receipt, receipt_id)
+        status, body = verification_result(receipt_id, is_valid, block)
+        if block is not None:
+            self.cache.put(receipt_id, (status, body))  # misses may be issued any moment
+        return status, body
+
+    async def respond(self, method, target):
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        path = target.split("?", 1)[0]
+        if not path.startswith("/verify/"):
+            return 404, {"error": "use /verify/<receipt_id>"}
+        receipt_id = unquote(path[len("/verify/"):]).strip()
+
+        qr_hash = None
+        payload = QR_PAYLOAD.fullmatch(receipt_id)
+        if payload:
+            receipt_id, qr_hash = payload.groups()
+        if not receipt_id:
+            return 400, {"error": "missing receipt ID"}
+
+        with timed("http.verify"):
+            status, body = await self.verify(receipt_id)
+        if qr_hash is not None and body["found"] and not body["hash"].startswith(qr_hash):
+            body = {**body, "valid": False, "error": "QR Code hash differs from the chain"}
+        return status, body
+
+    async def read_request(self, reader):
+        """(request line parts, headers) of the next request, None once the client is gone
+
+        The body, if any, is read and dropped. Raises RequestError for a
+        request over the limits or that cannot be parsed.
+        """
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        except ValueError:  # longer than MAX_LINE_SIZE (LimitOverrunError included)
+            raise RequestError(400, "request line too long")
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise RequestError(400, "malformed request")
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise RequestError(400, "header line too long")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise RequestError(400, "too many headers")
+
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            raise RequestError(400, "invalid Content-Length")
+        if int(length) > MAX_BODY_SIZE:
+            raise RequestError(413, "request body too large")
+        await reader.readexactly(int(length))
+        return parts, headers
+
+    async def handle(self, reader, writer):
+        """One client connection: requests answered in order until it closes or idles"""
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except RequestError as error:
+                    writer.write(encode_response(error.status, {"error": str(error)}, keep_alive=False))
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                (method, target, version), headers = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                status, body = await self.respond(method, target)
+                writer.write(encode_response(status, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        """Serves until cancelled; ready(port) is called once connections are accepted"""
+        loop = asyncio.get_running_loop()
+        # Chain and receipt index loaded before the first request
+        await loop.run_in_executor(None, lambda: self.blockchain.chain)
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024, limit=MAX_LINE_SIZE)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(host="127.0.0.1", port=DEFAULT_PORT, cache_size=CACHE_SIZE, ready=None):
+    """Runs the verification server in this thread until interrupted"""
+    try:
+        asyncio.run(VerificationServer(cache_size=cache_size).serve(host, port, ready))
+    except KeyboardInterrupt:
+        pass
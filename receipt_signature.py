@@ -0,0 +1,134 @@
+"""Handwritten signature kept as strokes instead of a bitmap.
+
+A signature is the list of strokes drawn on the capture canvas, each a
+flat list of canvas coordinates [x0, y0, x1, y1, ...] (origin at the top
+left, y pointing down), simplified with Ramer-Douglas-Peucker so a long
+signature stays a few hundred points. It is saved as a small JSON file
+(assinaturas/assinatura.json) with the canvas size, and drawn in the PDF
+as one vector path, smoothed with curves through the midpoints:
+
+    {"width": 400, "height": 150, "strokes": [[12, 80, 15, 76, ...], ...]}
+"""
+import json
+import os
+
+from receipt_storage import write_json_file
+
+# Largest distance, in canvas pixels, a simplified stroke may drift from the drawn one
+TOLERANCE = 0.8
+# Pen width on the capture canvas, in canvas pixels
+PEN_WIDTH = 2
+
+
+def simplify(points, tolerance=TOLERANCE):
+    """Ramer-Douglas-Peucker over a list of (x, y), keeping both ends"""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    pending = [(0, len(points) - 1)]
+    while pending:
+        first, last = pending.pop()
+        (x1, y1), (x2, y2) = points[first], points[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        farthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            x, y = points[i]
+            if length:
+                d = abs(dy * (x - x1) - dx * (y - y1)) / length
+            else:
+                d = ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            pending.append((first, farthest))
+            pending.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def flatten(points):
+    """[x0, y0, x1, y1, ...] rounded to tenths of a pixel, for the JSON file"""
+    return [round(value, 1) for point in points for value in point]
+
+
+def save_strokes(path, strokes, width, height):
+    """Saves strokes given as lists of (x, y) canvas points"""
+    write_json_file(path, {
+        "width": width,
+        "height": height,
+        "strokes": [flatten(simplify(stroke)) for stroke in strokes if stroke],
+    })
+
+
+_strokes_cache = {}
+
+
+def load_strokes(path):
+    """The saved signature (dict as in the module docstring), or None
+
+    Read once per file version, cached on path and mtime like the
+    signature image.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = (os.path.abspath(path), mtime)
+    signature = _strokes_cache.get(key)
+    if signature is None:
+        with open(path, "r", encoding="utf-8") as f:
+            signature = json.load(f)
+        if not signature.get("strokes"):
+            return None
+        _strokes_cache.clear()
+        _strokes_cache[key] = signature
+    return signature
+
+
+def stroke_points(stroke):
+    return list(zip(stroke[0::2], stroke[1::2]))
+
+
+def draw_strokes(pdf, signature, x, y, width, height):
+    """Draws the strokes in the box (x, y, width, height) of the PDF page
+
+    The canvas is scaled to fit the box keeping its proportions and
+    centred in it, like drawImage(preserveAspectRatio=True) did with the
+    bitmap.
+    """
+    scale = min(width / signature["width"], height / signature["height"])
+    left = x + (width - signature["width"] * scale) / 2
+    top = y + (height + signature["height"] * scale) / 2
+
+    def page_point(point):
+        return left + point[0] * scale, top - point[1] * scale
+
+    path = pdf.beginPath()
+    for stroke in signature["strokes"]:
+        points = [page_point(point) for point in stroke_points(stroke)]
+        path.moveTo(*points[0])
+        if len(points) == 1:
+            path.lineTo(*points[0])  # a dot, drawn by the round line cap
+            continue
+        # Quadratic curves through the midpoints, written as cubic Béziers
+        current = points[0]
+        for control, following in zip(points[1:-1], points[2:]):
+            end = ((control[0] + following[0]) / 2, (control[1] + following[1]) / 2)
+            path.curveTo(
+                current[0] + 2 / 3 * (control[0] - current[0]), current[1] + 2 / 3 * (control[1] - current[1]),
+                end[0] + 2 / 3 * (control[0] - end[0]), end[1] + 2 / 3 * (control[1] - end[1]),
+                end[0], end[1],
+            )
+            current = end
+        path.lineTo(*points[-1])
+
+    pdf.saveState()
+    pdf.setLineWidth(PEN_WIDTH * scale)
+    pdf.setLineCap(1)
+    pdf.setLineJoin(1)
+    pdf.setStrokeColorRGB(0, 0, 0)
+    pdf.drawPath(path, stroke=1, fill=0)
+    pdf.restoreState()
@@ -0,0 +1,941 @@
+"""Storage backends for the receipt chain and the tenants.
+
+Every backend exposes the same small interface, used by ReceiptBlockchain
+and the tenant functions of receipt_core:
+
+    chain                  sequence of blocks (len, [i], [-1], iteration)
+    commit(builds)         appends new blocks under the chain lock (receipt_lock)
+    append_block(block)    persists one new block
+    save_chain(chain)      rewrites the whole chain
+    find_position(id)      chain index of a receipt ID, or None
+    reindex()              rebuilds the receipt ID lookup
+    select_blocks(...)     receipt blocks of a tenant CPF and/or reference month
+    load_tenants() / save_tenants(tenants) / add_tenant(tenant)
+
+"json" rewrites blockchain.json on every block (the original format),
+"journal" appends to blockchain.jsonl with a receipt_id sidecar index,
+"segments" splits the journal into one file per month and only reads the
+current one at startup, and "sqlite" keeps chain and tenants in a
+WAL-mode SQLite database that is queried on demand instead of being
+loaded at startup. "binary" (receipt_binary) is a compact length-prefixed
+record file with memory-mapped indexes. The JSON files stay
+the import/export format of every backend. Opening a backend reads no
+blocks: the file backends load the chain the first time it is used.
+
+Several processes can share one folder: loads, appends and rewrites take
+the backend's chain lock (<main file>.lock), and each append first reads
+what the other processes appended (see receipt_lock).
+"""
+import bisect
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+
+from receipt_lock import ChainLock, LockedChain
+
+
+def only_digits(text):
+    """CPF/CNPJ without punctuation, so 123.456.789-00 matches 12345678900"""
+    return re.sub(r"\D", "", text or "")
+
+
+def select_receipt_blocks(chain, tenant_cpf=None, reference=None):
+    """Yields the receipt blocks of a tenant CPF and/or reference month (MM/AAAA)"""
+    tenant_cpf = only_digits(tenant_cpf)
+    reference = (reference or "").strip()
+    for block in chain:
+        receipt = block["data"]
+        if not isinstance(receipt, dict):
+            continue  # genesis block
+        if tenant_cpf and only_digits(receipt.get("tenant_cpf")) != tenant_cpf:
+            continue
+        if reference and receipt.get("reference") != reference:
+            continue
+        yield block
+
+
+def file_identity(path):
+    """(inode, size, mtime) of a file, or None: changes whenever it is written or replaced"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def encode_block(block):
+    """Canonical block record: compact JSON, key order preserved, one line"""
+    return json.dumps(block, ensure_ascii=False, separators=(",", ":"), default=dict) + "\n"
+
+
+def write_json_file(path, content):
+    """Writes a pretty-printed JSON file atomically (temp file + rename)"""
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # one per writer
+    with open(temp_file, "w", encoding="utf-8") as f:
+        # default=dict writes the Block objects of the binary backend as dicts
+        json.dump(content, f, indent=4, ensure_ascii=False, default=dict)
+    os.replace(temp_file, path)
+
+
+# ---------------- JSON FILES ----------------
+# Tenants added since locatarios.json was last written are appended, one per
+# line, to locatarios.jsonl; past this many lines the two are merged on load
+TENANTS_LOG_LIMIT = 500
+
+
+class JsonTenantsFile:
+    """Registered tenants kept in locatarios.json (all file backends)
+
+    New tenants are appended to a small log next to it instead of
+    rewriting the whole list on every registration.
+    """
+
+    @property
+    def tenants_log_file(self):
+        return os.path.splitext(self.tenants_file)[0] + ".jsonl"
+
+    def load_tenants(self):
+        """Loads the registered tenants list (the file plus the log)"""
+        tenants = []
+        if os.path.exists(self.tenants_file):
+            with open(self.tenants_file, "r", encoding="utf-8") as f:
+                tenants = json.load(f)
+        if os.path.exists(self.tenants_log_file):
+            logged = 0
+            with open(self.tenants_log_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn last line
+                    tenants.append(json.loads(line))
+                    logged += 1
+            if logged > TENANTS_LOG_LIMIT:
+                self.save_tenants(tenants)
+        return tenants
+
+    def save_tenants(self, tenants):
+        """Saves the registered tenants list, emptying the log"""
+        write_json_file(self.tenants_file, tenants)
+        if os.path.exists(self.tenants_log_file):
+            os.remove(self.tenants_log_file)
+
+    def add_tenant(self, tenant):
+        """Appends one tenant to the log"""
+        with open(self.tenants_log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(tenant, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class JournalStorage(JsonTenantsFile, LockedChain):
+    """Append-only journal, one canonical JSON record per block"""
+
+    name = "journal"
+
+    def __init__(self, chain_file, journal_file, index_file, tenants_file):
+        self.chain_file = chain_file
+        self.journal_file = journal_file
+        self.index_file = index_file
+        self.tenants_file = tenants_file
+        self.chain_lock = ChainLock(journal_file + ".lock")
+        self._chain = None
+        self._index = None
+        self._journal_size = 0  # bytes of the journal read into the chain
+        self._journal_inode = None  # changes when the journal is rewritten
+
+    @property
+    def chain(self):
+        """The chain, loaded on first use (tenant lookups never pay for it)"""
+        if self._chain is None:
+            # Under the chain lock, so a record another process is still
+            # writing is never taken for a torn one
+            with self.chain_lock:
+                if self._chain is None:
+                    self.reload()
+        return self._chain
+
+    def reload(self):
+        self._chain = self.load_chain()
+        self._index = self.load_index()
+
+    @property
+    def index(self):
+        self.chain
+        return self._index
+
+    def load_chain(self):
+        """Loads the chain (empty list when nothing was saved yet)"""
+        if os.path.exists(self.journal_file):
+            return self.replay_journal()
+        if os.path.exists(self.chain_file):
+            return self.migrate_to_journal()
+        return []
+
+    def replay_journal(self):
+        """Rebuilds the chain from the append-only journal.
+
+        A torn last line (crash in the middle of an append) is cut off so
+        the next append starts on a clean record boundary.
+        """
+        chain = []
+        valid_size = 0
+        with open(self.journal_file, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    chain.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+        if valid_size != os.path.getsize(self.journal_file):
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(valid_size)
+        self._journal_inode = os.stat(self.journal_file).st_ino
+        self._journal_size = valid_size
+        return chain
+
+    def refresh(self):
+        """Reads the blocks other processes appended since this one last looked
+
+        Called with the chain lock held. A journal rewritten meanwhile
+        (save_chain in another process) is read again from the start.
+        """
+        if self._chain is None:
+            self.reload()
+            return
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._journal_inode or stat.st_size < self._journal_size:
+            self.reload()
+            return
+        if stat.st_size == self._journal_size:
+            return
+
+        with open(self.journal_file, "rb") as f:
+            f.seek(self._journal_size)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    block = json.loads(line)
+                except ValueError:
+                    break
+                self._chain.append(block)
+                self._index[block["receipt_id"]] = block["index"]
+                self._journal_size += len(line)
+        if self._journal_size != stat.st_size:
+            # Torn record of a writer that crashed while holding the lock
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(self._journal_size)
+
+    def migrate_to_journal(self):
+        """One-shot migration from blockchain.json to the journal.
+
+        The old file is kept next to the journal as blockchain.json.migrado.
+        """
+        with open(self.chain_file, "r", encoding="utf-8") as f:
+            chain = json.load(f)
+        self.write_journal(chain)
+        os.replace(self.chain_file, self.chain_file + ".migrado")
+        return chain
+
+    def write_journal(self, chain):
+        """Writes the full journal atomically (temp file + rename)"""
+        temp_file = self.journal_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for block in chain:
+                f.write(encode_block(block))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.journal_file)
+        stat = os.stat(self.journal_file)
+        self._journal_inode = stat.st_ino
+        self._journal_size = stat.st_size
+
+    def write_blocks(self, blocks):
+        """Appends block records to the journal with a single fsync (chain lock held)"""
+        chain = self.chain
+        records = "".join(encode_block(block) for block in blocks).encode("utf-8")
+        with open(self.journal_file, "ab") as f:
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+            if self._journal_inode is None:
+                self._journal_inode = os.fstat(f.fileno()).st_ino
+        self._journal_size += len(records)
+        chain.extend(blocks)
+        self.index_blocks(blocks)
+
+    def save_chain(self, chain):
+        with self.chain_lock:
+            self.write_journal(chain)
+            self._chain = list(chain)
+            self.reindex()
+
+    def load_index(self):
+        """Loads the receipt_id -> block index sidecar, rebuilding it if stale"""
+        index = {}
+        last_entry = None
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        receipt_id, _, position = line[:-1].partition("\t")
+                        last_entry = (receipt_id, int(position))
+                        index[receipt_id] = last_entry[1]
+            except ValueError:
+                last_entry = None
+
+        last_block = self.chain[-1] if self.chain else None
+        expected_last = (last_block["receipt_id"], last_block["index"]) if last_block else None
+        if len(index) != len(self.chain) or last_entry != expected_last:
+            return self.reindex()
+        return index
+
+    def reindex(self):
+        """Rebuilds the receipt index from the chain and rewrites the sidecar"""
+        self._index = {block["receipt_id"]: position for position, block in enumerate(self.chain)}
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for receipt_id, position in self._index.items():
+                f.write(f"{receipt_id}\t{position}\n")
+        os.replace(temp_file, self.index_file)
+        return self._index
+
+    def index_blocks(self, blocks):
+        """Adds freshly appended blocks to the receipt index and its sidecar"""
+        for block in blocks:
+            self._index[block["receipt_id"]] = block["index"]
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            f.write("".join(f"{block['receipt_id']}\t{block['index']}\n" for block in blocks))
+
+    def find_position(self, receipt_id):
+        return self.index.get(receipt_id)
+
+    def select_blocks(self, tenant_cpf=None, reference=None):
+        return select_receipt_blocks(self.chain, tenant_cpf, reference)
+
+    def close(self):
+        pass
+
+
+class JsonStorage(JournalStorage):
+    """Original format: blockchain.json rewritten on every new block"""
+
+    name = "json"
+
+    def __init__(self, chain_file, journal_file, index_file, tenants_file):
+        super().__init__(chain_file, journal_file, index_file, tenants_file)
+        self.chain_lock = ChainLock(chain_file + ".lock")
+        self._chain_identity = None
+
+    def load_chain(self):
+        self._chain_identity = file_identity(self.chain_file)
+        if self._chain_identity is not None:
+            with open(self.chain_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return []
+
+    def refresh(self):
+        """Reads the file again if another process rewrote it (chain lock held)"""
+        if self._chain is None or file_identity(self.chain_file) != self._chain_identity:
+            self.reload()
+
+    def write_blocks(self, blocks):
+        self.save_chain(self.chain + blocks)
+
+    def save_chain(self, chain):
+        with self.chain_lock:
+            write_json_file(self.chain_file, chain)
+            self._chain_identity = file_identity(self.chain_file)
+            self._chain = list(chain)
+            self.reindex()
+
+
+# ---------------- RECEIPT ID FILES ----------------
+ID_ENTRY = struct.Struct("<QI")  # hash of the receipt ID, chain index
+
+
+def receipt_id_key(receipt_id):
+    return int.from_bytes(hashlib.blake2b(receipt_id.encode(), digest_size=8).digest(), "little")
+
+
+def search_id_entries(ids, receipt_id):
+    """Chain indexes whose entry in a sorted ID file matches the receipt ID's key
+
+    Different IDs can share the 64-bit key: the caller confirms each one
+    with the block itself.
+    """
+    key = receipt_id_key(receipt_id)
+    low, high = 0, len(ids) // ID_ENTRY.size
+    while low < high:
+        middle = (low + high) // 2
+        if ID_ENTRY.unpack_from(ids, middle * ID_ENTRY.size)[0] < key:
+            low = middle + 1
+        else:
+            high = middle
+    while low < len(ids) // ID_ENTRY.size:
+        entry_key, position = ID_ENTRY.unpack_from(ids, low * ID_ENTRY.size)
+        if entry_key != key:
+            break
+        yield position
+        low += 1
+
+
+def write_id_file(path, blocks):
+    """Writes the sorted ID entries of blocks (temporary file renamed into place)"""
+    entries = sorted((receipt_id_key(block["receipt_id"]), block["index"]) for block in blocks)
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file, "wb") as f:
+        f.write(b"".join(ID_ENTRY.pack(key, position) for key, position in entries))
+    os.replace(temp_file, path)
+
+
+# ---------------- MONTH SEGMENTS ----------------
+def segment_month(block):
+    """Month segment of a block, AAAA-MM from its timestamp"""
+    return block["timestamp"][:7]
+
+
+def receipt_id_month(receipt_id):
+    """AAAA-MM from the date at the end of a receipt ID, or None"""
+    date = receipt_id.rpartition("-")[2]
+    if len(date) != 8 or not date.isdigit():
+        return None
+    return f"{date[:4]}-{date[4:6]}"
+
+
+def segment_ids_path(path):
+    """AAAA-MM.ids next to the segment AAAA-MM.jsonl"""
+    return os.path.splitext(path)[0] + ".ids"
+
+
+class ArchivedSegment:
+    """A closed month segment, memory-mapped read-only and parsed on access
+
+    Receipt IDs are looked up in the segment's sorted ID file, written
+    when the month is closed (or on the first lookup, for segments closed
+    before these files existed).
+    """
+
+    def __init__(self, path, entry):
+        self.path = path
+        self.entry = entry
+        self._file = open(path, "rb")
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = None
+        self._ids = None
+
+    @property
+    def offsets(self):
+        """Start of each record, plus the end of the file"""
+        if self._offsets is None:
+            offsets = [0]
+            offsets.extend(match.end() for match in re.finditer(rb"\n", self.map))
+            if len(offsets) - 1 != self.entry["count"]:
+                raise ValueError(f"Segment {self.path} has {len(offsets) - 1} blocks, "
+                                 f"the manifest says {self.entry['count']}")
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self):
+        return self.entry["count"]
+
+    def __getitem__(self, position):
+        offsets = self.offsets
+        return json.loads(self.map[offsets[position]:offsets[position + 1]])
+
+    def __iter__(self):
+        offsets = self.offsets
+        for position in range(len(offsets) - 1):
+            yield json.loads(self.map[offsets[position]:offsets[position + 1]])
+
+    @property
+    def ids(self):
+        """The segment's ID file, memory-mapped (written first if missing or stale)"""
+        if self._ids is None:
+            path = segment_ids_path(self.path)
+            if not os.path.exists(path) or os.path.getsize(path) != len(self) * ID_ENTRY.size:
+                write_id_file(path, self)
+            with open(path, "rb") as f:
+                self._ids = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._ids
+
+    def find_position(self, receipt_id):
+        """Chain index of a receipt ID in this segment, or None"""
+        first_index = self.entry["first_index"]
+        for position in search_id_entries(self.ids, receipt_id):
+            if self[position - first_index]["receipt_id"] == receipt_id:
+                return position
+        return None
+
+    def close(self):
+        if self._ids is not None:
+            self._ids.close()
+        self.map.close()
+        self._file.close()
+
+
+class SegmentedChain:
+    """Sequence view over all month segments, in chain order"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __len__(self):
+        return self.storage.length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(itertools.islice(iter(self), *position.indices(len(self))))
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("chain index out of range")
+        number = bisect.bisect_right(self.storage.first_indexes, position) - 1
+        segment = self.storage.segment(number)
+        return segment[position - self.storage.entries[number]["first_index"]]
+
+    def __iter__(self):
+        for number in range(len(self.storage.entries)):
+            yield from self.storage.segment(number)
+
+
+class SegmentedStorage(JsonTenantsFile, LockedChain):
+    """Chain split into one journal file per month plus a manifest
+
+    Only the active (last) month is read at startup; closed months are
+    opened memory-mapped when a lookup, audit or listing reaches them.
+    The manifest lists each segment's file, first chain index, block
+    count and first/last hash; a closed segment's first block links to
+    the previous segment's last hash like any other block. The active
+    segment's count and last hash are brought up to date from its file
+    when it is loaded. Each closed month has a sorted receipt ID file
+    (AAAA-MM.ids, see ArchivedSegment). A new manifest imports the
+    existing chain once.
+    """
+
+    name = "segments"
+
+    def __init__(self, segments_folder, tenants_file, import_from=None):
+        self.folder = segments_folder
+        self.manifest_file = os.path.join(segments_folder, "manifesto.json")
+        self.tenants_file = tenants_file
+        self.import_from = import_from
+        self.entries = None
+        self.first_indexes = None
+        self.active = None  # blocks of the active segment, in memory
+        self.active_index = None  # receipt_id -> chain index in the active segment
+        self.archived = {}  # segment number -> ArchivedSegment, opened on demand
+        self.chain = SegmentedChain(self)
+        self.chain_lock = ChainLock(self.manifest_file + ".lock")
+        self._load_lock = threading.RLock()
+        self._seen = None  # manifest identity and active segment size after the last read or write
+
+    @property
+    def length(self):
+        self.load()
+        entry = self.entries[-1] if self.entries else None
+        return entry["first_index"] + len(self.active) if entry else 0
+
+    def load(self):
+        """Reads the manifest and the active segment, the first time only"""
+        if self.entries is not None:
+            return
+        with self.chain_lock:
+            if self.entries is not None:
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            if not os.path.exists(self.manifest_file):
+                chain = list(self.import_from.chain) if self.import_from is not None else []
+                self.import_from = None
+                self.write_segments(chain)
+                return
+
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)["segments"]
+            active = self.replay_segment(entries[-1]) if entries else []
+            if entries:
+                entries[-1].update(self.segment_stats(active))
+            self.set_state(entries, active)
+            self._seen = self.seen_state()
+
+    def seen_state(self):
+        entry = self.entries[-1] if self.entries else None
+        identity = file_identity(self.segment_path(entry)) if entry else None
+        return file_identity(self.manifest_file), identity[1] if identity else 0
+
+    def refresh(self):
+        """Reads manifest and active segment again if another process wrote them
+
+        Called with the chain lock held; only the active month is re-read.
+        """
+        if self.entries is not None and self.seen_state() != self._seen:
+            self.entries = None
+        self.load()
+
+    def segment_path(self, entry):
+        return os.path.join(self.folder, entry["file"])
+
+    def replay_segment(self, entry):
+        """Blocks of a segment file, cutting off a torn last record"""
+        path = self.segment_path(entry)
+        if not os.path.exists(path):
+            return []
+        blocks = []
+        valid_size = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    blocks.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+        if valid_size != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(valid_size)
+        return blocks
+
+    @staticmethod
+    def segment_stats(blocks):
+        return {
+            "count": len(blocks),
+            "first_hash": blocks[0]["hash"] if blocks else None,
+            "last_hash": blocks[-1]["hash"] if blocks else None,
+        }
+
+    def set_state(self, entries, active):
+        self.close()
+        self.entries = entries
+        self.first_indexes = [entry["first_index"] for entry in entries]
+        self.active = active
+        self.active_index = {block["receipt_id"]: block["index"] for block in active}
+
+    def write_manifest(self):
+        write_json_file(self.manifest_file, {"segments": self.entries})
+
+    def write_segments(self, chain):
+        """Writes a whole chain as month segments and a new manifest"""
+        self.close()  # no segment file may stay mapped while it is replaced
+        groups = []
+        for block in chain:
+            month = segment_month(block)
+            # A new segment starts when the month moves forward
+            if not groups or month > groups[-1][0]:
+                groups.append((month, []))
+            groups[-1][1].append(block)
+
+        entries = []
+        for month, blocks in groups:
+            entry = {"month": month, "file": f"{month}.jsonl", "first_index": blocks[0]["index"]}
+            entry.update(self.segment_stats(blocks))
+            temp_file = self.segment_path(entry) + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                for block in blocks:
+                    f.write(encode_block(block))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.segment_path(entry))
+            ids_file = segment_ids_path(self.segment_path(entry))
+            if month != groups[-1][0]:
+                write_id_file(ids_file, blocks)
+            elif os.path.exists(ids_file):
+                os.remove(ids_file)  # the active month has none
+            entries.append(entry)
+
+        self.set_state(entries, groups[-1][1] if groups else [])
+        self.write_manifest()
+        self._seen = self.seen_state()
+
+    def segment(self, number):
+        """Blocks of a segment: the in-memory list or the mmapped file"""
+        self.load()
+        if number == len(self.entries) - 1:
+            return self.active
+        if not self.entries[number]["count"]:
+            return []  # month started but never written (crash right after it was opened)
+        segment = self.archived.get(number)
+        if segment is None:
+            with self._load_lock:
+                segment = self.archived.get(number)
+                if segment is None:
+                    entry = self.entries[number]
+                    segment = self.archived[number] = ArchivedSegment(self.segment_path(entry), entry)
+        return segment
+
+    def write_blocks(self, blocks):
+        """Appends blocks to the active segment, starting a new month if needed
+
+        One fsync per segment written (chain lock held).
+        """
+        self.load()
+        with self._load_lock:
+            position = 0
+            while position < len(blocks):
+                month = segment_month(blocks[position])
+                if not self.entries or month > self.entries[-1]["month"]:
+                    # Close the active month: its final count and last hash go to
+                    # the manifest before the new segment gets its first block
+                    if self.entries and self.active:
+                        write_id_file(segment_ids_path(self.segment_path(self.entries[-1])), self.active)
+                    self.entries.append({
+                        "month": month, "file": f"{month}.jsonl", "first_index": blocks[position]["index"],
+                        "count": 0, "first_hash": None, "last_hash": None,
+                    })
+                    self.first_indexes.append(blocks[position]["index"])
+                    self.active = []
+                    self.active_index = {}
+                    self.write_manifest()
+
+                # Blocks up to the first one of a later month go to the active segment
+                entry = self.entries[-1]
+                end = position + 1
+                while end < len(blocks) and segment_month(blocks[end]) <= entry["month"]:
+                    end += 1
+                group = blocks[position:end]
+                with open(self.segment_path(entry), "ab") as f:
+                    f.write("".join(encode_block(block) for block in group).encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                for block in group:
+                    self.active.append(block)
+                    self.active_index[block["receipt_id"]] = block["index"]
+                entry["count"] += len(group)
+                entry["first_hash"] = entry["first_hash"] or group[0]["hash"]
+                entry["last_hash"] = group[-1]["hash"]
+                position = end
+            self._seen = self.seen_state()
+
+    def save_chain(self, chain):
+        chain = list(chain)
+        with self.chain_lock, self._load_lock:
+            self.write_segments(chain)
+
+    def find_position(self, receipt_id):
+        """Active month from memory, then the month in the receipt ID, then the rest"""
+        self.load()
+        position = self.active_index.get(receipt_id)
+        if position is not None:
+            return position
+
+        archived = range(len(self.entries) - 2, -1, -1)
+        month = receipt_id_month(receipt_id)
+        likely = [number for number in archived if self.entries[number]["month"] == month]
+        for number in likely + [number for number in archived if number not in likely]:
+            position = self.segment(number).find_position(receipt_id)
+            if position is not None:
+                return position
+        return None
+
+    def reindex(self):
+        self.load()
+        self.active_index = {block["receipt_id"]: block["index"] for block in self.active}
+
+    def select_blocks(self, tenant_cpf=None, reference=None):
+        return select_receipt_blocks(self.chain, tenant_cpf, reference)
+
+    def close(self):
+        for segment in self.archived.values():
+            segment.close()
+        self.archived = {}
+
+
+# ---------------- SQLITE ----------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    idx INTEGER PRIMARY KEY,
+    receipt_id TEXT NOT NULL UNIQUE,
+    tenant_cpf TEXT,
+    reference TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_tenant_reference ON blocks (tenant_cpf, reference);
+CREATE INDEX IF NOT EXISTS blocks_reference ON blocks (reference);
+CREATE TABLE IF NOT EXISTS tenants (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    cpf TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tenants_cpf ON tenants (cpf);
+CREATE INDEX IF NOT EXISTS tenants_name ON tenants (name);
+"""
+
+
+class SqliteChain:
+    """Read-only sequence view of the blocks table, nothing is loaded up front"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        row = connection.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM blocks").fetchone()
+        self.length = row[0]
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            start, stop, step = position.indices(self.length)
+            rows = self.connection.execute(
+                "SELECT record FROM blocks WHERE idx >= ? AND idx < ? ORDER BY idx", (start, stop)
+            ).fetchall()
+            return [json.loads(record) for (record,) in rows][::step]
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("chain index out of range")
+        row = self.connection.execute("SELECT record FROM blocks WHERE idx = ?", (position,)).fetchone()
+        return json.loads(row[0])
+
+    def __iter__(self):
+        cursor = self.connection.execute("SELECT record FROM blocks ORDER BY idx")
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for (record,) in rows:
+                yield json.loads(record)
+
+
+class SqliteStorage(LockedChain):
+    """Chain and tenants in SQLite (WAL mode), one row per block or tenant
+
+    A new database imports the existing JSON files (chain and tenants) once,
+    into a temporary file renamed into place when complete, so an import
+    that fails or is cut short is simply done again on the next start.
+    SQLite locks the database itself; the chain lock also keeps the last
+    block from changing between reading it and inserting the next one.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, database_file, import_from=None):
+        self.chain_lock = ChainLock(database_file + ".lock")
+        if import_from is not None and not os.path.exists(database_file):
+            with self.chain_lock:
+                if not os.path.exists(database_file):  # or another process just imported it
+                    self.import_json(import_from, database_file)
+        self.connection = sqlite3.connect(database_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(SCHEMA)
+        self.chain = SqliteChain(self.connection)
+
+    def import_json(self, storage, database_file):
+        """Creates database_file with the chain and tenants of a JSON storage (chain lock held)"""
+        temp_file = database_file + ".import"
+        for path in (temp_file, temp_file + "-journal"):
+            if os.path.exists(path):
+                os.remove(path)  # left by an import that did not finish
+        connection = sqlite3.connect(temp_file)
+        try:
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.executescript(SCHEMA)
+            with connection:
+                connection.executemany(
+                    "INSERT INTO blocks (idx, receipt_id, tenant_cpf, reference, record) VALUES (?, ?, ?, ?, ?)",
+                    (self.block_row(block) for block in storage.chain)
+                )
+                connection.executemany(
+                    "INSERT INTO tenants (name, cpf, record) VALUES (?, ?, ?)",
+                    (self.tenant_row(tenant) for tenant in storage.load_tenants())
+                )
+        finally:
+            connection.close()
+        os.replace(temp_file, database_file)
+
+    @staticmethod
+    def block_row(block):
+        receipt = block["data"] if isinstance(block["data"], dict) else {}
+        return (
+            block["index"],
+            block["receipt_id"],
+            only_digits(receipt.get("tenant_cpf")),
+            receipt.get("reference"),
+            encode_block(block),
+        )
+
+    @staticmethod
+    def tenant_row(tenant):
+        return (tenant["name"], only_digits(tenant["cpf"]), json.dumps(tenant, ensure_ascii=False))
+
+    def refresh(self):
+        """Picks up the blocks other processes inserted (chain lock held)"""
+        row = self.connection.execute("SELECT COALESCE(MAX(idx) + 1, 0) FROM blocks").fetchone()
+        self.chain.length = row[0]
+
+    def write_blocks(self, blocks):
+        """Inserts blocks in one transaction (a single WAL sync)"""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO blocks (idx, receipt_id, tenant_cpf, reference, record) VALUES (?, ?, ?, ?, ?)",
+                [self.block_row(block) for block in blocks]
+            )
+        self.chain.length = blocks[-1]["index"] + 1
+
+    def save_chain(self, chain):
+        rows = [self.block_row(block) for block in chain]
+        with self.chain_lock, self.connection:
+            self.connection.execute("DELETE FROM blocks")
+            self.connection.executemany(
+                "INSERT INTO blocks (idx, receipt_id, tenant_cpf, reference, record) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        self.chain.length = len(rows)
+
+    def find_position(self, receipt_id):
+        row = self.connection.execute("SELECT idx FROM blocks WHERE receipt_id = ?", (receipt_id,)).fetchone()
+        return row[0] if row else None
+
+    def reindex(self):
+        self.connection.execute("REINDEX blocks")
+
+    def select_blocks(self, tenant_cpf=None, reference=None):
+        conditions, params = [], []
+        if tenant_cpf:
+            conditions.append("tenant_cpf = ?")
+            params.append(only_digits(tenant_cpf))
+        if reference:
+            conditions.append("reference = ?")
+            params.append(reference.strip())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else "WHERE idx > 0"
+        cursor = self.connection.execute(f"SELECT record FROM blocks {where} ORDER BY idx", params)
+        for (record,) in cursor:
+            yield json.loads(record)
+
+    def load_tenants(self):
+        rows = self.connection.execute("SELECT record FROM tenants ORDER BY id").fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def save_tenants(self, tenants):
+        with self.connection:
+            self.connection.execute("DELETE FROM tenants")
+            self.connection.executemany(
+                "INSERT INTO tenants (name, cpf, record) VALUES (?, ?, ?)",
+                (self.tenant_row(tenant) for tenant in tenants)
+            )
+
+    def add_tenant(self, tenant):
+        with self.connection:
+            self.connection.execute("INSERT INTO tenants (name, cpf, record) VALUES (?, ?, ?)", self.tenant_row(tenant))
+
+    def close(self):
+        self.connection.close()
+
+
+def export_json(storage, chain_file, tenants_file):
+    """Writes chain and tenants of any storage as blockchain.json / locatarios.json"""
+    write_json_file(chain_file, list(storage.chain))
+    write_json_file(tenants_file, storage.load_tenants())
@@ -0,0 +1,107 @@
+"""Indexed tenant register for large portfolios.
+
+TenantStore keeps the registered tenants indexed by name and by CPF/CNPJ
+(digits only, so 123.456.789-00 and 12345678900 are the same tenant) and
+a sorted list of search keys for type-ahead: every word of a name starts
+a key, without accents or case, so "silv" and "jose" both find
+"José da Silva". Adding a tenant updates the indexes in place and stores
+only that tenant (see JsonTenantsFile.add_tenant).
+"""
+import bisect
+import unicodedata
+
+from receipt_core import open_storage
+from receipt_storage import only_digits
+
+
+def search_key(text):
+    """Text without accents and case, for prefix comparisons"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+class TenantStore:
+    def __init__(self, storage=None):
+        self.storage = storage
+        self.tenants = []
+        self.by_name = {}
+        self.by_cpf = {}
+        self.keys = []  # sorted (search key, name) for every word start of every name
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def load(self):
+        """Reads the tenants from storage and builds the indexes"""
+        if self.storage is None:
+            self.storage = open_storage()
+        self.tenants = []
+        self.by_name = {}
+        self.by_cpf = {}
+        keys = []
+        for tenant in self.storage.load_tenants():
+            # A name registered twice keeps its first record, like the old list scan
+            if tenant["name"] in self.by_name:
+                continue
+            self.index(tenant)
+            keys.extend(self.name_keys(tenant["name"]))
+        keys.sort()
+        self.keys = keys
+        return self
+
+    @staticmethod
+    def name_keys(name):
+        words = search_key(name).split()
+        return [(" ".join(words[i:]), name) for i in range(len(words))]
+
+    def index(self, tenant):
+        self.tenants.append(tenant)
+        self.by_name[tenant["name"]] = tenant
+        self.by_cpf.setdefault(only_digits(tenant["cpf"]), tenant)
+
+    def find_by_name(self, name):
+        return self.by_name.get(name)
+
+    def find_by_cpf(self, cpf):
+        return self.by_cpf.get(only_digits(cpf))
+
+    def add(self, name, cpf, address, value="", payment_day=""):
+        """Registers a new tenant, refusing a repeated name or CPF/CNPJ
+
+        value and payment_day are the defaults of the monthly receipts
+        (see receipt_batch.issue_monthly_receipts).
+        """
+        name, cpf, address = name.strip(), cpf.strip(), address.strip()
+        value, payment_day = value.strip(), payment_day.strip()
+        if payment_day and not (payment_day.isdigit() and 1 <= int(payment_day) <= 31):
+            raise ValueError(f"Dia de pagamento inválido: {payment_day}")
+        if not only_digits(cpf):
+            raise ValueError(f"CPF/CNPJ inválido: {cpf}")
+        existing = self.find_by_cpf(cpf)
+        if existing is not None:
+            raise ValueError(f"CPF/CNPJ {cpf} já cadastrado para {existing['name']}")
+        if name in self.by_name:
+            raise ValueError(f"Locatário {name} já cadastrado")
+
+        tenant = {"name": name, "cpf": cpf, "address": address, "value": value, "payment_day": payment_day}
+        self.storage.add_tenant(tenant)
+        self.index(tenant)
+        for key in self.name_keys(name):
+            bisect.insort(self.keys, key)
+        return tenant
+
+    def search(self, text, limit=50):
+        """Names with a word starting with text, in alphabetical order"""
+        prefix = search_key(text)
+        if not prefix:
+            return sorted(self.by_name, key=search_key)[:limit]
+
+        names = {}
+        position = bisect.bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and len(names) < limit:
+            key, name = self.keys[position]
+            if not key.startswith(prefix):
+                break
+            names[name] = None
+            position += 1
+        return sorted(names, key=search_key)
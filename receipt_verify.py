@@ -0,0 +1,190 @@
+"""Bulk verification of a folder of receipt PDFs.
+
+Each PDF is opened without a PDF library: the page content streams are
+inflated (zlib, after ASCII85 when ReportLab used it) and the text shown
+on the page is read from the string operands. The receipt ID and short
+hash come from the footer ("ID: REC-... | Hash: <12 hex>..."); the QR Code
+carries the same fields but is drawn as vector squares, so it is not
+decoded. Bundle PDFs give one receipt per page.
+
+Reading the PDFs is spread over worker processes; the checks run in this
+process against the chain index, each receipt ID verified once. Every
+receipt ends up as:
+
+    valid     footer hash, block hash and printed text match the chain
+    tampered  the ID is in the chain but the hash or the text differs
+    unknown   no receipt in the PDF, unreadable PDF or ID not in the chain
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import base64
+import csv
+import os
+import re
+import time
+import zlib
+
+from receipt_core import DATA_FOLDER, ReceiptBlockchain, ensure_folders, receipt_body_lines
+
+FOOTER = re.compile(r"ID: (\S+) \| Hash: ([0-9a-f]{12})\.\.\.")
+STREAM_START = re.compile(rb"(?<!end)stream\r?\n")
+SHOW_TEXT = re.compile(rb"\(((?:[^()\\]|\\.)*)\)\s*Tj", re.S)
+ESCAPE = re.compile(rb"\\([0-7]{1,3}|.)", re.S)
+ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+REPORT_FIELDS = ("file", "page", "receipt_id", "status", "reason")
+ISSUE_DATE = "Data de emissão: "
+# The first version printed the issue date from its own clock reading,
+# taken just after the block's: allowed this many seconds later
+LEGACY_DATE_SLACK = 5
+
+
+def pdf_content_streams(data):
+    """Yields the decoded content of every non-image stream of a PDF"""
+    for match in STREAM_START.finditer(data):
+        header = data[data.rfind(b" obj", 0, match.start()):match.start()]
+        if b"/Subtype /Image" in header:
+            continue
+        end = data.find(b"endstream", match.end())
+        content = data[match.end():end]
+        for name in re.findall(rb"/(ASCII85Decode|FlateDecode)", header):
+            if name == b"ASCII85Decode":
+                content = base64.a85decode(content.strip().removesuffix(b"~>"))
+            else:
+                content = zlib.decompress(content)
+        yield content
+
+
+def unescape_pdf_string(raw):
+    """Text of a PDF literal string, as written by ReportLab (WinAnsi)"""
+    def replace(match):
+        escape = match.group(1)
+        if escape[:1].isdigit():
+            return bytes([int(escape, 8) & 0xFF])
+        return ESCAPES.get(escape, escape)
+    return ESCAPE.sub(replace, raw).decode("cp1252", errors="replace")
+
+
+def read_pdf_receipts(path):
+    """Receipts printed in a PDF, one per page with a receipt footer
+
+    Returns (path, receipts, error); each receipt is a dict with
+    receipt_id, short_hash and the set of text lines of its page.
+    Runs in the worker processes.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        receipts = []
+        for content in pdf_content_streams(data):
+            lines = {unescape_pdf_string(raw) for raw in SHOW_TEXT.findall(content)}
+            for line in lines:
+                footer = FOOTER.search(line)
+                if footer:
+                    receipts.append({
+                        "receipt_id": footer.group(1),
+                        "short_hash": footer.group(2),
+                        "lines": lines,
+                    })
+                    break
+        return path, receipts, None
+    except (OSError, ValueError, zlib.error) as e:
+        return path, [], str(e)
+
+
+def legacy_date_matches(text, lines):
+    """Whether a first-version page prints an issue date just after the block's"""
+    expected = datetime.strptime(text[len(ISSUE_DATE):], "%d/%m/%Y %H:%M:%S")
+    for line in lines:
+        if line.startswith(ISSUE_DATE):
+            try:
+                printed = datetime.strptime(line[len(ISSUE_DATE):], "%d/%m/%Y %H:%M:%S")
+            except ValueError:
+                continue
+            if 0 <= (printed - expected).total_seconds() <= LEGACY_DATE_SLACK:
+                return True
+    return False
+
+
+def check_receipt(found, verified, legacy=False):
+    """Status and reason of one printed receipt
+
+    verified maps a receipt ID to ReceiptBlockchain.verify_receipt()'s
+    result, so each ID is only looked up once. legacy is set for receipts
+    of the first version of the program (ReceiptBlockchain.legacy_blocks).
+    """
+    is_valid, block = verified
+    if block is None:
+        return "unknown", "ID não encontrado na blockchain"
+    if not block["hash"].startswith(found["short_hash"]):
+        return "tampered", "hash do rodapé difere da blockchain"
+    if not is_valid:
+        return "tampered", "hash do bloco na blockchain é inválido"
+    for _, text in receipt_body_lines(block):
+        if text not in found["lines"]:
+            if legacy and text.startswith(ISSUE_DATE) and legacy_date_matches(text, found["lines"]):
+                continue
+            return "tampered", f"texto difere da blockchain: {text}"
+    return "valid", ""
+
+
+def find_pdfs(folder):
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                yield os.path.join(root, name)
+
+
+def default_report_path():
+    ensure_folders()
+    return os.path.join(DATA_FOLDER, f"verificacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+
+def verify_folder(folder, report_path=None, blockchain=None, workers=None):
+    """Verifies every receipt PDF under a folder and writes a CSV report
+
+    Returns a summary dict with the report path, the number of files and
+    receipts, the count of each status, the elapsed time and the rate in
+    receipts per second.
+    """
+    if blockchain is None:
+        blockchain = ReceiptBlockchain()
+    report_path = report_path or default_report_path()
+    paths = list(find_pdfs(folder))
+
+    started = time.perf_counter()
+    counts = {"valid": 0, "tampered": 0, "unknown": 0}
+    verified = {}
+    legacy_blocks = blockchain.legacy_blocks()
+
+    with open(report_path, "w", encoding="utf-8", newline="") as report, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.writer(report)
+        writer.writerow(REPORT_FIELDS)
+        for path, receipts, error in pool.map(read_pdf_receipts, paths, chunksize=16):
+            file_name = os.path.relpath(path, folder)
+            if error or not receipts:
+                counts["unknown"] += 1
+                writer.writerow((file_name, "", "", "unknown", f"PDF ilegível: {error}" if error
+                                 else "nenhum recibo encontrado no PDF"))
+                continue
+            for page, found in enumerate(receipts, start=1):
+                receipt_id = found["receipt_id"]
+                if receipt_id not in verified:
+                    verified[receipt_id] = blockchain.verify_receipt(receipt_id)
+                block = verified[receipt_id][1]
+                legacy = block is not None and block["index"] < legacy_blocks
+                status, reason = check_receipt(found, verified[receipt_id], legacy)
+                counts[status] += 1
+                writer.writerow((file_name, page, receipt_id, status, reason))
+
+    elapsed = time.perf_counter() - started
+    receipts = sum(counts.values())
+    return {
+        "report": report_path,
+        "files": len(paths),
+        "receipts": receipts,
+        "counts": counts,
+        "elapsed": elapsed,
+        "rate": receipts / elapsed if elapsed else 0.0,
+    }
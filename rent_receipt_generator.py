@@ -1,198 +1,163 @@
 from tkinter import *
-from tkinter import ttk, messagebox
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas as pdf_canvas
+from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageTk
-import json
+from concurrent.futures import ThreadPoolExecutor
 import os
-import hashlib
-import uuid
-import qrcode
-import base64
-from io import BytesIO
+import queue
 import subprocess
 import platform
 
-# ---------------- ORGANIZED FOLDERS ----------------
-BASE_FOLDER = "sistema_recibos"
-DATA_FOLDER = os.path.join(BASE_FOLDER, "dados")
-PDF_FOLDER = os.path.join(BASE_FOLDER, "pdfs")
-BLOCKCHAIN_FOLDER = os.path.join(BASE_FOLDER, "blockchain")
-TENANTS_FOLDER = os.path.join(BASE_FOLDER, "locatarios")
-SIGNATURE_FOLDER = os.path.join(BASE_FOLDER, "assinaturas")
-
-# Files inside folders
-BLOCKCHAIN_FILE = os.path.join(BLOCKCHAIN_FOLDER, "blockchain.json")
-TENANTS_FILE = os.path.join(TENANTS_FOLDER, "locatarios.json")
-SIGNATURE_FILE = os.path.join(SIGNATURE_FOLDER, "assinatura.png")
-
-# Create folders if they don't exist
-for folder in [BASE_FOLDER, DATA_FOLDER, PDF_FOLDER, BLOCKCHAIN_FOLDER, 
-               TENANTS_FOLDER, SIGNATURE_FOLDER]:
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-
-# ---------------- SIMULATED BLOCKCHAIN ----------------
-class ReceiptBlockchain:
-    def __init__(self):
-        self.chain_file = BLOCKCHAIN_FILE
-        self.chain = self.load_chain()
-        
-    def load_chain(self):
-        """Loads blockchain from file"""
-        if os.path.exists(self.chain_file):
-            with open(self.chain_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        else:
-            # Genesis block (first block)
-            genesis_block = {
-                "index": 0,
-                "timestamp": str(datetime.now()),
-                "data": "Genesis Block",
-                "previous_hash": "0",
-                "hash": self.calculate_hash(0, "Genesis Block", "0", str(datetime.now())),
-                "receipt_id": "GENESIS-0000"
-            }
-            return [genesis_block]
-    
-    def calculate_hash(self, index, data, previous_hash, timestamp):
-        """Calculates SHA-256 hash of the block"""
-        block_string = f"{index}{data}{previous_hash}{timestamp}"
-        return hashlib.sha256(block_string.encode()).hexdigest()
-    
-    def create_receipt_block(self, receipt_data):
-        """Creates a new block for the receipt"""
-        previous_block = self.chain[-1]
-        index = len(self.chain)
-        
-        # Generates unique receipt ID
-        receipt_id = f"REC-{uuid.uuid4().hex[:8].upper()}-{datetime.now().strftime('%Y%m%d')}"
-        
-        # Block data (WITHOUT landlord's CPF)
-        block_data = {
-            "receipt_id": receipt_id,
-            "landlord": receipt_data.get("landlord"),
-            "tenant": receipt_data.get("tenant"),
-            "tenant_cpf": receipt_data.get("tenant_cpf"),
-            "value": receipt_data.get("value"),
-            "reference": receipt_data.get("reference"),
-            "day": receipt_data.get("day"),
-            "address": receipt_data.get("address"),
-            "timestamp": str(datetime.now())
-        }
-        
-        # Creates the block
-        new_block = {
-            "index": index,
-            "timestamp": str(datetime.now()),
-            "data": block_data,
-            "previous_hash": previous_block["hash"],
-            "hash": self.calculate_hash(index, json.dumps(block_data), previous_block["hash"], str(datetime.now())),
-            "receipt_id": receipt_id
-        }
-        
-        # Adds to the chain
-        self.chain.append(new_block)
-        self.save_chain()
-        
-        return receipt_id, new_block["hash"]
-    
-    def save_chain(self):
-        """Saves chain to file"""
-        with open(self.chain_file, "w", encoding="utf-8") as f:
-            json.dump(self.chain, f, indent=4, ensure_ascii=False)
-    
-    def verify_receipt(self, receipt_id):
-        """Verifies receipt authenticity"""
-        for block in self.chain:
-            if block.get("receipt_id") == receipt_id:
-                # Verifies hash
-                calculated_hash = self.calculate_hash(
-                    block["index"],
-                    json.dumps(block["data"]),
-                    block["previous_hash"],
-                    block["timestamp"]
-                )
-                return calculated_hash == block["hash"], block
-        return False, None
-    
-    def get_receipt_info(self, receipt_id):
-        """Gets receipt information by ID"""
-        for block in self.chain:
-            if block.get("receipt_id") == receipt_id:
-                return block["data"]
-        return None
-
-# Initialize blockchain
+from receipt_core import (
+    BASE_FOLDER, PDF_FOLDER, BLOCKCHAIN_FOLDER, TENANTS_FOLDER, SIGNATURE_FILE, SIGNATURE_STROKES_FILE,
+    ReceiptBlockchain, annual_report_path, generate_receipt_pdf,
+    has_signature, ensure_folders
+)
+from receipt_analytics import export_annual_csv, format_brl, render_annual_pdf
+from receipt_batch import issue_monthly_receipts
+from receipt_metrics import receipt_trace
+from receipt_signature import load_strokes, save_strokes, stroke_points
+from receipt_tenants import TenantStore
+
+# Initialize blockchain (the chain itself is read on first use, see START)
 blockchain = ReceiptBlockchain()
 
+# ---------------- BACKGROUND JOBS ----------------
+# Chain writes, QR Codes and PDFs run on a single worker thread, so blocks are
+# still appended one at a time and several receipts can wait in line. Tk
+# widgets may only be touched from the main thread: results come back
+# through a queue that the Tk loop polls with window.after.
+worker = ThreadPoolExecutor(max_workers=1)
+job_results = queue.Queue()
+pending_jobs = 0
+
+def run_in_background(job, on_done, *args):
+    """Runs job(*args) on the worker thread, then on_done(result, error) in Tk"""
+    global pending_jobs
+    pending_jobs += 1
+    update_job_status()
+
+    def task():
+        try:
+            job_results.put((on_done, job(*args), None))
+        except Exception as e:
+            job_results.put((on_done, None, e))
+
+    worker.submit(task)
+
+def poll_job_results():
+    global pending_jobs
+    while True:
+        try:
+            on_done, result, error = job_results.get_nowait()
+        except queue.Empty:
+            break
+        pending_jobs -= 1
+        update_job_status()
+        on_done(result, error)
+    window.after(100, poll_job_results)
+
+def update_job_status():
+    if pending_jobs:
+        label_job_status.config(text=f"⏳ Processando... {pending_jobs} tarefa(s) na fila")
+        progress_jobs.start(10)
+    else:
+        label_job_status.config(text="")
+        progress_jobs.stop()
+
 # ---------------- DATA STORAGE ----------------
-tenants = []
+# Tenants indexed by name and CPF, with prefix search for the selector
+tenant_store = TenantStore()
 
 def load_tenants():
-    global tenants
-    if os.path.exists(TENANTS_FILE):
-        with open(TENANTS_FILE, "r", encoding="utf-8") as f:
-            tenants = json.load(f)
-            tenant_combo["values"] = [t["name"] for t in tenants]
-
-def save_tenants():
-    with open(TENANTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(tenants, f, indent=4, ensure_ascii=False)
-
-# ---------------- SIGNATURE (FIXED + SAVED) ----------------
-signature_points = []
+    tenant_store.load()
+    update_tenant_choices()
+
+def update_tenant_choices(event=None):
+    """Type-ahead: the selector lists only the names matching what was typed"""
+    if event is not None and event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+        return
+    tenant_combo["values"] = tenant_store.search(tenant_combo.get())
+
+# ---------------- SIGNATURE (STROKES, SAVED AS VECTORS) ----------------
+# Every stroke is kept as its list of canvas points (a new stroke no longer
+# wipes the previous ones). The stroke being drawn is a few canvas lines
+# extended as the mouse moves, each holding up to SEGMENT_POINTS points,
+# instead of one new canvas item per mouse event.
+SEGMENT_POINTS = 32
+signature_strokes = []
+signature_line = None  # canvas line of the stroke being drawn
+segment_start = 0  # first point of the stroke in that line
 drawing = False
 
 def start_signature(event):
-    global drawing
+    global drawing, signature_line
     drawing = True
-    signature_points.clear()
-    signature_points.append((event.x, event.y))
+    signature_line = None
+    signature_strokes.append([(event.x, event.y)])
 
 def draw_signature(event):
-    if not drawing or not signature_points:
+    global signature_line, segment_start
+    if not drawing or not signature_strokes:
         return
-    x, y = event.x, event.y
-    last_x, last_y = signature_points[-1]
-    canvas_signature.create_line(
-        last_x, last_y, x, y,
-        width=2, capstyle=ROUND, smooth=True
-    )
-    signature_points.append((x, y))
+    stroke = signature_strokes[-1]
+    last_x, last_y = stroke[-1]
+    if abs(event.x - last_x) < 2 and abs(event.y - last_y) < 2:
+        return  # less than 2 px away: not worth a point
+    stroke.append((event.x, event.y))
+
+    if signature_line is None or len(stroke) - segment_start > SEGMENT_POINTS:
+        segment_start = len(stroke) - 2
+        signature_line = canvas_signature.create_line(
+            *stroke[segment_start:], width=2, capstyle=ROUND, smooth=True
+        )
+    else:
+        canvas_signature.coords(signature_line, *[value for point in stroke[segment_start:] for value in point])
 
 def stop_signature(event):
     global drawing
     drawing = False
+    if signature_strokes and len(signature_strokes[-1]) == 1:
+        draw_signature_dot(*signature_strokes[-1][0])
+
+def draw_signature_dot(x, y):
+    canvas_signature.create_oval(x - 1, y - 1, x + 1, y + 1, fill="black")
 
 def clear_signature():
     canvas_signature.delete("all")
-    signature_points.clear()
+    signature_strokes.clear()
 
 def save_signature():
-    if not signature_points:
+    if not signature_strokes:
         messagebox.showerror("Error", "No signature to save.")
         return
 
-    img = Image.new("RGB", (400, 150), "white")
-    draw = ImageDraw.Draw(img)
-
-    for i in range(1, len(signature_points)):
-        draw.line(
-            [signature_points[i-1], signature_points[i]],
-            fill="black",
-            width=2
-        )
-
-    img.save(SIGNATURE_FILE)
+    ensure_folders()
+    save_strokes(SIGNATURE_STROKES_FILE, signature_strokes,
+                 int(canvas_signature["width"]), int(canvas_signature["height"]))
     messagebox.showinfo("Success", "Signature saved successfully!")
 
 def load_saved_signature():
+    signature = load_strokes(SIGNATURE_STROKES_FILE)
+    if signature is not None:
+        # Back on the canvas as strokes, so more can be added before saving again
+        canvas_signature.delete("all")
+        signature_strokes.clear()
+        for stroke in signature["strokes"]:
+            points = stroke_points(stroke)
+            signature_strokes.append(points)
+            if len(points) > 1:
+                canvas_signature.create_line(*stroke, width=2, capstyle=ROUND, smooth=True)
+            else:
+                draw_signature_dot(*points[0])
+        return
+
+    # Signature saved as PNG by an older version
     if not os.path.exists(SIGNATURE_FILE):
         messagebox.showerror("Error", "No saved signature found.")
         return
 
+    from PIL import Image, ImageTk
+
     img = Image.open(SIGNATURE_FILE)
     img_tk = ImageTk.PhotoImage(img)
 
@@ -229,23 +194,25 @@ def save_tenant():
     name = entry_tenant_name.get()
     cpf = entry_tenant_cpf.get()
     address = entry_tenant_address.get()
+    default_value = entry_tenant_value.get()
+    payment_day = entry_tenant_day.get()
 
     if not all([name, cpf, address]):
         messagebox.showerror("Error", "Fill in all fields.")
         return
 
-    tenants.append({
-        "name": name,
-        "cpf": cpf,
-        "address": address
-    })
-
-    save_tenants()
-    tenant_combo["values"] = [t["name"] for t in tenants]
+    try:
+        tenant_store.add(name, cpf, address, default_value, payment_day)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
+    update_tenant_choices()
 
     entry_tenant_name.delete(0, END)
     entry_tenant_cpf.delete(0, END)
     entry_tenant_address.delete(0, END)
+    entry_tenant_value.delete(0, END)
+    entry_tenant_day.delete(0, END)
 
     messagebox.showinfo("Success", "Tenant registered and saved!")
 
@@ -256,7 +223,7 @@ def show_register():
     frame_register.pack(fill="both", expand=True)
 
 def show_receipt():
-    if not tenants:
+    if not len(tenant_store):
         messagebox.showerror("Error", "Register at least one tenant.")
         return
     frame_register.pack_forget()
@@ -270,31 +237,19 @@ def show_verify():
 
 # ---------------- AUTO FILL ----------------
 def fill_tenant_data(event):
-    selected = tenant_combo.get()
-    for t in tenants:
-        if t["name"] == selected:
-            label_cpf_value.config(text=t["cpf"])
-            label_address_value.config(text=t["address"])
-            break
-
-# ---------------- QR CODE GENERATOR ----------------
-def generate_qr_code(data):
-    """Generates QR Code with receipt data and returns as Image object"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=6,
-        border=2,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    return img
+    tenant = tenant_store.find_by_name(tenant_combo.get())
+    if tenant:
+        label_cpf_value.config(text=tenant["cpf"])
+        label_address_value.config(text=tenant["address"])
+        # Defaults from the tenant record, unless something was typed already
+        if tenant.get("value") and not entry_value.get():
+            entry_value.insert(0, tenant["value"])
+        if tenant.get("payment_day") and not entry_day.get():
+            entry_day.insert(0, tenant["payment_day"])
 
 # ---------------- PDF WITH BLOCKCHAIN ----------------
 def generate_receipt():
-    if not os.path.exists(SIGNATURE_FILE):
+    if not has_signature():
         messagebox.showerror("Error", "Save or load a signature.")
         return
 
@@ -308,7 +263,10 @@ def generate_receipt():
         messagebox.showerror("Error", "Fill in all fields.")
         return
 
-    tenant = next(t for t in tenants if t["name"] == tenant_name)
+    tenant = tenant_store.find_by_name(tenant_name)
+    if tenant is None:
+        messagebox.showerror("Error", "Select a registered tenant from the list.")
+        return
 
     # Registers in blockchain
     receipt_data = {
@@ -321,110 +279,68 @@ def generate_receipt():
         "address": tenant["address"]
     }
     
-    # Generates unique ID and hash in blockchain
-    receipt_id, block_hash = blockchain.create_receipt_block(receipt_data)
+    # Block and PDF are made on the worker thread; the form is free for the next one
+    run_in_background(issue_receipt, receipt_issued, receipt_data)
     
-    # PDF file name
-    pdf_filename = f"recibo_{receipt_id}.pdf"
-    pdf_path = os.path.join(PDF_FOLDER, pdf_filename)
+    # Clear fields after generation
+    entry_landlord.delete(0, END)
+    entry_value.delete(0, END)
+    entry_day.delete(0, END)
+    entry_reference.delete(0, END)
 
-    pdf = pdf_canvas.Canvas(pdf_path, pagesize=A4)
+def generate_monthly_receipts():
+    landlord = entry_landlord.get()
+    reference = entry_reference.get()
+    if not (landlord and reference):
+        messagebox.showerror("Error", "Fill in the landlord and the month (MM/AAAA).")
+        return
+    if not has_signature():
+        messagebox.showerror("Error", "Save or load a signature.")
+        return
+    if not messagebox.askyesno("Confirmar", f"Emitir os recibos de {reference} para todos os locatários?\n"
+                                            f"Quem já tem recibo deste mês será pulado."):
+        return
+    run_in_background(issue_monthly_receipts, monthly_receipts_issued, reference, landlord, blockchain,
+                      list(tenant_store.tenants))
 
-    w, h = A4
-    
-    # Title
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawString(200, h - 80, "RECIBO DE ALUGUEL")
-    
-    # Unique Receipt ID
-    pdf.setFont("Helvetica-Bold", 10)
-    pdf.drawString(50, h - 105, f"ID ÚNICO: {receipt_id}")
-    
-    # Separator line
-    pdf.line(50, h - 115, w - 50, h - 115)
-    
-    # Receipt body
-    pdf.setFont("Helvetica", 12)
-    start_y = h - 145
-    
-    # Receipt text
-    pdf.drawString(50, start_y, f"Recebi de {tenant['name']}, CPF/CNPJ {tenant['cpf']},")
-    pdf.drawString(50, start_y - 25, f"a quantia de R$ {value}, referente ao aluguel")
-    pdf.drawString(50, start_y - 50, f"do imóvel localizado em {tenant['address']}.")
-    
-    # Space
-    pdf.drawString(50, start_y - 90, f"Referente ao dia {day}/{reference}")
-    pdf.drawString(50, start_y - 115, f"Data de emissão: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-    
-    # Landlord (WITHOUT CPF)
-    pdf.drawString(50, start_y - 160, "________________________________________________________________")
-    pdf.drawString(50, start_y - 185, f"Locador: {landlord}")
-    
-    # SIGNATURE
-    signature_x = 150
-    text_y = start_y - 300
-    
-    # "Assinatura:" text on the left
-    pdf.drawString(50, text_y, "Assinatura:")
-    
-    # Signature image on the right
-    if os.path.exists(SIGNATURE_FILE):
-        pdf.drawImage(
-            SIGNATURE_FILE,
-            signature_x,
-            text_y - 10,
-            width=180,
-            height=60,
-            preserveAspectRatio=True,
-            mask='auto'
-        )
-    
-    # Line for signature
-    pdf.line(50, text_y - 5, w - 50, text_y - 5)
-    
-    # Small QR Code in footer
-    security_y = 100  # Fixed position in footer
-    
-    # Generates verification QR Code in memory
-    qr_data = f"RECIBO|ID:{receipt_id}|HASH:{block_hash[:15]}"
-    qr_img = generate_qr_code(qr_data)
-    
-    # Saves QR Code temporarily for use in PDF
-    temp_qr_path = os.path.join(DATA_FOLDER, f"temp_qr_{receipt_id}.png")
-    qr_img.save(temp_qr_path)
-    
-    # Adds small QR Code in footer
-    pdf.drawImage(
-        temp_qr_path,
-        w - 100,  # Bottom right corner
-        30,       # Close to bottom edge
-        width=50,
-        height=50,
-        preserveAspectRatio=True,
-        mask='auto'
-    )
-    
-    # Small security text in footer
-    pdf.setFont("Helvetica", 7)
-    pdf.drawString(50, 40, f"ID: {receipt_id} | Hash: {block_hash[:12]}... | Verificação: Sistema de Recibos")
-    
-    pdf.showPage()
-    pdf.save()
-    
-    # Remove temporary QR code
-    if os.path.exists(temp_qr_path):
-        os.remove(temp_qr_path)
+def monthly_receipts_issued(result, error):
+    if error:
+        messagebox.showerror("Error", f"Não foi possível emitir os recibos do mês:\n{error}")
+        return
+    message = (f"✅ {len(result['receipt_ids'])} recibos emitidos\n"
+               f"⏭️ {len(result['skipped'])} já existiam")
+    if result["without_defaults"]:
+        message += (f"\n⚠️ Sem valor/dia padrão ({len(result['without_defaults'])}): "
+                    f"{', '.join(result['without_defaults'][:10])}")
+    if result["failed"]:
+        message += f"\n❌ {len(result['failed'])} PDFs falharam"
+    messagebox.showinfo("Recibos do mês", message)
+
+def issue_receipt(receipt_data):
+    """Worker thread: registers the receipt in the blockchain and renders its PDF"""
+    with receipt_trace() as trace:
+        # Generates unique ID and hash in blockchain
+        receipt_id, block_hash = blockchain.create_receipt_block(receipt_data)
+        trace["receipt_id"] = receipt_id
+        
+        # Renders the PDF from the new block
+        pdf_path = generate_receipt_pdf(blockchain.find_block(receipt_id))
+    return receipt_id, pdf_path
 
+def receipt_issued(result, error):
+    if error:
+        messagebox.showerror("Error", f"Não foi possível gerar o recibo:\n{error}")
+        return
+
+    receipt_id, pdf_path = result
+    if pending_jobs:
+        # More receipts in line: report without stopping the operator
+        label_job_status.config(text=f"✅ {receipt_id} salvo - {pending_jobs} tarefa(s) na fila")
+        return
     messagebox.showinfo("Success", 
                        f"✅ Recibo gerado com sucesso!\n\n"
                        f"📄 ID Único: {receipt_id}\n"
                        f"💾 Salvo em: {pdf_path}")
-    
-    # Clear fields after generation
-    entry_landlord.delete(0, END)
-    entry_value.delete(0, END)
-    entry_day.delete(0, END)
-    entry_reference.delete(0, END)
 
 # ---------------- RECEIPT VERIFICATION ----------------
 def verify_receipt():
@@ -434,12 +350,22 @@ def verify_receipt():
         messagebox.showerror("Error", "Enter receipt ID to verify.")
         return
     
-    # Verifies in blockchain
-    is_valid, block_data = blockchain.verify_receipt(receipt_id)
-    
+    # Verifies in blockchain, off the Tk thread
+    button_verify.config(state=DISABLED)
+    label_verify_result.config(text="⏳ Verificando...", fg="#666")
+    run_in_background(blockchain.verify_receipt, show_verification, receipt_id)
+
+def show_verification(result, error):
+    button_verify.config(state=NORMAL)
+    if error:
+        label_verify_result.config(text=f"❌ Erro na verificação: {error}", fg="red")
+        return
+
+    is_valid, block_data = result
     if is_valid:
-        # Gets receipt information
-        receipt_info = blockchain.get_receipt_info(receipt_id)
+        receipt_id = block_data["receipt_id"]
+        # Receipt information comes with the verified block
+        receipt_info = block_data["data"]
         
         if receipt_info:
             # Shows information
@@ -477,16 +403,62 @@ def verify_receipt():
         )
 
 # Statistics button
+def blockchain_stats():
+    """Worker thread: receipt count and this year's income from the analytics columns"""
+    analytics = blockchain.analytics()
+    year = datetime.now().year
+    return {
+        "receipts": len(blockchain.chain) - 1,  # Excludes genesis block
+        "year": year,
+        "year_total": analytics.year_total(year),
+        "year_rows": len(analytics.annual_rows(year)),
+        "unreadable": analytics.unreadable,
+    }
+
 def show_blockchain_stats():
-    total_receipts = len(blockchain.chain) - 1  # Excludes genesis block
+    run_in_background(blockchain_stats, blockchain_stats_ready)
+
+def blockchain_stats_ready(stats, error):
+    if error:
+        messagebox.showerror("Error", f"Não foi possível ler as estatísticas:\n{error}")
+        return
+    unreadable = f"⚠️ Recibos com valor/referência ilegível: {stats['unreadable']}\n" if stats["unreadable"] else ""
     messagebox.showinfo("Estatísticas do Sistema", 
                        f"📊 SISTEMA DE RECIBOS\n\n"
-                       f"📈 Total de Recibos: {total_receipts}\n"
+                       f"📈 Total de Recibos: {stats['receipts']}\n"
+                       f"💰 Recebido em {stats['year']}: R$ {format_brl(stats['year_total'])}\n"
+                       f"🏠 Locatários/imóveis em {stats['year']}: {stats['year_rows']}\n"
+                       f"{unreadable}\n"
                        f"📂 Pasta principal: {os.path.abspath(BASE_FOLDER)}\n"
                        f"📄 PDFs: {PDF_FOLDER}\n"
                        f"🔗 Blockchain: {BLOCKCHAIN_FOLDER}\n"
                        f"👥 Locatários: {TENANTS_FOLDER}")
 
+def export_annual_report():
+    year = simpledialog.askinteger("Relatório Anual", "Ano de referência (AAAA):",
+                                   initialvalue=datetime.now().year - 1, minvalue=1900, maxvalue=9999)
+    if year:
+        run_in_background(write_annual_report, annual_report_written, year)
+
+def write_annual_report(year):
+    """Worker thread: CSV and PDF of a year's income per tenant, property and month"""
+    analytics = blockchain.analytics()
+    if year not in analytics.years():
+        return year, None, None
+    csv_path = export_annual_csv(analytics, year, annual_report_path(year, "csv"))
+    pdf_path = render_annual_pdf(analytics, year, annual_report_path(year, "pdf"))
+    return year, csv_path, pdf_path
+
+def annual_report_written(result, error):
+    if error:
+        messagebox.showerror("Error", f"Não foi possível gerar o relatório:\n{error}")
+        return
+    year, csv_path, pdf_path = result
+    if csv_path is None:
+        messagebox.showinfo("Relatório Anual", f"Nenhum recibo com referência em {year}.")
+        return
+    messagebox.showinfo("Relatório Anual", f"✅ Relatório de {year} gerado:\n{csv_path}\n{pdf_path}")
+
 # ---------------- GUI ----------------
 window = Tk()
 window.title("Sistema de Recibos")
@@ -497,6 +469,14 @@ window.resizable(False, False)
 menu = Frame(window, bg="#f0f0f0", height=40)
 menu.pack(fill="x")
 
+# Status bar for background jobs (packed before the screens so it stays visible)
+frame_status = Frame(window, bg="#f0f0f0")
+frame_status.pack(side=BOTTOM, fill="x")
+progress_jobs = ttk.Progressbar(frame_status, mode="indeterminate", length=150)
+progress_jobs.pack(side=RIGHT, padx=10, pady=3)
+label_job_status = Label(frame_status, text="", bg="#f0f0f0", font=("Arial", 9))
+label_job_status.pack(side=LEFT, padx=10)
+
 Button(menu, text="Cadastro de Locatários", command=show_register, bg="#2196F3", fg="white", width=18).pack(side=LEFT, padx=3, pady=5)
 Button(menu, text="Gerar Recibo", command=show_receipt, bg="#4CAF50", fg="white", width=18).pack(side=LEFT, padx=3, pady=5)
 Button(menu, text="Verificar Recibo", command=show_verify, bg="#FF9800", fg="white", width=18).pack(side=LEFT, padx=3, pady=5)
@@ -519,6 +499,16 @@ Label(frame_register, text="Endereço Completo:").pack(anchor="w", padx=50)
 entry_tenant_address = Entry(frame_register, width=65, font=("Arial", 10))
 entry_tenant_address.pack(pady=2)
 
+# Defaults for the monthly receipts (optional)
+frame_tenant_defaults = Frame(frame_register)
+frame_tenant_defaults.pack(pady=10)
+Label(frame_tenant_defaults, text="Valor padrão (R$):").pack(side=LEFT, padx=5)
+entry_tenant_value = Entry(frame_tenant_defaults, width=15, font=("Arial", 10))
+entry_tenant_value.pack(side=LEFT, padx=5)
+Label(frame_tenant_defaults, text="Dia do Pagamento:").pack(side=LEFT, padx=5)
+entry_tenant_day = Entry(frame_tenant_defaults, width=10, font=("Arial", 10))
+entry_tenant_day.pack(side=LEFT, padx=5)
+
 Button(
     frame_register,
     text="Salvar Locatário",
@@ -540,9 +530,12 @@ entry_landlord = Entry(frame_receipt, width=65, font=("Arial", 10))
 entry_landlord.pack(pady=2)
 
 Label(frame_receipt, text="Locatário:").pack(anchor="w", padx=50)
-tenant_combo = ttk.Combobox(frame_receipt, state="readonly", width=62, font=("Arial", 10))
+# Editable: typing narrows the list (see update_tenant_choices)
+tenant_combo = ttk.Combobox(frame_receipt, width=62, font=("Arial", 10))
 tenant_combo.pack(pady=2)
 tenant_combo.bind("<<ComboboxSelected>>", fill_tenant_data)
+tenant_combo.bind("<KeyRelease>", update_tenant_choices)
+tenant_combo.bind("<FocusOut>", fill_tenant_data)
 
 Label(frame_receipt, text="CPF/CNPJ:").pack(anchor="w", padx=50)
 label_cpf_value = Label(frame_receipt, text="-", font=("Arial", 10), fg="#666")
@@ -590,6 +583,18 @@ Button(
     width=30
 ).pack(pady=15)
 
+# Every tenant with default value and day, for the month typed above
+Button(
+    frame_receipt,
+    text="🔁 Gerar Recibos do Mês (todos)",
+    command=generate_monthly_receipts,
+    bg="#00796B",
+    fg="white",
+    font=("Arial", 10, "bold"),
+    height=1,
+    width=30
+).pack(pady=5)
+
 # Botão para abrir pasta PDF na tela de recibos
 Button(
     frame_receipt,
@@ -611,7 +616,7 @@ Label(frame_verify, text="Digite o ID Único do Recibo:", font=("Arial", 11)).pa
 entry_verify_id = Entry(frame_verify, width=65, font=("Arial", 12))
 entry_verify_id.pack(pady=10)
 
-Button(
+button_verify = Button(
     frame_verify,
     text="Verificar Recibo",
     command=verify_receipt,
@@ -620,7 +625,8 @@ Button(
     font=("Arial", 11, "bold"),
     height=2,
     width=25
-).pack(pady=20)
+)
+button_verify.pack(pady=20)
 
 # Result frame
 result_frame = Frame(frame_verify, bg="#f9f9f9", bd=2, relief="solid")
@@ -642,6 +648,18 @@ Button(
     width=30
 ).pack(pady=10)
 
+# Annual report button (IRPF / DIMOB)
+Button(
+    frame_verify,
+    text="📊 Relatório Anual (CSV/PDF)",
+    command=export_annual_report,
+    bg="#FF9800",
+    fg="white",
+    font=("Arial", 10),
+    height=1,
+    width=30
+).pack(pady=5)
+
 # Botão para abrir pasta PDF na tela de verificação
 Button(
     frame_verify,
@@ -657,4 +675,10 @@ Button(
 # ---------------- START ----------------
 load_tenants()
 show_receipt()
+poll_job_results()
+
+# Read the chain on the worker thread once the window is up, so a large
+# chain does not delay the first window and the first receipt does not wait
+window.after(100, run_in_background, lambda: len(blockchain.chain), lambda result, error: None)
+
 window.mainloop()
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""Chains as the first version of the program wrote them, for the tests.
+
+That version hashed every block with a datetime.now() taken after the one
+stored in "timestamp", so its hashes cannot be recalculated.
+"""
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def baseline_hash(index, data, previous_hash, timestamp):
+    return hashlib.sha256(f"{index}{data}{previous_hash}{timestamp}".encode()).hexdigest()
+
+
+def baseline_chain(receipts):
+    """Genesis block plus one receipt block per dict, built like the first version"""
+    clock = datetime(2025, 1, 10, 9, 0, 0, 125000)
+
+    def now():
+        nonlocal clock
+        clock += timedelta(microseconds=37)
+        return str(clock)
+
+    chain = [{
+        "index": 0,
+        "timestamp": now(),
+        "data": "Genesis Block",
+        "previous_hash": "0",
+        "hash": baseline_hash(0, "Genesis Block", "0", now()),
+        "receipt_id": "GENESIS-0000",
+    }]
+    for receipt in receipts:
+        previous = chain[-1]
+        index = len(chain)
+        receipt_id = f"REC-{uuid.uuid4().hex[:8].upper()}-20250110"
+        data = {"receipt_id": receipt_id, **receipt, "timestamp": now()}
+        chain.append({
+            "index": index,
+            "timestamp": now(),
+            "data": data,
+            "previous_hash": previous["hash"],
+            "hash": baseline_hash(index, json.dumps(data), previous["hash"], now()),
+            "receipt_id": receipt_id,
+        })
+    return chain
+
+
+def sample_receipts(count, reference="01/2025"):
+    return [{
+        "landlord": "João da Silva", "tenant": f"Locatário {i}", "tenant_cpf": f"{i:011d}",
+        "value": "1.250,00", "reference": reference, "day": "5", "address": "Rua das Flores, 100",
+    } for i in range(count)]
+
+
+def write_baseline_install(folder, receipts):
+    """sistema_recibos/blockchain/blockchain.json of the first version under folder"""
+    chain = baseline_chain(receipts)
+    blockchain_folder = os.path.join(folder, "sistema_recibos", "blockchain")
+    os.makedirs(blockchain_folder, exist_ok=True)
+    with open(os.path.join(blockchain_folder, "blockchain.json"), "w", encoding="utf-8") as f:
+        json.dump(chain, f, indent=4, ensure_ascii=False)
+    return chain
+
+
+def save_sample_signature():
+    """A two-stroke signature, as the capture canvas saves it"""
+    import receipt_core
+    from receipt_signature import save_strokes
+
+    receipt_core.ensure_folders()
+    save_strokes(receipt_core.SIGNATURE_STROKES_FILE,
+                 [[(10, 80), (60, 40), (110, 90), (160, 50)], [(180, 70), (181, 70)]], 400, 150)
+
+
+def reset_process_state():
+    """Forgets the storages, PDF manifest and analytics the modules keep per process"""
+    import receipt_core
+
+    for storage in receipt_core._storages.values():
+        if hasattr(storage, "close"):
+            storage.close()  # mapped segment and ID files
+    receipt_core._storages.clear()
+    receipt_core._manifest = None
+    receipt_core._open_analytics.clear()  # their folder is gone by the time the process exits
+
+
+class FolderTestCase(unittest.TestCase):
+    """Runs each test in an empty working folder (sistema_recibos is relative)"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="recibos_test_")
+        self.previous_folder = os.getcwd()
+        os.chdir(self.folder)
+        reset_process_state()
+
+    def tearDown(self):
+        reset_process_state()
+        os.chdir(self.previous_folder)
+        shutil.rmtree(self.folder, ignore_errors=True)
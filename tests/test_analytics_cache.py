@@ -0,0 +1,97 @@
+"""Income totals kept up to date over the chain, and their cache file."""
+import gc
+import os
+import subprocess
+import sys
+import unittest
+import weakref
+
+from baseline import ROOT, FolderTestCase, sample_receipts
+
+import receipt_core
+from receipt_analytics import ChainAnalytics, export_annual_csv, parse_brl
+from receipt_core import ReceiptBlockchain
+
+FIRST_RUN = """
+from receipt_core import ReceiptBlockchain
+from tests.baseline import sample_receipts
+blockchain = ReceiptBlockchain()
+blockchain.create_receipt_blocks(sample_receipts(3))
+blockchain.analytics()  # cache written here with 3 receipts
+blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+"""
+
+
+def receipt(tenant, cpf, value, reference, address="Rua A, 1"):
+    return {"landlord": "João", "tenant": tenant, "tenant_cpf": cpf, "value": value,
+            "reference": reference, "day": "5", "address": address}
+
+
+class IncomeTotalsTest(FolderTestCase):
+
+    def test_amounts_in_the_formats_people_type(self):
+        self.assertEqual([parse_brl(value) for value in ("1.250,00", "R$ 1250,5", "1250.00", "1.250", "12x")],
+                         [125000, 125050, 125000, 125000, None])
+
+    def test_totals_follow_each_new_receipt(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks([
+            receipt("José", "123.456.789-00", "1.000,00", "01/2025"),
+            receipt("José", "12345678900", "1.000,00", "02/2025"),
+        ])
+        analytics = blockchain.analytics()
+        blockchain.create_receipt_blocks([
+            receipt("Maria", "987.654.321-00", "750,50", "02/2025", "Rua B, 2"),
+            receipt("Maria", "987.654.321-00", "sem valor", "03/2025", "Rua B, 2"),
+            receipt("José", "123.456.789-00", "1.000,00", "01/2026"),
+        ])
+        self.assertEqual(analytics.month_totals(2025)[:3], [100000, 175050, 0])
+        self.assertEqual((analytics.year_total(2025), analytics.year_total(2026), analytics.unreadable),
+                         (275050, 100000, 1))
+        rows = analytics.annual_rows(2025)
+        self.assertEqual([(row["cpf"], row["total"]) for row in rows], [("12345678900", 200000),
+                                                                       ("98765432100", 75050)])
+
+        rebuilt = ChainAnalytics()
+        rebuilt.catch_up(blockchain.chain)
+        self.assertEqual(rebuilt.totals, analytics.totals)
+        path = export_annual_csv(analytics, 2025, os.path.join(self.folder, "2025.csv"))
+        with open(path, "r", encoding="utf-8-sig") as f:
+            self.assertEqual(f.read().splitlines()[-1].split(";")[-1], "2.750,50")
+
+    def test_rewritten_chain_is_read_again(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        analytics = ChainAnalytics()
+        analytics.catch_up(blockchain.chain)
+        chain = list(blockchain.chain)[:3]
+        self.assertEqual(analytics.catch_up(chain), 3)  # last block gone: starts over
+        self.assertEqual(len(analytics), 2)
+
+
+class AnalyticsCacheTest(FolderTestCase):
+
+    def test_second_start_reads_only_the_new_blocks(self):
+        subprocess.run([sys.executable, "-c", FIRST_RUN], cwd=self.folder, check=True,
+                       env=dict(os.environ, PYTHONPATH=ROOT))
+
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_block(sample_receipts(1, "03/2025")[0])
+        analytics = ChainAnalytics.load(receipt_core.ANALYTICS_FILE)
+        self.assertEqual(analytics.next_index, 6)
+        self.assertEqual(analytics.catch_up(blockchain.chain), 1)
+        self.assertEqual(len(analytics), 6)
+
+    def test_exit_handler_does_not_keep_instances_alive(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks(sample_receipts(2))
+        blockchain.analytics()
+        instance = weakref.ref(blockchain)
+        del blockchain
+        gc.collect()
+        self.assertIsNone(instance())
+        self.assertEqual(len(receipt_core._open_analytics), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Incremental chain audits resuming from the signed checkpoint."""
+import json
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+
+
+def edit_journal_value(index, value="9.999,00"):
+    """Changes a receipt value on disk, leaving its hash as it was"""
+    with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    block = json.loads(lines[index])
+    block["data"]["value"] = value
+    lines[index] = json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+class AuditTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blockchain = ReceiptBlockchain()
+        self.blockchain.create_receipt_blocks(sample_receipts(4))
+        self.assertEqual(self.blockchain.audit_chain()["checked"], 5)
+
+    def restart(self):
+        reset_process_state()
+        return ReceiptBlockchain()
+
+    def test_next_audit_checks_only_the_new_blocks(self):
+        self.blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+        result = self.blockchain.audit_chain()
+        self.assertEqual((result["valid"], result["start"], result["checked"]), (True, 5, 2))
+        self.assertEqual(self.blockchain.audit_chain()["checked"], 0)
+
+    def test_tampering_after_the_checkpoint_is_found(self):
+        self.blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+        edit_journal_value(6)
+        result = self.restart().audit_chain()
+        self.assertEqual((result["valid"], result["first_broken"]), (False, 6))
+
+    def test_full_audit_finds_tampering_before_the_checkpoint(self):
+        edit_journal_value(2)
+        blockchain = self.restart()
+        self.assertTrue(blockchain.audit_chain()["valid"])  # nothing new since the checkpoint
+        result = blockchain.audit_chain(full=True)
+        self.assertEqual((result["valid"], result["first_broken"]), (False, 2))
+
+    def test_badly_signed_checkpoint_is_ignored(self):
+        with open(receipt_core.AUDIT_CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        checkpoint["index"] = 2
+        with open(receipt_core.AUDIT_CHECKPOINT_FILE, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        self.assertEqual(self.restart().audit_chain()["start"], 0)
+
+    def test_rewritten_chain_is_audited_from_the_start(self):
+        edit_journal_value(4)
+        with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        block = json.loads(lines[4])
+        block["hash"] = "0" * 64  # the checkpoint no longer matches the last block
+        lines[4] = json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+        result = self.restart().audit_chain()
+        self.assertEqual((result["start"], result["valid"], result["first_broken"]), (0, False, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+"""Backup and restore, including installations upgraded from the first version."""
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts, write_baseline_install
+
+import receipt_core
+from receipt_backup import META_MEMBER, backup_increment, list_archives, restore_backups
+from receipt_core import ReceiptBlockchain, find_receipt_pdf, generate_receipt_pdf
+
+
+def edit_meta(path, change):
+    """Rewrites an archive with change(meta) applied to its backup.json"""
+    members = []
+    with tarfile.open(path, "r:gz") as tar:
+        for member in tar:
+            data = tar.extractfile(member).read()
+            if member.name == META_MEMBER:
+                meta = json.loads(data)
+                change(meta)
+                data = json.dumps(meta).encode("utf-8")
+            members.append((member.name, data))
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class BackupTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backup_folder = os.path.join(self.folder, "backup")
+
+    def restore_in_new_folder(self, with_key=False):
+        key_file = os.path.abspath(receipt_core.AUDIT_KEY_FILE)
+        os.chdir(tempfile.mkdtemp(dir=self.folder))
+        reset_process_state()
+        if with_key:
+            os.makedirs(receipt_core.BLOCKCHAIN_FOLDER)
+            shutil.copy(key_file, receipt_core.AUDIT_KEY_FILE)
+        return restore_backups(self.backup_folder)
+
+    def test_round_trip(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        first = backup_increment(self.backup_folder, blockchain)
+        blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+        second = backup_increment(self.backup_folder, blockchain)
+        self.assertEqual((first["blocks"], second["first_index"], second["blocks"]), (4, 4, 2))
+        self.assertIsNone(backup_increment(self.backup_folder, blockchain)["archive"])
+        hashes = [block["hash"] for block in blockchain.chain]
+
+        summary = self.restore_in_new_folder()
+        self.assertEqual((summary["archives"], summary["blocks"]), (2, 6))
+        restored = ReceiptBlockchain()
+        self.assertEqual([block["hash"] for block in restored.chain], hashes)
+        self.assertTrue(restored.audit_chain(full=True)["valid"])
+        # Repeating the restore finds everything in place
+        reset_process_state()
+        self.assertEqual(restore_backups(self.backup_folder)["blocks"], 0)
+
+    def test_pdfs_go_in_increments(self):
+        blockchain = ReceiptBlockchain()
+        blocks = blockchain.create_receipt_blocks(sample_receipts(4))
+        paths = [generate_receipt_pdf(block) for block in blocks[:2]]
+        self.assertEqual(backup_increment(self.backup_folder, blockchain)["pdfs"], 2)
+        paths += [generate_receipt_pdf(block) for block in blocks[2:]]
+        os.remove(paths[3])  # deleted after it was generated: left out
+        second = backup_increment(self.backup_folder, blockchain)
+        self.assertEqual((second["blocks"], second["pdfs"], second["missing_pdfs"]), (0, 1, 1))
+        contents = {}
+        for block, path in zip(blocks[:3], paths):
+            with open(path, "rb") as f:
+                contents[block["receipt_id"]] = f.read()
+
+        summary = self.restore_in_new_folder()
+        self.assertEqual((summary["pdfs"], summary["bad_pdfs"]), (3, 0))
+        for receipt_id, content in contents.items():
+            with open(find_receipt_pdf(receipt_id), "rb") as f:
+                self.assertEqual(f.read(), content)
+        self.assertIsNone(find_receipt_pdf(blocks[3]["receipt_id"]))
+
+    def test_tampered_block_is_refused(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        blockchain.chain[2]["data"]["value"] = "9.999,00"
+        backup_increment(self.backup_folder, blockchain)
+
+        with self.assertRaises(ValueError):
+            self.restore_in_new_folder()
+
+    def baseline_backup(self):
+        legacy = write_baseline_install(self.folder, sample_receipts(4))
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+        backup_increment(self.backup_folder, blockchain)
+        blockchain.create_receipt_block(sample_receipts(1, "03/2025")[0])
+        backup_increment(self.backup_folder, blockchain)
+        return legacy
+
+    def test_baseline_chain_is_restored(self):
+        legacy = self.baseline_backup()
+
+        summary = self.restore_in_new_folder(with_key=True)
+        self.assertEqual(summary["blocks"], 7)
+        restored = ReceiptBlockchain()
+        self.assertEqual([block["hash"] for block in restored.chain[:5]], [block["hash"] for block in legacy])
+        result = restored.audit_chain(full=True)
+        self.assertTrue(result["valid"])
+        self.assertEqual((result["legacy"], result["legacy_record"]), (5, "ok"))
+
+    def test_legacy_record_needs_the_audit_key(self):
+        self.baseline_backup()
+        with self.assertRaises(ValueError):
+            self.restore_in_new_folder()
+
+    def test_tampered_legacy_count_is_refused(self):
+        self.baseline_backup()
+        for _, path in list_archives(self.backup_folder):
+            edit_meta(path, lambda meta: meta["legacy"].update(blocks=6))
+        with self.assertRaises(ValueError):
+            self.restore_in_new_folder(with_key=True)
+
+    def test_archive_without_the_legacy_record_is_refused(self):
+        self.baseline_backup()
+        for _, path in list_archives(self.backup_folder):
+            edit_meta(path, lambda meta: meta.pop("legacy"))
+        with self.assertRaises(ValueError):
+            self.restore_in_new_folder(with_key=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Headless batch issuance from a spreadsheet."""
+import os
+import unittest
+
+from baseline import FolderTestCase, save_sample_signature, sample_receipts
+
+from receipt_batch import issue_receipts, read_receipt_file
+from receipt_core import ReceiptBlockchain, find_receipt_pdf
+
+
+class BatchTest(FolderTestCase):
+
+    def write_csv(self, receipts):
+        path = os.path.join(self.folder, "recibos.csv")
+        fields = list(receipts[0])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(";".join(fields) + "\n")  # pt-BR spreadsheets use ";"
+            for receipt in receipts:
+                f.write(";".join(receipt[field] for field in fields) + "\n")
+        return path
+
+    def test_csv_batch_is_issued_in_order_with_its_pdfs(self):
+        save_sample_signature()
+        receipts = sample_receipts(5)
+        blockchain = ReceiptBlockchain()
+
+        summary = issue_receipts(read_receipt_file(self.write_csv(receipts)), blockchain, workers=2)
+        self.assertEqual((len(summary["receipt_ids"]), summary["failed"]), (5, []))
+        self.assertEqual([block["data"]["tenant"] for block in blockchain.chain[1:]],
+                         [receipt["tenant"] for receipt in receipts])
+        for receipt_id in summary["receipt_ids"]:
+            self.assertTrue(os.path.getsize(find_receipt_pdf(receipt_id)))
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+    def test_missing_field_is_reported_before_issuing(self):
+        save_sample_signature()
+        receipts = sample_receipts(3)
+        receipts[1]["value"] = ""
+        blockchain = ReceiptBlockchain()
+        with self.assertRaisesRegex(ValueError, "Receipt 2: missing value"):
+            issue_receipts(receipts, blockchain)
+        self.assertEqual(len(blockchain.chain), 1)
+
+    def test_batch_needs_a_signature(self):
+        with self.assertRaises(FileNotFoundError):
+            issue_receipts(sample_receipts(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
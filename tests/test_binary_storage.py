@@ -0,0 +1,70 @@
+"""The binary chain: conversion, lookups through the ID file and crash recovery."""
+import os
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_binary
+import receipt_core
+from receipt_core import ReceiptBlockchain
+from receipt_storage import ID_ENTRY
+
+
+class BinaryStorageTest(FolderTestCase):
+
+    def test_journal_is_converted_on_first_use(self):
+        journal = receipt_core.open_backend("journal")
+        blockchain = ReceiptBlockchain(journal)
+        blockchain.create_receipt_blocks(sample_receipts(4))
+        chain = list(blockchain.chain)
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain("binary")
+        self.assertEqual([dict(block) for block in blockchain.chain], chain)
+        self.assertLess(os.path.getsize(receipt_core.BINARY_CHAIN_FILE),
+                        os.path.getsize(receipt_core.BLOCKCHAIN_JOURNAL_FILE))
+        for block in chain[1:]:
+            valid, found = blockchain.verify_receipt(block["receipt_id"])
+            self.assertTrue(valid)
+            self.assertEqual(found["data"], block["data"])
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+    def test_recent_ids_are_merged_into_the_id_file(self):
+        merge_after = receipt_binary.MERGE_AFTER
+        receipt_binary.MERGE_AFTER = 3
+        self.addCleanup(setattr, receipt_binary, "MERGE_AFTER", merge_after)
+        blockchain = ReceiptBlockchain("binary")
+        blocks = []
+        for month in range(1, 6):
+            blocks += blockchain.create_receipt_blocks(sample_receipts(2, f"{month:02d}/2025"))
+        self.assertLessEqual(len(blockchain.store.recent_ids), 3)
+        self.assertGreaterEqual(os.path.getsize(receipt_core.BINARY_IDS_FILE) // ID_ENTRY.size, 8)
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain("binary")
+        for block in blocks:
+            self.assertEqual(blockchain.find_block(block["receipt_id"])["index"], block["index"])
+        self.assertIsNone(blockchain.find_block("REC-00000000-20250101"))
+
+
+class BinaryRecoveryTest(FolderTestCase):
+
+    def test_records_cut_off_after_the_id_file_was_written(self):
+        blockchain = ReceiptBlockchain("binary")
+        blocks = blockchain.create_receipt_blocks(sample_receipts(5))
+        blockchain.store.reindex()
+        reset_process_state()
+        # Torn write: the ID file covers blocks the record file lost
+        size = os.path.getsize(receipt_core.BINARY_CHAIN_FILE)
+        with open(receipt_core.BINARY_CHAIN_FILE, "r+b") as f:
+            f.truncate(size - 10)
+
+        blockchain = ReceiptBlockchain("binary")
+        self.assertEqual(len(blockchain.chain), 5)
+        self.assertTrue(blockchain.verify_receipt(blocks[3]["receipt_id"])[0])
+        self.assertIsNone(blockchain.find_block(blocks[4]["receipt_id"]))
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Several processes and threads issuing into the same folder."""
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+from baseline import ROOT, FolderTestCase, reset_process_state, sample_receipts
+
+from receipt_core import ReceiptBlockchain
+
+WRITER = """
+import sys
+from receipt_core import ReceiptBlockchain
+from tests.baseline import sample_receipts
+blockchain = ReceiptBlockchain()
+for number in range(int(sys.argv[1])):
+    blockchain.create_receipt_block(sample_receipts(1, f"{number % 12 + 1:02d}/2025")[0])
+"""
+
+MONTHLY = """
+from receipt_core import ReceiptBlockchain
+from tests.baseline import sample_receipts
+ReceiptBlockchain().create_receipt_blocks(sample_receipts(6, "10/2026"), skip_issued=True)
+"""
+
+
+class ConcurrentIssuanceTest(FolderTestCase):
+
+    def run_processes(self, count, code, *argv, storage="journal"):
+        """Runs count copies of code at once in the working folder"""
+        env = dict(os.environ, PYTHONPATH=ROOT, RECIBOS_STORAGE=storage)
+        processes = [subprocess.Popen([sys.executable, "-c", code, *argv], env=env) for _ in range(count)]
+        self.assertEqual([process.wait() for process in processes], [0] * count)
+        reset_process_state()
+
+    def test_processes_append_to_one_chain(self):
+        for storage in ("journal", "segments", "binary", "sqlite"):
+            with self.subTest(storage=storage):
+                os.chdir(self.folder)
+                os.makedirs(storage)
+                os.chdir(storage)
+                self.run_processes(4, WRITER, "15", storage=storage)
+
+                blockchain = ReceiptBlockchain(storage)
+                self.assertEqual(len(blockchain.chain), 61)
+                self.assertEqual(len({block["receipt_id"] for block in blockchain.chain}), 61)
+                self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+                reset_process_state()
+
+    def test_threads_share_commits(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.chain
+        threads = [threading.Thread(target=blockchain.create_receipt_blocks, args=(sample_receipts(5),))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(blockchain.chain), 41)
+        reset_process_state()
+        self.assertTrue(ReceiptBlockchain().audit_chain(full=True)["valid"])
+
+    def test_month_is_issued_once_by_competing_processes(self):
+        self.run_processes(3, MONTHLY)
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(len(blockchain.chain), 7)
+        self.assertEqual(len({block["data"]["tenant_cpf"] for block in blockchain.chain[1:]}), 6)
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""The append-only journal: replay on start, torn last record, migration."""
+import json
+import os
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+
+
+class JournalTest(FolderTestCase):
+
+    def journal_lines(self):
+        with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "rb") as f:
+            return f.read().splitlines(keepends=True)
+
+    def test_chain_is_replayed_on_the_next_start(self):
+        blockchain = ReceiptBlockchain("journal")
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+        hashes = [block["hash"] for block in blockchain.chain]
+        self.assertEqual(len(self.journal_lines()), 5)  # one record per block, nothing rewritten
+        self.assertFalse(os.path.exists(receipt_core.BLOCKCHAIN_FILE))
+        reset_process_state()
+
+        restarted = ReceiptBlockchain("journal")
+        self.assertEqual([block["hash"] for block in restarted.chain], hashes)
+        self.assertTrue(restarted.audit_chain(full=True)["valid"])
+
+    def test_torn_last_record_is_cut_off(self):
+        blockchain = ReceiptBlockchain("journal")
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        hashes = [block["hash"] for block in blockchain.chain]
+        reset_process_state()
+        with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "ab") as f:
+            f.write(b'{"index": 4, "timestamp": "2025-01-')  # crash in the middle of an append
+
+        restarted = ReceiptBlockchain("journal")
+        self.assertEqual([block["hash"] for block in restarted.chain], hashes)
+        receipt_id, block_hash = restarted.create_receipt_block(sample_receipts(1, "02/2025")[0])
+        self.assertEqual(restarted.find_block(receipt_id)["index"], 4)
+        self.assertEqual(json.loads(self.journal_lines()[-1])["hash"], block_hash)
+        self.assertTrue(restarted.audit_chain(full=True)["valid"])
+
+    def test_blockchain_json_is_migrated_once(self):
+        blockchain = ReceiptBlockchain("json")
+        blockchain.create_receipt_blocks(sample_receipts(2))
+        hashes = [block["hash"] for block in blockchain.chain]
+        reset_process_state()
+
+        migrated = receipt_core.open_backend("journal")
+        self.assertEqual([block["hash"] for block in migrated.chain], hashes)
+        self.assertFalse(os.path.exists(receipt_core.BLOCKCHAIN_FILE))
+        self.assertTrue(os.path.exists(receipt_core.BLOCKCHAIN_FILE + ".migrado"))
+        self.assertEqual(len(self.journal_lines()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Chains of the first version: audit and verification after the upgrade."""
+import json
+import os
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts, write_baseline_install
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+
+
+def tamper_journal_block(index):
+    """Changes a receipt value on disk and gives the block the first version's shape"""
+    with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    for number, line in enumerate(lines):
+        block = json.loads(line)
+        if block["index"] == index:
+            block["data"]["value"] = "9.999,00"
+            block["timestamp"] += "1"
+            lines[number] = json.dumps(block, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+class LegacyChainTest(FolderTestCase):
+
+    def test_upgraded_chain_passes_audit(self):
+        legacy = write_baseline_install(self.folder, sample_receipts(5))
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+
+        result = blockchain.audit_chain(full=True)
+        self.assertTrue(result["valid"])
+        self.assertEqual(result["checked"], 7)
+        self.assertEqual(result["legacy"], 6)
+        self.assertTrue(os.path.exists(blockchain.checkpoint_file))
+        self.assertEqual(blockchain.legacy_blocks(), len(legacy))
+
+    def test_legacy_and_new_receipts_verify(self):
+        legacy = write_baseline_install(self.folder, sample_receipts(3))
+        blockchain = ReceiptBlockchain()
+        receipt_id, _ = blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+
+        for block in legacy[1:]:
+            self.assertTrue(blockchain.verify_receipt(block["receipt_id"])[0])
+        self.assertTrue(blockchain.verify_receipt(receipt_id)[0])
+
+    def test_new_blocks_still_get_the_hash_check(self):
+        write_baseline_install(self.folder, sample_receipts(3))
+        blockchain = ReceiptBlockchain()
+        receipt_id, _ = blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+        blockchain.find_block(receipt_id)["data"]["value"] = "9.999,00"
+
+        self.assertFalse(blockchain.verify_receipt(receipt_id)[0])
+        result = blockchain.audit_chain(full=True)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["first_broken"], 4)
+
+    def test_broken_link_in_legacy_range_is_reported(self):
+        legacy = write_baseline_install(self.folder, sample_receipts(4))
+        blockchain = ReceiptBlockchain()
+        blockchain.chain[2]["previous_hash"] = "0" * 64
+
+        result = blockchain.audit_chain(full=True)
+        self.assertFalse(result["valid"])
+        self.assertEqual(result["first_broken"], 2)
+        self.assertFalse(blockchain.verify_receipt(legacy[2]["receipt_id"])[0])
+
+    def test_verify_folder_accepts_legacy_pdfs(self):
+        from datetime import datetime, timedelta
+        import receipt_core
+        from receipt_verify import verify_folder
+
+        legacy = write_baseline_install(self.folder, sample_receipts(3))
+        blockchain = ReceiptBlockchain()
+        receipt_core.ensure_folders()
+        for block in legacy[1:]:
+            # The first version printed the issue date of its own, later, clock reading
+            printed = dict(block, timestamp=str(datetime.fromisoformat(block["timestamp"]) + timedelta(seconds=1)))
+            receipt_core.render_receipt_pdf(
+                os.path.join(receipt_core.PDF_FOLDER, f"recibo_{block['receipt_id']}.pdf"), printed)
+
+        result = verify_folder(receipt_core.PDF_FOLDER, blockchain=blockchain, workers=1)
+        self.assertEqual(result["counts"], {"valid": 3, "tampered": 0, "unknown": 0})
+
+    def test_new_chain_has_no_legacy_blocks(self):
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_block(sample_receipts(1)[0])
+        self.assertEqual(blockchain.legacy_blocks(), 0)
+        self.assertEqual(blockchain.audit_chain(full=True)["legacy"], 0)
+
+    def test_tampered_block_is_not_taken_for_legacy(self):
+        blocks = ReceiptBlockchain().create_receipt_blocks(sample_receipts(5))
+        reset_process_state()
+        # Before any audit or verification ever read the record
+        tamper_journal_block(3)
+
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(blockchain.legacy_blocks(), 0)
+        self.assertFalse(blockchain.verify_receipt(blocks[2]["receipt_id"])[0])
+        result = blockchain.audit_chain(full=True)
+        self.assertEqual((result["valid"], result["first_broken"], result["legacy_record"]), (False, 3, "ok"))
+
+    def test_deleted_record_is_reported_not_recalculated(self):
+        blocks = ReceiptBlockchain().create_receipt_blocks(sample_receipts(5))
+        reset_process_state()
+        tamper_journal_block(3)
+        os.remove(receipt_core.LEGACY_FILE)
+
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(blockchain.legacy_blocks(), 0)
+        self.assertFalse(blockchain.verify_receipt(blocks[2]["receipt_id"])[0])
+        result = blockchain.audit_chain(full=True)
+        self.assertEqual((result["valid"], result["first_broken"], result["legacy_record"]), (False, 3, "missing"))
+        self.assertFalse(os.path.exists(receipt_core.LEGACY_FILE))
+
+    def test_edited_record_is_refused(self):
+        ReceiptBlockchain().create_receipt_blocks(sample_receipts(5))
+        reset_process_state()
+        tamper_journal_block(3)
+        with open(receipt_core.LEGACY_FILE, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        with open(receipt_core.BLOCKCHAIN_JOURNAL_FILE, "r", encoding="utf-8") as f:
+            chain = [json.loads(line) for line in f]
+        record.update(blocks=4, genesis_hash=chain[0]["hash"], last_hash=chain[3]["hash"])
+        with open(receipt_core.LEGACY_FILE, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+
+        result = ReceiptBlockchain().audit_chain(full=True)
+        self.assertEqual((result["valid"], result["first_broken"], result["legacy_record"]), (False, 3, "invalid"))
+
+    def test_only_the_leading_run_is_legacy(self):
+        legacy = write_baseline_install(self.folder, sample_receipts(3))
+        with open(receipt_core.BLOCKCHAIN_FILE, "r", encoding="utf-8") as f:
+            chain = json.load(f)
+        # A block of the current code in the middle ends the run
+        chain[2]["data"]["timestamp"] = chain[2]["timestamp"]
+        self.assertEqual(receipt_core.find_legacy_blocks(chain), 2)
+        self.assertEqual(receipt_core.find_legacy_blocks(legacy), len(legacy))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+"""Month Merkle trees and inclusion proofs."""
+import hashlib
+import unittest
+
+from baseline import FolderTestCase, sample_receipts
+
+from receipt_core import ReceiptBlockchain
+from receipt_merkle import MerkleMonth, decode_proof, encode_proof, verify_proof
+
+
+def fake_hash(number):
+    return hashlib.sha256(str(number).encode()).hexdigest()
+
+
+class MerkleMonthTest(unittest.TestCase):
+
+    def test_every_leaf_proves_against_the_root(self):
+        for size in range(1, 18):
+            tree = MerkleMonth()
+            for number in range(size):
+                tree.append(fake_hash(number), number)
+            self.assertEqual(tree.root(), tree.levels()[-1][0].hex(), size)
+            for leaf in range(size):
+                proof = {"block_hash": fake_hash(leaf), "leaf_index": leaf, "tree_size": size,
+                         "path": [digest.hex() for digest in tree.inclusion_path(leaf)]}
+                self.assertTrue(verify_proof(proof, tree.root()), (size, leaf))
+                self.assertFalse(verify_proof(dict(proof, block_hash=fake_hash(size)), tree.root()))
+                if size > 1:
+                    self.assertFalse(verify_proof(dict(proof, leaf_index=leaf ^ 1), tree.root()))
+
+
+class InclusionProofTest(FolderTestCase):
+
+    def test_receipt_proof_round_trips_through_the_qr_text(self):
+        blockchain = ReceiptBlockchain()
+        blocks = blockchain.create_receipt_blocks(sample_receipts(5))
+        roots = blockchain.get_merkle_roots()
+        for block in blocks:
+            proof = decode_proof(encode_proof(blockchain.get_inclusion_proof(block["receipt_id"])))
+            self.assertEqual(proof["block_hash"], block["hash"])
+            self.assertTrue(verify_proof(proof, roots[proof["month"]]["root"]))
+        self.assertIsNone(blockchain.get_inclusion_proof("REC-00000000-20250101"))
+
+
+if __name__ == "__main__":
+    unittest.main()
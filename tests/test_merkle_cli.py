@@ -0,0 +1,48 @@
+"""Offline verification of a receipt QR Code against the published roots."""
+import contextlib
+import io
+import unittest
+
+from baseline import FolderTestCase, sample_receipts
+
+from receipt_core import ReceiptBlockchain, receipt_qr_payload
+from receipt_merkle import main
+
+
+class MerkleCliTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.blockchain = ReceiptBlockchain()
+        self.block = self.blockchain.create_receipt_blocks(sample_receipts(3))[1]
+        self.roots_file = self.blockchain.export_merkle_roots()
+        proof = self.blockchain.get_inclusion_proof(self.block["receipt_id"])
+        self.payload = receipt_qr_payload(self.block, proof)
+
+    def verify(self, payload):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = main([self.roots_file, payload])
+        return code, output.getvalue()
+
+    def test_receipt_is_included(self):
+        code, output = self.verify(self.payload)
+        self.assertEqual(code, 0)
+        self.assertIn("✅", output)
+
+    def test_malformed_proof_is_reported(self):
+        head, _, proof = self.payload.partition("|MK:")
+        for bad in (proof[:-5], "2025-01.3", proof.rpartition(".")[0] + ".", proof + "!"):
+            code, output = self.verify(f"{head}|MK:{bad}")
+            self.assertEqual(code, 1, bad)
+            self.assertEqual(output.count("\n"), 1)
+            self.assertIn("Prova Merkle inválida", output)
+
+    def test_other_qr_code_is_reported(self):
+        code, output = self.verify("https://example.com")
+        self.assertEqual(code, 1)
+        self.assertIn("❌", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Stage timings: Prometheus histograms and per-receipt traces."""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from baseline import ROOT, FolderTestCase
+
+import receipt_metrics
+
+ISSUE_TWO = """
+from receipt_core import ReceiptBlockchain
+from receipt_metrics import receipt_trace
+from tests.baseline import sample_receipts
+blockchain = ReceiptBlockchain()
+for receipt in sample_receipts(2):
+    with receipt_trace() as trace:
+        trace["receipt_id"] = blockchain.create_receipt_block(receipt)[0]
+"""
+
+
+class MetricsTest(FolderTestCase):
+
+    def issue_two(self, **variables):
+        subprocess.run([sys.executable, "-c", ISSUE_TWO], cwd=self.folder, check=True,
+                       env=dict(os.environ, PYTHONPATH=ROOT, **variables))
+        return os.path.join(self.folder, "sistema_recibos", "metricas")
+
+    def test_trace_has_one_line_per_receipt(self):
+        folder = self.issue_two(RECIBOS_TRACE="1")
+        with open(os.path.join(folder, receipt_metrics.TRACE_NAME), "r", encoding="utf-8") as f:
+            traces = [json.loads(line) for line in f]
+        self.assertEqual(len(traces), 2)
+        self.assertTrue(all(trace["receipt_id"].startswith("REC-") for trace in traces))
+        self.assertTrue(all("chain.append" in trace["stages"] for trace in traces))
+
+        with open(os.path.join(folder, receipt_metrics.METRICS_NAME), "r", encoding="utf-8") as f:
+            metrics = f.read()
+        self.assertIn('recibos_stage_seconds_count{stage="receipt.total"} 2', metrics)
+        self.assertIn('recibos_stage_seconds_bucket{stage="chain.append",le="+Inf"} 2', metrics)
+
+    def test_nothing_is_written_when_off(self):
+        self.assertFalse(os.path.exists(self.issue_two(RECIBOS_TRACE="0", RECIBOS_METRICS="0")))
+
+    def test_buckets_are_cumulative(self):
+        histogram = receipt_metrics.StageHistogram()
+        for seconds in (0.00005, 0.003, 0.003, 7.0):
+            histogram.observe(seconds)
+        previous, receipt_metrics._histograms = receipt_metrics._histograms, {"pdf.save": histogram}
+        try:
+            text = receipt_metrics.format_prometheus()
+        finally:
+            receipt_metrics._histograms = previous
+        self.assertIn('recibos_stage_seconds_bucket{stage="pdf.save",le="0.0001"} 1', text)
+        self.assertIn('recibos_stage_seconds_bucket{stage="pdf.save",le="0.005"} 3', text)
+        self.assertIn('recibos_stage_seconds_bucket{stage="pdf.save",le="2.5"} 3', text)
+        self.assertIn('recibos_stage_seconds_bucket{stage="pdf.save",le="+Inf"} 4', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Monthly issuance for every tenant, safe to repeat."""
+import os
+import unittest
+
+from baseline import FolderTestCase, save_sample_signature
+
+from receipt_batch import issue_monthly_receipts
+from receipt_core import ReceiptBlockchain, find_receipt_pdf
+from receipt_tenants import TenantStore
+
+
+class MonthlyIssuanceTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        save_sample_signature()
+        store = TenantStore().load()
+        store.add("José da Silva", "123.456.789-00", "Rua A, 1", "1.250,00", "5")
+        store.add("Maria Souza", "987.654.321-00", "Rua B, 2", "980,00", "10")
+        store.add("Ana Costa", "111.222.333-44", "Rua C, 3")  # no default value or day
+        self.blockchain = ReceiptBlockchain()
+
+    def issue(self, reference="10/2026"):
+        return issue_monthly_receipts(reference, "João Locador", self.blockchain, workers=1)
+
+    def test_repeating_the_month_issues_nothing_new(self):
+        first = self.issue()
+        self.assertEqual((len(first["receipt_ids"]), first["skipped"], first["without_defaults"]),
+                         (2, [], ["Ana Costa"]))
+        second = self.issue()
+        self.assertEqual((second["receipt_ids"], sorted(second["skipped"])), ([], sorted(first["receipt_ids"])))
+        self.assertEqual(len(self.blockchain.chain), 3)
+        self.assertEqual(len(self.issue("11/2026")["receipt_ids"]), 2)
+
+    def test_missing_pdf_of_an_issued_receipt_is_rendered_again(self):
+        receipt_id = self.issue()["receipt_ids"][0]
+        os.remove(find_receipt_pdf(receipt_id))
+        self.issue()
+        self.assertTrue(os.path.exists(find_receipt_pdf(receipt_id)))
+
+    def test_receipts_use_the_tenant_defaults(self):
+        self.issue()
+        receipt = self.blockchain.find_block(self.blockchain.find_issued("98765432100", "10/2026"))["data"]
+        self.assertEqual((receipt["value"], receipt["day"], receipt["address"]), ("980,00", "10", "Rua B, 2"))
+
+    def test_invalid_month_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.issue("13/2026")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Receipt PDFs in shard folders, found through the manifest."""
+import os
+import shutil
+import unittest
+
+from baseline import FolderTestCase, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain, find_receipt_pdf, generate_receipt_pdf, migrate_pdfs, pdf_manifest
+from receipt_manifest import PdfManifest, shard_folder
+
+
+class ShardFolderTest(unittest.TestCase):
+
+    block = {"receipt_id": "REC-1A2B3C4D-20261005", "data": sample_receipts(8, "10/2026")[7]}
+
+    def test_reference_month_and_tenant(self):
+        self.assertEqual(shard_folder("{year}/{month}/{cpf}", self.block), os.path.join("2026", "10", "00000000007"))
+        self.assertEqual(shard_folder("", self.block), "")
+
+    def test_unreadable_reference_uses_the_issue_date(self):
+        block = {**self.block, "data": {**self.block["data"], "reference": "outubro"}}
+        self.assertEqual(shard_folder("{year}-{month}", block), "2026-10")
+
+    def test_unknown_field_is_refused(self):
+        with self.assertRaises(ValueError):
+            shard_folder("{tenant}", self.block)
+
+
+class PdfManifestTest(FolderTestCase):
+
+    def test_generated_pdf_is_sharded_and_recorded(self):
+        block = ReceiptBlockchain().create_receipt_blocks(sample_receipts(2))[1]
+        path = generate_receipt_pdf(block)
+        self.assertEqual(path, os.path.join(receipt_core.PDF_FOLDER, "2025", "01", "00000000001",
+                                            f"recibo_{block['receipt_id']}.pdf"))
+        self.assertEqual(find_receipt_pdf(block["receipt_id"]), path)
+        self.assertIsNone(find_receipt_pdf("REC-00000000-20250101"))
+
+        manifest = pdf_manifest()
+        self.assertEqual(manifest.check(block["receipt_id"]), "ok")
+        with open(path, "ab") as f:
+            f.write(b"%")
+        self.assertEqual(manifest.check(block["receipt_id"]), "changed")
+        os.remove(path)
+        self.assertEqual(manifest.check(block["receipt_id"]), "missing")
+        self.assertIsNone(find_receipt_pdf(block["receipt_id"]))
+
+    def test_lines_of_another_process_are_read(self):
+        block = ReceiptBlockchain().create_receipt_blocks(sample_receipts(1))[0]
+        other = PdfManifest(receipt_core.PDF_FOLDER)
+        self.assertEqual(len(other), 0)
+        path = generate_receipt_pdf(block)
+        self.assertEqual(other.locate(block["receipt_id"]), path)
+        pdf_manifest().compact()
+        self.assertEqual((len(other), other.locate(block["receipt_id"])), (1, path))
+
+    def test_flat_pdfs_are_migrated(self):
+        blockchain = ReceiptBlockchain()
+        blocks = blockchain.create_receipt_blocks(sample_receipts(3))
+        flat = []
+        for block in blocks:
+            # PDFs of older versions, all in the PDF folder itself
+            path = generate_receipt_pdf(block)
+            flat.append(shutil.move(path, receipt_core.PDF_FOLDER))
+        os.remove(os.path.join(receipt_core.PDF_FOLDER, "manifesto.jsonl"))
+        receipt_core._manifest = None
+        shutil.copy(flat[0], os.path.join(receipt_core.PDF_FOLDER, "recibo_REC-00000000-20250101.pdf"))
+
+        self.assertEqual(migrate_pdfs(blockchain), {"moved": 3, "indexed": 0, "unknown": 1})
+        for block, path in zip(blocks, flat):
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(os.path.dirname(find_receipt_pdf(block["receipt_id"])),
+                             os.path.join(receipt_core.PDF_FOLDER, "2025", "01", block["data"]["tenant_cpf"]))
+            self.assertEqual(pdf_manifest().check(block["receipt_id"]), "ok")
+        self.assertEqual(migrate_pdfs(blockchain), {"moved": 0, "indexed": 3, "unknown": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
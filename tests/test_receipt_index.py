@@ -0,0 +1,52 @@
+"""Receipt lookups through the receipt_id sidecar index."""
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+
+
+class ReceiptIndexTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        blockchain = ReceiptBlockchain("journal")
+        blockchain.create_receipt_blocks(sample_receipts(4))
+        self.chain = list(blockchain.chain)
+        reset_process_state()
+
+    def test_every_receipt_is_found_after_a_restart(self):
+        blockchain = ReceiptBlockchain("journal")
+        for block in self.chain[1:]:
+            valid, found = blockchain.verify_receipt(block["receipt_id"])
+            self.assertTrue(valid)
+            self.assertEqual(found["index"], block["index"])
+            self.assertEqual(blockchain.get_receipt_info(block["receipt_id"]), block["data"])
+        self.assertEqual(blockchain.verify_receipt("REC-00000000-20250101"), (False, None))
+
+    def test_stale_sidecar_is_rebuilt(self):
+        with open(receipt_core.RECEIPT_INDEX_FILE, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(receipt_core.RECEIPT_INDEX_FILE, "w", encoding="utf-8") as f:
+            f.writelines(lines[:2])  # crash before the last appends reached the sidecar
+
+        blockchain = ReceiptBlockchain("journal")
+        self.assertEqual(blockchain.find_block(self.chain[-1]["receipt_id"])["index"], len(self.chain) - 1)
+        with open(receipt_core.RECEIPT_INDEX_FILE, "r", encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), len(self.chain))
+
+    def test_wrong_position_in_the_sidecar_is_corrected(self):
+        with open(receipt_core.RECEIPT_INDEX_FILE, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        receipt_id = lines[1].split("\t")[0]
+        lines[1] = f"{receipt_id}\t2\n"
+        with open(receipt_core.RECEIPT_INDEX_FILE, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+        blockchain = ReceiptBlockchain("journal")
+        self.assertEqual(blockchain.find_block(receipt_id)["index"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
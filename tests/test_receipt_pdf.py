@@ -0,0 +1,154 @@
+"""Receipt pages: what ends up in the PDF and what is written to disk."""
+import contextlib
+from io import BytesIO, StringIO
+import json
+import os
+import unittest
+
+from pypdf import PdfReader
+
+from baseline import FolderTestCase, save_sample_signature, sample_receipts
+
+import receipt_cli
+import receipt_core
+from receipt_core import (
+    ReceiptBlockchain, bundle_pdf_path, load_signature_image, render_bundle_pdf, render_receipt_pdf
+)
+from receipt_verify import pdf_content_streams
+
+
+def folder_files(folder):
+    return sorted(os.path.join(path, name) for path, _, names in os.walk(folder) for name in names)
+
+
+def images(page):
+    """Image XObjects a page uses, directly or through its forms"""
+    found = []
+    pending = [page["/Resources"]]
+    while pending:
+        xobjects = pending.pop().get("/XObject", {})
+        for name in xobjects:
+            xobject = xobjects[name].get_object()
+            if xobject["/Subtype"] == "/Image":
+                found.append(xobject)
+            elif "/Resources" in xobject:
+                pending.append(xobject["/Resources"])
+    return found
+
+
+class ReceiptPdfTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        save_sample_signature()
+        self.blockchain = ReceiptBlockchain()
+        self.blocks = self.blockchain.create_receipt_blocks(sample_receipts(3))
+
+    def test_qr_code_is_drawn_without_files_or_images(self):
+        before = folder_files(self.folder)
+        output = BytesIO()
+        render_receipt_pdf(output, self.blocks[0])
+        self.assertEqual(folder_files(self.folder), before)
+
+        page = PdfReader(BytesIO(output.getvalue())).pages[0]
+        self.assertEqual(images(page), [])
+        self.assertGreater(page.get_contents().get_data().count(b" re "), 20)  # module runs of the QR Code
+        self.assertIn(self.blocks[0]["receipt_id"], page.extract_text())
+
+    def save_png_signature(self, color):
+        from PIL import Image
+
+        if os.path.exists(receipt_core.SIGNATURE_STROKES_FILE):
+            os.remove(receipt_core.SIGNATURE_STROKES_FILE)  # as saved by the versions before strokes
+        Image.new("RGB", (200, 60), color).save(receipt_core.SIGNATURE_FILE)
+
+    def test_png_signature_is_decoded_once_per_file_version(self):
+        self.save_png_signature("white")
+        image = load_signature_image()
+        self.assertIs(load_signature_image(), image)
+
+        self.save_png_signature("black")
+        stat = os.stat(receipt_core.SIGNATURE_FILE)
+        os.utime(receipt_core.SIGNATURE_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertIsNot(load_signature_image(), image)
+
+    def test_png_signature_is_embedded_once_per_document(self):
+        self.save_png_signature("white")
+        output = BytesIO()
+        self.assertEqual(render_bundle_pdf(output, self.blocks), 3)
+        reader = PdfReader(BytesIO(output.getvalue()))
+        self.assertEqual([len(images(page)) for page in reader.pages], [1, 1, 1])
+        self.assertEqual(output.getvalue().count(b"/Subtype /Image"), 1)
+
+
+
+class BundleTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        save_sample_signature()
+        blockchain = ReceiptBlockchain()
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+        self.blocks = list(blockchain.chain)[1:]
+
+    def bundle(self, *argv):
+        with contextlib.redirect_stdout(StringIO()):
+            return receipt_cli.main(["bundle", *argv])
+
+    def page_ids(self, path):
+        return [page.extract_text().split("ID: ")[1].split()[0] for page in PdfReader(path).pages]
+
+    def test_month_bundle_has_one_page_per_receipt_in_chain_order(self):
+        self.assertEqual(self.bundle("--month", "01/2025"), 0)
+        self.assertEqual(self.page_ids(bundle_pdf_path(reference="01/2025")),
+                         [block["receipt_id"] for block in self.blocks[:3]])
+
+    def test_tenant_bundle_ignores_cpf_punctuation(self):
+        self.assertEqual(self.bundle("--cpf", "000.000.000-01"), 0)
+        self.assertEqual(self.page_ids(bundle_pdf_path(tenant_cpf="00000000001")),
+                         [block["receipt_id"] for block in self.blocks if block["data"]["tenant_cpf"] == "00000000001"])
+
+    def test_empty_selection_writes_no_file(self):
+        self.assertEqual(self.bundle("--month", "03/2025"), 1)
+        self.assertFalse(os.path.exists(bundle_pdf_path(reference="03/2025")))
+
+
+
+class PageTemplateTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        save_sample_signature()
+        self.blocks = ReceiptBlockchain().create_receipt_blocks(sample_receipts(3))
+
+    def bundle(self):
+        output = BytesIO()
+        render_bundle_pdf(output, self.blocks)
+        return output.getvalue()
+
+    def test_static_part_is_stored_once_per_bundle(self):
+        data = self.bundle()
+        contents = b"".join(pdf_content_streams(data))
+        self.assertEqual(contents.count(b"RECIBO DE ALUGUEL"), 1)
+        for page, block in zip(PdfReader(BytesIO(data)).pages, self.blocks):
+            text = page.extract_text()
+            self.assertIn("RECIBO DE ALUGUEL", text)
+            self.assertIn(block["receipt_id"], text)
+
+    def test_layout_file_changes_the_page(self):
+        with open(receipt_core.LAYOUT_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "static": [{"text": "RECIBO DE LOCAÇÃO", "x": 180, "top": 80, "font": "Helvetica-Bold", "size": 16}],
+                "fields": {"footer": {"size": 9}},
+            }, f)
+        layout = receipt_core.load_receipt_layout()
+        self.assertEqual(layout["fields"]["footer"], dict(receipt_core.RECEIPT_LAYOUT["fields"]["footer"], size=9))
+
+        text = PdfReader(BytesIO(self.bundle())).pages[0].extract_text()
+        self.assertIn("RECIBO DE LOCAÇÃO", text)
+        self.assertNotIn("RECIBO DE ALUGUEL", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
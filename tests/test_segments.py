@@ -0,0 +1,112 @@
+"""The chain split in month segments: import, startup, new months and lookups."""
+from datetime import datetime
+import json
+import os
+import unittest
+
+from baseline import FolderTestCase, baseline_hash, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+from receipt_storage import segment_ids_path
+
+MONTHS = ["2025-01", "2025-01", "2025-02", "2025-02", "2025-03", "2025-03"]
+
+
+def journal_over_months(months):
+    """A journal (of a folder without the storage record) issued over the given months"""
+    journal = receipt_core.open_backend("journal")
+    blockchain = ReceiptBlockchain(journal)
+    blockchain.create_receipt_blocks(sample_receipts(len(months) - 1))
+    chain = []
+    for block, month in zip(blockchain.chain, months):
+        timestamp = month + block["timestamp"][7:]
+        data = dict(block["data"], timestamp=timestamp) if isinstance(block["data"], dict) else block["data"]
+        previous_hash = chain[-1]["hash"] if chain else "0"
+        block_hash = baseline_hash(block["index"], json.dumps(data) if chain else data, previous_hash, timestamp)
+        chain.append(dict(block, timestamp=timestamp, data=data, previous_hash=previous_hash, hash=block_hash))
+    journal.save_chain(chain)
+    reset_process_state()
+    return chain
+
+
+class SegmentedStorageTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.chain = journal_over_months(MONTHS)
+        ReceiptBlockchain("segments").chain
+        reset_process_state()
+
+    def manifest(self):
+        with open(os.path.join(receipt_core.SEGMENTS_FOLDER, "manifesto.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+
+    def test_journal_is_split_by_month(self):
+        self.assertEqual([(entry["month"], entry["first_index"], entry["count"]) for entry in self.manifest()],
+                         [("2025-01", 0, 2), ("2025-02", 2, 2), ("2025-03", 4, 2)])
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(len(blockchain.chain), 6)
+        self.assertEqual(blockchain.store.archived, {})  # only the active month was read
+        self.assertEqual([block["hash"] for block in blockchain.chain], [block["hash"] for block in self.chain])
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+    def test_new_month_starts_a_segment(self):
+        blockchain = ReceiptBlockchain()
+        receipt_id, _ = blockchain.create_receipt_block(sample_receipts(1, "10/2026")[0])
+        entries = self.manifest()
+        # The active month's count is brought up to date from its file when loaded
+        self.assertEqual((len(entries), entries[-1]["month"], entries[-1]["first_index"]), (4, datetime.now().strftime("%Y-%m"), 6))
+        self.assertEqual(entries[2]["last_hash"], self.chain[-1]["hash"])
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(blockchain.find_block(receipt_id)["index"], 6)
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+    def test_torn_record_of_the_active_month_is_cut_off(self):
+        with open(os.path.join(receipt_core.SEGMENTS_FOLDER, "2025-03.jsonl"), "ab") as f:
+            f.write(b'{"index": 6, "timest')
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(len(blockchain.chain), 6)
+        blockchain.create_receipt_block(sample_receipts(1, "03/2025")[0])
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+
+class SegmentLookupTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.chain = journal_over_months(MONTHS)
+        ReceiptBlockchain("segments").chain
+        reset_process_state()
+
+    def ids_files(self):
+        return [os.path.exists(segment_ids_path(os.path.join(receipt_core.SEGMENTS_FOLDER, f"{month}.jsonl")))
+                for month in ("2025-01", "2025-02", "2025-03")]
+
+    def test_receipts_are_found_in_closed_months(self):
+        self.assertEqual(self.ids_files(), [True, True, False])
+        blockchain = ReceiptBlockchain()
+        for block in self.chain[1:]:
+            self.assertEqual(blockchain.find_block(block["receipt_id"])["hash"], block["hash"])
+
+    def test_missing_id_file_is_written_on_lookup(self):
+        os.remove(segment_ids_path(os.path.join(receipt_core.SEGMENTS_FOLDER, "2025-01.jsonl")))
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(blockchain.find_block(self.chain[1]["receipt_id"])["index"], 1)
+        self.assertEqual(self.ids_files(), [True, True, False])
+
+    def test_unknown_id_is_looked_up_once_without_new_blocks(self):
+        blockchain = ReceiptBlockchain()
+        store = blockchain.store
+        calls = []
+        find_position = store.find_position
+        store.find_position = lambda receipt_id: calls.append(receipt_id) or find_position(receipt_id)
+
+        self.assertIsNone(blockchain.find_block("REC-00000000-20250115"))
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
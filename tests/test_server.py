@@ -0,0 +1,110 @@
+"""Answers and limits of the verification HTTP server."""
+from urllib.parse import quote
+import asyncio
+import json
+import unittest
+
+from baseline import FolderTestCase, sample_receipts
+
+from receipt_core import ReceiptBlockchain
+from receipt_server import MAX_BODY_SIZE, MAX_LINE_SIZE, VerificationServer
+
+
+async def exchange(request):
+    """Status and body of the answer to raw request bytes sent to a fresh server"""
+    server = VerificationServer(ReceiptBlockchain())
+    ready = asyncio.get_running_loop().create_future()
+    serving = asyncio.ensure_future(server.serve(port=0, ready=ready.set_result))
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", await ready)
+        writer.write(request)
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        body = json.loads(await reader.readexactly(length))
+        closed = await reader.read() == b""
+        writer.close()
+        return status, body, closed
+    finally:
+        serving.cancel()
+
+
+class ServerVerifyTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.block = ReceiptBlockchain().create_receipt_blocks(sample_receipts(1))[0]
+        self.server = VerificationServer(ReceiptBlockchain())
+
+    def respond(self, target, method="GET"):
+        return asyncio.run(self.server.respond(method, target))
+
+    def test_found_receipt_is_cached(self):
+        status, body = self.respond(f"/verify/{self.block['receipt_id']}")
+        self.assertEqual((status, body["found"], body["valid"]), (200, True, True))
+        self.assertEqual((body["hash"], body["receipt"]), (self.block["hash"], self.block["data"]))
+        self.assertEqual(self.respond(f"/verify/{self.block['receipt_id']}?x=1"), (status, body))
+        self.assertEqual((self.server.cache.hits, len(self.server.cache)), (1, 1))
+
+    def test_unknown_receipt_is_not_cached(self):
+        status, body = self.respond("/verify/REC-00000000-20250101")
+        self.assertEqual((status, body["found"]), (404, False))
+        self.assertEqual(len(self.server.cache), 0)
+
+    def test_qr_code_text(self):
+        payload = f"RECIBO|ID:{self.block['receipt_id']}|HASH:{self.block['hash'][:15]}"
+        status, body = self.respond("/verify/" + quote(payload))
+        self.assertEqual((status, body["valid"]), (200, True))
+        wrong = payload[:-1] + ("0" if payload[-1] != "0" else "1")
+        status, body = self.respond("/verify/" + quote(wrong))
+        self.assertEqual((status, body["valid"]), (200, False))
+        self.assertIn("error", body)
+
+    def test_other_paths_and_methods(self):
+        self.assertEqual(self.respond("/")[0], 404)
+        self.assertEqual(self.respond("/verify/")[0], 400)
+        self.assertEqual(self.respond(f"/verify/{self.block['receipt_id']}", "POST")[0], 405)
+
+
+class ServerLimitsTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.block = ReceiptBlockchain().create_receipt_blocks(sample_receipts(1))[0]
+
+    def test_known_receipt(self):
+        request = f"GET /verify/{self.block['receipt_id']} HTTP/1.1\r\nConnection: close\r\n\r\n"
+        status, body, _ = asyncio.run(exchange(request.encode()))
+        self.assertEqual(status, 200)
+        self.assertTrue(body["valid"])
+
+    def test_large_body_is_refused(self):
+        request = f"POST /verify/x HTTP/1.1\r\nContent-Length: {MAX_BODY_SIZE + 1}\r\n\r\n"
+        status, _, closed = asyncio.run(exchange(request.encode()))
+        self.assertEqual(status, 413)
+        self.assertTrue(closed)
+
+    def test_long_request_line_is_refused(self):
+        request = f"GET /verify/{'A' * MAX_LINE_SIZE} HTTP/1.1\r\n\r\n"
+        status, _, closed = asyncio.run(exchange(request.encode()))
+        self.assertEqual(status, 400)
+        self.assertTrue(closed)
+
+    def test_long_header_is_refused(self):
+        request = f"GET /verify/x HTTP/1.1\r\nCookie: {'a' * MAX_LINE_SIZE}\r\n\r\n"
+        status, _, _ = asyncio.run(exchange(request.encode()))
+        self.assertEqual(status, 400)
+
+    def test_invalid_content_length_is_refused(self):
+        status, _, _ = asyncio.run(exchange(b"GET /verify/x HTTP/1.1\r\nContent-Length: -5\r\n\r\n"))
+        self.assertEqual(status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
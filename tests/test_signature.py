@@ -0,0 +1,60 @@
+"""Signatures kept as simplified strokes and drawn as vector paths."""
+from io import BytesIO
+import math
+import os
+import unittest
+
+from baseline import FolderTestCase, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain, has_signature, render_receipt_pdf
+from receipt_signature import TOLERANCE, load_strokes, save_strokes, simplify, stroke_points
+from receipt_verify import pdf_content_streams
+
+
+class SimplifyTest(unittest.TestCase):
+
+    def test_straight_run_keeps_its_ends(self):
+        points = [(x, 2 * x + 1) for x in range(50)]
+        self.assertEqual(simplify(points), [(0, 1), (49, 99)])
+
+    def test_curve_stays_within_the_tolerance(self):
+        points = [(x, 40 * math.sin(x / 10)) for x in range(200)]
+        kept = simplify(points)
+        self.assertLess(len(kept), len(points) // 4)
+        self.assertEqual((kept[0], kept[-1]), (points[0], points[-1]))
+        for x, y in points:
+            # Distance to the kept segment around the point
+            (x1, y1), (x2, y2) = next((a, b) for a, b in zip(kept, kept[1:]) if a[0] <= x <= b[0])
+            distance = abs((y2 - y1) * (x - x1) - (x2 - x1) * (y - y1)) / math.hypot(x2 - x1, y2 - y1)
+            self.assertLessEqual(distance, TOLERANCE + 1e-9)
+
+
+class StrokeSignatureTest(FolderTestCase):
+
+    def save(self, strokes):
+        receipt_core.ensure_folders()
+        save_strokes(receipt_core.SIGNATURE_STROKES_FILE, strokes, 400, 150)
+
+    def test_saved_strokes_load_back(self):
+        self.assertFalse(has_signature())
+        self.save([[(10, 10), (20, 20), (30, 30), (40, 12)], [(100, 50)], []])
+        signature = load_strokes(receipt_core.SIGNATURE_STROKES_FILE)
+        self.assertEqual((signature["width"], signature["height"]), (400, 150))
+        self.assertEqual([stroke_points(stroke) for stroke in signature["strokes"]],
+                         [[(10, 10), (30, 30), (40, 12)], [(100, 50)]])
+        self.assertIs(load_strokes(receipt_core.SIGNATURE_STROKES_FILE), signature)
+        self.assertTrue(has_signature())
+
+    def test_signature_is_a_vector_path_in_the_pdf(self):
+        self.save([[(10, 80), (60, 40), (110, 90), (160, 50)]])
+        output = BytesIO()
+        render_receipt_pdf(output, ReceiptBlockchain().create_receipt_blocks(sample_receipts(1))[0])
+        data = output.getvalue()
+        self.assertNotIn(b"/Subtype /Image", data)
+        self.assertRegex(b"".join(pdf_content_streams(data)), rb"\d c\s")  # Bézier curves
+        self.assertFalse(os.path.exists(receipt_core.SIGNATURE_FILE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""The SQLite storage, and its import of the JSON chain (all at once or not at all)."""
+import os
+import sqlite3
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+from receipt_storage import SqliteStorage
+
+
+class JsonSource:
+    """Import source with a given chain, as the JSON storages expose it"""
+
+    def __init__(self, chain):
+        self.chain = chain
+
+    def load_tenants(self):
+        return []
+
+
+class SqliteImportTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        blockchain = ReceiptBlockchain("journal")
+        blockchain.create_receipt_blocks(sample_receipts(2))
+        self.chain = list(blockchain.chain)
+        self.database_file = os.path.join(self.folder, "recibos.db")
+
+    def test_failed_import_leaves_no_database(self):
+        duplicate = dict(self.chain[-1], index=len(self.chain))
+        with self.assertRaises(sqlite3.IntegrityError):
+            SqliteStorage(self.database_file, JsonSource(self.chain + [duplicate]))
+        self.assertFalse(os.path.exists(self.database_file))
+
+        # The next start imports again instead of beginning an empty chain
+        storage = SqliteStorage(self.database_file, JsonSource(self.chain))
+        self.assertEqual([block["hash"] for block in storage.chain], [block["hash"] for block in self.chain])
+        self.assertFalse(os.path.exists(self.database_file + ".import"))
+
+    def test_existing_database_is_not_imported_again(self):
+        SqliteStorage(self.database_file, JsonSource(self.chain)).connection.close()
+        storage = SqliteStorage(self.database_file, JsonSource([]))
+        self.assertEqual(len(storage.chain), len(self.chain))
+
+
+
+class SqliteStorageTest(FolderTestCase):
+
+    def test_journal_folder_moves_to_sqlite(self):
+        # A folder of a version without the storage record: journal and tenants only
+        journal = receipt_core.open_backend("journal")
+        blockchain = ReceiptBlockchain(journal)
+        blockchain.create_receipt_blocks(sample_receipts(3))
+        blockchain.create_receipt_blocks(sample_receipts(2, "02/2025"))
+        tenant = {"name": "Locatário 1", "cpf": "000.000.000-01", "address": "Rua das Flores, 100"}
+        journal.save_tenants([tenant])
+        hashes = [block["hash"] for block in blockchain.chain]
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain("sqlite")
+        self.assertEqual([block["hash"] for block in blockchain.chain], hashes)
+        self.assertEqual(receipt_core.read_tenants(), [tenant])
+        self.assertEqual([block["data"]["reference"] for block in blockchain.select_receipts(tenant_cpf="00000000001")],
+                         ["01/2025", "02/2025"])
+        self.assertEqual(len(list(blockchain.select_receipts(reference="02/2025"))), 2)
+        receipt_id, _ = blockchain.create_receipt_block(sample_receipts(1, "03/2025")[0])
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain()
+        self.assertEqual(receipt_core.storage_kind(), "sqlite")
+        self.assertTrue(blockchain.verify_receipt(receipt_id)[0])
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
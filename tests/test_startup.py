@@ -0,0 +1,44 @@
+"""Importing the core is cheap: no drawing libraries, no folders, no chain read."""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from baseline import ROOT, FolderTestCase, sample_receipts
+
+from receipt_core import ReceiptBlockchain
+
+HEAVY_MODULES = ["reportlab", "PIL", "qrcode", "tkinter"]
+
+IMPORT_CHECK = """
+import json, sys
+import receipt_core, receipt_cli
+blockchain = receipt_core.ReceiptBlockchain()
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+
+class StartupTest(FolderTestCase):
+
+    def run_python(self, code):
+        result = subprocess.run([sys.executable, "-c", code], cwd=self.folder, check=True, capture_output=True,
+                                text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+        return result.stdout
+
+    def test_import_pulls_in_no_drawing_library_and_writes_nothing(self):
+        heavy = json.loads(self.run_python(IMPORT_CHECK.format(heavy=HEAVY_MODULES)))
+        self.assertEqual(heavy, [])
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_chain_is_read_on_first_use(self):
+        ReceiptBlockchain().create_receipt_blocks(sample_receipts(2))
+        code = ("import receipt_core\n"
+                "blockchain = receipt_core.ReceiptBlockchain()\n"
+                "unread = blockchain._store is None and receipt_core.open_backend('journal')._chain is None\n"
+                "print(unread, len(blockchain.chain))\n")
+        self.assertEqual(self.run_python(code).split(), ["True", "3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
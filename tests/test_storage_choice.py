@@ -0,0 +1,43 @@
+"""The storage recorded in sistema_recibos is used by every later process."""
+import os
+import unittest
+
+from baseline import FolderTestCase, reset_process_state, sample_receipts
+
+import receipt_core
+from receipt_core import ReceiptBlockchain
+
+
+class StorageChoiceTest(FolderTestCase):
+
+    def test_recorded_storage_is_used_without_the_variable(self):
+        blockchain = ReceiptBlockchain("sqlite")
+        blockchain.create_receipt_blocks(sample_receipts(2))
+        reset_process_state()
+
+        blockchain = ReceiptBlockchain(None)
+        self.assertEqual(receipt_core.storage_kind(), "sqlite")
+        blockchain.create_receipt_block(sample_receipts(1, "02/2025")[0])
+        self.assertEqual(len(blockchain.chain), 4)
+        self.assertFalse(os.path.exists(receipt_core.BLOCKCHAIN_JOURNAL_FILE))
+        self.assertTrue(blockchain.audit_chain(full=True)["valid"])
+
+    def test_different_storage_is_refused(self):
+        ReceiptBlockchain("binary").create_receipt_block(sample_receipts(1)[0])
+        reset_process_state()
+
+        with self.assertRaises(ValueError):
+            receipt_core.open_storage("journal")
+
+    def test_unrecorded_folder_with_another_storage_is_refused(self):
+        ReceiptBlockchain("sqlite").create_receipt_block(sample_receipts(1)[0])
+        reset_process_state()
+        os.remove(receipt_core.STORAGE_FILE)
+
+        with self.assertRaises(ValueError):
+            receipt_core.open_storage()
+        self.assertEqual(receipt_core.storage_kind("sqlite"), "sqlite")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""The indexed tenant register and its type-ahead search."""
+import unittest
+
+from baseline import FolderTestCase, reset_process_state
+
+from receipt_tenants import TenantStore
+
+TENANTS = [
+    ("José da Silva", "123.456.789-00"),
+    ("Maria Silveira", "987.654.321-00"),
+    ("Ana Sílvia Costa", "12.345.678/0001-90"),
+    ("Joana Prado", "111.222.333-44"),
+]
+
+
+class TenantStoreTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        store = TenantStore().load()
+        for name, cpf in TENANTS:
+            store.add(name, cpf, "Rua das Flores, 100", "1.250,00", "5")
+        reset_process_state()
+        self.store = TenantStore().load()
+
+    def test_search_matches_any_word_start_without_accents(self):
+        self.assertEqual(self.store.search("silv"), ["Ana Sílvia Costa", "José da Silva", "Maria Silveira"])
+        self.assertEqual(self.store.search("JOSE"), ["José da Silva"])
+        self.assertEqual(self.store.search("jo"), ["Joana Prado", "José da Silva"])
+        self.assertEqual(self.store.search("da silva"), ["José da Silva"])
+        self.assertEqual(self.store.search("xavier"), [])
+        self.assertEqual(len(self.store.search("")), 4)
+        self.assertEqual(len(self.store.search("s", limit=2)), 2)
+
+    def test_cpf_lookup_ignores_punctuation(self):
+        self.assertEqual(self.store.find_by_cpf("12345678900")["name"], "José da Silva")
+        self.assertEqual(self.store.find_by_cpf("12345678000190")["name"], "Ana Sílvia Costa")
+
+    def test_repeated_name_or_cpf_is_refused(self):
+        with self.assertRaisesRegex(ValueError, "já cadastrado"):
+            self.store.add("Outro Nome", "12345678900", "Rua B")
+        with self.assertRaisesRegex(ValueError, "já cadastrado"):
+            self.store.add("Joana Prado", "555.666.777-88", "Rua B")
+        with self.assertRaisesRegex(ValueError, "Dia de pagamento"):
+            self.store.add("Pedro Alves", "555.666.777-88", "Rua B", payment_day="32")
+        self.assertEqual(len(self.store), 4)
+
+    def test_new_tenant_is_searchable_at_once_and_after_a_restart(self):
+        self.store.add("Pedro Alves", "555.666.777-88", "Rua B")
+        self.assertEqual(self.store.search("alv"), ["Pedro Alves"])
+        reset_process_state()
+        self.assertEqual(TenantStore().load().search("alv"), ["Pedro Alves"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Bulk verification of a folder of receipt PDFs."""
+import csv
+import os
+import unittest
+
+from baseline import FolderTestCase, save_sample_signature, sample_receipts
+
+from receipt_core import ReceiptBlockchain, generate_receipt_pdf, render_bundle_pdf, render_receipt_pdf
+from receipt_verify import verify_folder
+
+
+class VerifyFolderTest(FolderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        save_sample_signature()
+        self.blockchain = ReceiptBlockchain()
+        self.blocks = self.blockchain.create_receipt_blocks(sample_receipts(4))
+        self.scans = os.path.join(self.folder, "digitalizados")
+        os.makedirs(self.scans)
+
+    def verify(self):
+        report = os.path.join(self.folder, "relatorio.csv")
+        result = verify_folder(self.scans, report, blockchain=self.blockchain, workers=2)
+        with open(report, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        return result, rows
+
+    def test_single_and_bundle_pdfs_are_valid(self):
+        for block in self.blocks[:2]:
+            render_receipt_pdf(os.path.join(self.scans, f"recibo_{block['receipt_id']}.pdf"), block)
+        render_bundle_pdf(os.path.join(self.scans, "pacote.pdf"), self.blocks[2:])
+        os.replace(generate_receipt_pdf(self.blocks[0]), os.path.join(self.scans, "copia.pdf"))
+
+        result, rows = self.verify()
+        self.assertEqual((result["files"], result["receipts"]), (4, 5))
+        self.assertEqual(result["counts"], {"valid": 5, "tampered": 0, "unknown": 0})
+        self.assertEqual([row["page"] for row in rows if row["file"] == "pacote.pdf"], ["1", "2"])
+
+    def test_tampered_and_unknown_receipts_are_reported(self):
+        edited = dict(self.blocks[0], data=dict(self.blocks[0]["data"], value="9.999,00"))
+        render_receipt_pdf(os.path.join(self.scans, "editado.pdf"), edited)
+        foreign = dict(self.blocks[1], receipt_id="REC-00000000-20250101")
+        render_receipt_pdf(os.path.join(self.scans, "outro.pdf"), foreign)
+        with open(os.path.join(self.scans, "quebrado.pdf"), "wb") as f:
+            f.write(b"%PDF-1.4 not really")
+
+        result, rows = self.verify()
+        self.assertEqual(result["counts"], {"valid": 0, "tampered": 1, "unknown": 2})
+        statuses = {row["file"]: (row["status"], row["reason"]) for row in rows}
+        self.assertEqual(statuses["editado.pdf"][0], "tampered")
+        self.assertTrue(statuses["editado.pdf"][1].startswith("texto difere da blockchain"))
+        self.assertEqual(statuses["outro.pdf"], ("unknown", "ID não encontrado na blockchain"))
+        self.assertEqual(statuses["quebrado.pdf"][0], "unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()